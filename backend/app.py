@@ -13,12 +13,14 @@ import os
 import json
 import uuid
 import logging
+import threading
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple
 
 from flask import Flask, render_template, request, jsonify, send_file, session, make_response
 from flask import Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from functools import wraps
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
@@ -27,17 +29,34 @@ from dotenv import load_dotenv
 import secrets
 
 # Import our custom services
-from services.document_processor import DocumentProcessor
+from services.document_processor import DocumentProcessor, PARSE_FORMAT_VERSION
+from services.fill_plan import FillPlan, plan_path as fill_plan_path
+from services.preview_plan import PreviewPlan, PreviewCache, plan_signature
 from services.ai_service import AIService
-from services.placeholder_detector import PlaceholderDetector
+from services.placeholder_detector import (
+    PlaceholderDetector, DetectionBudget, PlaceholderRecord, pack_placeholders, unpack_placeholders,
+    build_location_index, split_placeholder_ids, join_placeholder_ids, join_location_index
+)
 from services.session_manager import session_manager
+from services.detection_cache import DetectionCache, hash_file
 from services.firebase_auth import verify_token, get_token_from_request
 
 # Load environment variables from .env file
 load_dotenv()
 
+class LexsyJSONProvider(DefaultJSONProvider):
+    """JSON provider that renders compact placeholder records in their API shape"""
+    
+    @staticmethod
+    def default(o):
+        if isinstance(o, PlaceholderRecord):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+
 # Initialize Flask application
 app = Flask(__name__)
+app.json = LexsyJSONProvider(app)
 
 # Configure Flask application
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', secrets.token_hex(32))
@@ -45,6 +64,11 @@ app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_FILE_SIZE', 10 * 1024
 app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', 'uploads')
 app.config['PROCESSED_FOLDER'] = os.environ.get('PROCESSED_FOLDER', 'processed')
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=24)  # Sessions expire after 24 hours
+app.config['DETECTION_BUDGET_SECONDS'] = float(os.environ.get('DETECTION_BUDGET_SECONDS', 5))  # CPU seconds per upload
+# Respond to uploads as soon as the first placeholder is found and index the rest in the background
+app.config['UPLOAD_EARLY_RESPONSE'] = os.environ.get('UPLOAD_EARLY_RESPONSE', 'false').lower() in ('1', 'true', 'yes')
+# Blocks (paragraphs or tables) in a windowed preview when the client gives no bounds
+app.config['PREVIEW_WINDOW_SIZE'] = int(os.environ.get('PREVIEW_WINDOW_SIZE', 40))
 
 # Configure CORS for cross-origin requests
 # Build allowed origins from environment for deployment flexibility
@@ -81,8 +105,8 @@ CORS(
     origin_check=cors_check,
     supports_credentials=True,
     methods=['GET', 'POST', 'OPTIONS', 'PUT', 'DELETE'],
-    allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'],
-    expose_headers=['Content-Type', 'Content-Disposition'],
+    allow_headers=['Content-Type', 'Authorization', 'X-Requested-With', 'If-None-Match'],
+    expose_headers=['Content-Type', 'Content-Disposition', 'ETag'],
     max_age=3600
 )
 
@@ -106,6 +130,15 @@ doc_processor = DocumentProcessor()
 ai_service = AIService()
 placeholder_detector = PlaceholderDetector()
 
+# Shared parse-and-detect cache for repeat template uploads (Redis, else local disk)
+detection_cache = DetectionCache(
+    version=f"{PARSE_FORMAT_VERSION}:{placeholder_detector.cache_signature()}",
+    redis_client=session_manager.redis_client if session_manager.use_redis else None
+)
+
+# Rendered preview fragments per session, for delta responses to fill endpoints
+preview_cache = PreviewCache()
+
 # Allowed file extensions for upload
 ALLOWED_EXTENSIONS = {'docx', 'doc'}
 
@@ -126,15 +159,430 @@ def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+# Session keys the fill endpoints (chat, edit, fill) read; they never need the document content
+FILL_SESSION_FIELDS = ('placeholders', 'filled_values', 'current_placeholder_index', 'preview_plan_id')
+
+
 # Session management functions - now use Redis via session_manager
-def get_session_data(session_id: str) -> Optional[Dict[str, Any]]:
-    """Retrieve session data using Redis session manager"""
-    return session_manager.get_session(session_id)
+def get_session_data(session_id: str, fields: Optional[Tuple[str, ...]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Retrieve session data using Redis session manager.
+    
+    Args:
+        session_id: Session identifier
+        fields: Session keys to read (all if None); a session that is still
+            indexing is always read whole so the indexing result can be merged
+        
+    Returns:
+        Session data or None if not found
+    """
+    if fields is not None:
+        extra_fields = ('indexing',)
+        if 'placeholders' in fields or 'location_index' in fields:
+            extra_fields += ('placeholder_ids', 'placeholder_signature')
+        session_data = session_manager.get_session(session_id, fields + extra_fields)
+        if session_data and session_data.get('indexing'):
+            fields = None
+    if fields is None:
+        session_data = session_manager.get_session(session_id)
+    if session_data:
+        # A copy: the in-memory store hands out the stored dict itself
+        session_data = dict(session_data)
+        ids = session_data.pop('placeholder_ids', None)
+        if ids is not None:
+            # Stored with positional ids (shared by every session of the document)
+            if 'placeholders' in session_data:
+                session_data['placeholders'] = join_placeholder_ids(session_data['placeholders'], ids)
+            if 'location_index' in session_data:
+                session_data['location_index'] = join_location_index(session_data['location_index'], ids)
+    if session_data and 'placeholders' in session_data:
+        # Placeholders are stored as compact tuples
+        session_data['placeholders'] = unpack_placeholders(session_data['placeholders'])
+        if 'location_index' not in session_data and (fields is None or 'location_index' in fields):
+            # Sessions saved before the index existed
+            session_data['location_index'] = build_location_index(session_data['placeholders'])
+    if session_data and session_data.get('indexing'):
+        session_data = apply_indexing_result(session_id, session_data)
+    return session_data
+
+
+def ensure_session_fields(session_id: str, session_data: Dict[str, Any], fields: Tuple[str, ...]) -> None:
+    """Load session keys missing from a partially read session (in place)"""
+    missing = tuple(field for field in fields if field not in session_data)
+    if missing:
+        session_data.update(get_session_data(session_id, missing) or {})
+    if 'location_index' in fields and 'location_index' not in session_data:
+        # Sessions saved before the index existed
+        session_data['location_index'] = build_location_index(session_data['placeholders'])
+
+
+def stored_placeholder_fields(placeholders: List[Any]) -> Dict[str, Any]:
+    """
+    Session keys that store a placeholder list.
+    
+    Placeholders are stored as compact tuples with positional ids, so every
+    session of a document stores the same list (and shares one stored
+    template, see session_manager); the session's own occurrence ids are
+    kept apart in 'placeholder_ids', and the location index refers to
+    positions too. 'placeholder_signature' lets a preview plan be checked
+    against the list without hashing it on every read.
+    
+    Args:
+        placeholders: Placeholders with the session's ids
+        
+    Returns:
+        'placeholders', 'placeholder_ids', 'placeholder_signature' and 'location_index'
+    """
+    positional, ids = split_placeholder_ids(pack_placeholders(placeholders))
+    unpacked = unpack_placeholders(positional)
+    return {
+        'placeholders': positional,
+        'placeholder_ids': ids,
+        'placeholder_signature': plan_signature(unpacked),
+        'location_index': build_location_index(unpacked)
+    }
 
 
 def save_session_data(session_id: str, data: Dict[str, Any], user_id: Optional[str] = None) -> None:
     """Save session data using Redis session manager"""
-    session_manager.save_session(session_id, data, user_id=user_id)
+    stored = dict(data, **stored_placeholder_fields(data.get('placeholders', [])))
+    session_manager.save_session(session_id, stored, user_id=user_id)
+
+
+def update_session_data(session_id: str, fields: Dict[str, Any],
+                        filled_values: Optional[Dict[str, Optional[str]]] = None) -> bool:
+    """
+    Write only some keys of a session (and single filled values).
+    
+    Args:
+        session_id: Session identifier
+        fields: Session keys to write
+        filled_values: Filled values to set (None to clear), by id or key
+        
+    Returns:
+        False if the session is gone (deleted or expired since it was read)
+        or could not be written
+    """
+    if 'placeholders' in fields:
+        fields = dict(fields, **stored_placeholder_fields(fields['placeholders']))
+    elif 'location_index' in fields:
+        raise ValueError('location_index is stored with the placeholders it is built from')
+    return session_manager.update_session(session_id, fields, filled_values)
+
+
+def session_expired_response() -> Tuple[Response, int]:
+    """Answer for a request whose session expired or was reset"""
+    return jsonify({
+        'error': 'Session expired',
+        'message': 'Your session has expired. Please upload the document again.',
+        'session_expired': True,
+        'code': 'SESSION_EXPIRED'
+    }), 400
+
+
+def changed_values(before: Dict[str, str], after: Dict[str, str]) -> Dict[str, Optional[str]]:
+    """Filled values set or cleared between two copies of a session's filled_values"""
+    changes = {key: value for key, value in after.items() if before.get(key) != value}
+    changes.update((key, None) for key in before if key not in after)
+    return changes
+
+
+def check_session_version(session_id: str) -> Tuple[Optional[int], Optional[Response]]:
+    """
+    Answer a conditional read from the session's content version alone.
+    
+    Args:
+        session_id: Session identifier
+        
+    Returns:
+        (version, response): the 304 response if the client's If-None-Match
+        holds the current version (the session is then never loaded), else
+        None; the version is read before the session so an ETag built from
+        it is never newer than the content it is sent with
+    """
+    version = session_manager.get_session_version(session_id)
+    if version is not None and request.if_none_match.contains_weak(f"v{version}"):
+        return version, versioned_response(make_response('', 304), version)
+    return version, None
+
+
+def versioned_response(response: Response, version: Optional[int]) -> Response:
+    """Tag a session read with its content version (strong ETag; clients revalidate every time)"""
+    if version is not None:
+        response.set_etag(f"v{version}")
+        response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def finish_detection(placeholder_stream, placeholders: list, doc_content: Dict[str, Any],
+                     detection_budget: DetectionBudget, content_hash: str,
+                     unique_filename: str) -> Dict[str, Any]:
+    """
+    Drain a streaming detection run (see cache_detection for storing the result).
+    
+    Args:
+        placeholder_stream: Remaining detect_placeholders_iter generator
+        placeholders: Placeholders already taken from the stream (extended in place)
+        doc_content: Content dict being filled by the parser
+        detection_budget: Budget shared with the stream
+        content_hash: SHA-256 of the uploaded file
+        unique_filename: Stored filename (for logging)
+        
+    Returns:
+        Detection info for API responses
+    """
+    placeholders.extend(placeholder_stream)
+    logger.info(f"Detected {len(placeholders)} placeholders in document")
+    
+    if detection_budget.truncated:
+        logger.warning(
+            f"Detection truncated for {unique_filename}: "
+            f"{len(detection_budget.truncated)} location(s) skipped heuristic patterns"
+        )
+    
+    return dict(detection_budget.to_dict(), cached=False)
+
+
+def cache_detection(content_hash: str, doc_content: Dict[str, Any], placeholders: list,
+                    detection_info: Dict[str, Any], fill_plan: Optional[FillPlan],
+                    preview_plan: PreviewPlan) -> None:
+    """
+    Cache a detection result with the plans compiled from it, so a repeat
+    upload of the same file neither parses nor reads the package again.
+    
+    Args:
+        content_hash: SHA-256 of the uploaded file
+        doc_content: Parsed content
+        placeholders: Detected placeholders
+        detection_info: Detection info from finish_detection
+        fill_plan: Compiled fill plan (None if the template has none)
+        preview_plan: Compiled preview plan
+    """
+    if detection_info['truncated']:
+        # Truncated results depend on CPU load, so only complete ones are reused
+        return
+    detection_cache.put(content_hash, {
+        'content': doc_content,
+        'placeholders': pack_placeholders(placeholders),
+        'detection': {key: value for key, value in detection_info.items() if key != 'cached'},
+        'fill_plan': fill_plan.data if fill_plan is not None else None,
+        'preview_plan': preview_plan.data
+    }, optional=('fill_plan', 'preview_plan'))
+
+
+def index_in_background(session_id: str, placeholder_stream, placeholders: list,
+                        doc_content: Dict[str, Any], detection_budget: DetectionBudget,
+                        content_hash: str, unique_filename: str) -> None:
+    """
+    Finish an early-response upload: detect the remaining placeholders and
+    publish the result for the session (merged on the next session read).
+    """
+    detection_budget.resume()
+    try:
+        detection_info = finish_detection(
+            placeholder_stream, placeholders, doc_content,
+            detection_budget, content_hash, unique_filename
+        )
+        location_index = build_location_index(placeholders)
+        fill_plan = doc_processor.compile_fill_plan(
+            os.path.join(app.config['UPLOAD_FOLDER'], unique_filename), placeholders, location_index
+        )
+        cache_detection(
+            content_hash, doc_content, placeholders, detection_info, fill_plan,
+            doc_processor.compile_preview(doc_content, placeholders, location_index)
+        )
+        result = {
+            'status': 'complete',
+            'content': doc_content,
+            'placeholders': pack_placeholders(placeholders),
+            'detection': detection_info
+        }
+    except Exception as e:
+        logger.error(f"Background indexing failed for session {session_id}: {str(e)}")
+        result = {'status': 'failed', 'error': str(e)}
+    
+    session_manager.save_indexing_result(session_id, result)
+    logger.info(f"Background indexing {result['status']} for session {session_id}")
+
+
+def refresh_ai_context(session_data: Dict[str, Any]) -> None:
+    """
+    Recompute the AI conversation context after the session's placeholders
+    changed, keeping the original start time.
+    
+    Args:
+        session_data: Session data (updated in place)
+    """
+    ai_context = ai_service.initialize_conversation(session_data['content'], session_data['placeholders'])
+    ai_context['started_at'] = session_data.get('ai_context', {}).get('started_at', ai_context['started_at'])
+    session_data['ai_context'] = ai_context
+
+
+def refresh_preview_plan(session_data: Dict[str, Any]) -> None:
+    """
+    Rebuild the location index and preview plan after the session's content
+    or placeholders changed.
+    
+    Args:
+        session_data: Session data (updated in place)
+    """
+    session_data['location_index'] = build_location_index(session_data['placeholders'])
+    plan = doc_processor.compile_preview(
+        session_data['content'], session_data['placeholders'], session_data['location_index']
+    )
+    session_data['placeholder_signature'] = plan.data['placeholder_signature']
+    session_data['preview_plan'] = plan.data
+    session_data['preview_plan_id'] = plan.plan_id
+
+
+def session_preview_plan(session_id: str, session_data: Dict[str, Any]) -> PreviewPlan:
+    """
+    The session's preview plan, compiled (and stored) if missing or stale.
+    
+    Args:
+        session_id: Session identifier
+        session_data: Session data; may be partially read, the plan (and
+            the content, to compile one) are loaded when needed
+        
+    Returns:
+        PreviewPlan for the session's placeholders
+    """
+    signature = session_data.get('placeholder_signature')
+    plan = preview_cache.plan(session_id, session_data.get('preview_plan_id'))
+    if plan is not None and plan.matches(session_data['placeholders'], signature):
+        return plan
+    
+    ensure_session_fields(session_id, session_data, ('preview_plan',))
+    plan = PreviewPlan.from_data(session_data.get('preview_plan'))
+    if plan is None or not plan.matches(session_data['placeholders'], signature):
+        # Sessions saved before preview plans existed (or with an older plan version)
+        ensure_session_fields(session_id, session_data, ('content',))
+        refresh_preview_plan(session_data)
+        # Same placeholders, so the stored location index still holds
+        update_session_data(session_id, {
+            field: session_data[field] for field in ('placeholder_signature', 'preview_plan', 'preview_plan_id')
+        })
+        plan = PreviewPlan(session_data['preview_plan'])
+    return plan
+
+
+def resolve_preview_window(args, plan: PreviewPlan, current_index: Optional[int]) -> Optional[Tuple[int, int]]:
+    """
+    Block window requested in /api/preview query parameters.
+    
+    Blocks are the preview's top-level elements: body paragraphs in order,
+    then one per table.
+    
+    - from / to: block range [from, to)
+    - unit=placeholders: from / to are placeholder indexes instead; the
+      window covers the blocks showing them
+    - around=current (or a placeholder index) with optional size: window
+      centred on that field
+    
+    Args:
+        args: Request query parameters
+        plan: The session's preview plan
+        current_index: Index of the field being filled, if any
+        
+    Returns:
+        Block range [start, end), or None for the whole document
+        
+    Raises:
+        ValueError: If a parameter is not a valid number or unit
+    """
+    size = int(args.get('size', app.config['PREVIEW_WINDOW_SIZE']))
+    if size < 1:
+        raise ValueError('Window size must be positive')
+    
+    around = args.get('around')
+    if around is not None:
+        return plan.window_around(current_index if around == 'current' else int(around), size)
+    
+    if 'from' not in args and 'to' not in args:
+        return None
+    start = int(args.get('from', 0))
+    end = int(args.get('to', start + size))
+    unit = args.get('unit', 'blocks')
+    if unit == 'placeholders':
+        return plan.placeholder_window(start, end)
+    if unit != 'blocks':
+        raise ValueError(f"Unknown window unit '{unit}'")
+    return plan.window(start, end)
+
+
+def render_session_preview(session_id: str, session_data: Dict[str, Any],
+                           current_index: Optional[int], base_version: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Render the session's preview through the fragment cache.
+    
+    Args:
+        session_id: Session identifier
+        session_data: Session data (its preview plan is compiled if missing or stale)
+        current_index: Index of the field being filled (highlighted), if any
+        base_version: 'preview_version' the client is showing, if it accepts a delta
+        
+    Returns:
+        Response fields: 'preview_version' and either 'preview_delta'
+        (fragment id -> HTML) or 'preview' (full HTML)
+    """
+    placeholders = session_data['placeholders']
+    plan = session_preview_plan(session_id, session_data)
+    
+    try:
+        return preview_cache.render(
+            session_id, plan, placeholders, session_data['filled_values'], current_index, base_version
+        )
+    except Exception as e:
+        logger.error(f"Error rendering preview for session {session_id}: {str(e)}")
+        ensure_session_fields(session_id, session_data, ('content', 'location_index'))
+        return {'preview': doc_processor.generate_preview(
+            session_data['content'], placeholders, session_data['filled_values'], current_index,
+            session_data['location_index']
+        )}
+
+
+def apply_indexing_result(session_id: str, session_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge a finished background indexing result into a session that is still indexing.
+    
+    Placeholders already handed to the client keep their ids; only the tail
+    found after the early response is appended.
+    
+    Args:
+        session_id: Session identifier
+        session_data: Session data with 'indexing' set
+        
+    Returns:
+        Updated session data (unchanged while indexing is still running)
+    """
+    # Taken atomically: of concurrent reads, only one merges and saves
+    result = session_manager.take_indexing_result(session_id)
+    if result is None:
+        return session_data
+    
+    try:
+        merge_indexing_result(session_id, session_data, result)
+    except Exception:
+        # Left for the next read to merge
+        session_manager.save_indexing_result(session_id, result)
+        raise
+    return session_data
+
+
+def merge_indexing_result(session_id: str, session_data: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Merge a taken indexing result into the session and save it (see apply_indexing_result)"""
+    if result['status'] == 'complete':
+        delivered = session_data.get('placeholders', [])
+        session_data['content'] = result['content']
+        session_data['placeholders'] = delivered + unpack_placeholders(result['placeholders'][len(delivered):])
+        session_data['detection'] = result['detection']
+        refresh_preview_plan(session_data)
+        refresh_ai_context(session_data)
+    else:
+        session_data['indexing_error'] = result.get('error')
+    
+    session_data['indexing'] = False
+    save_session_data(session_id, session_data)
 
 
 @app.route('/')
@@ -173,7 +621,9 @@ def health_check():
         'timestamp': datetime.now().isoformat(),
         'service': 'Legal Document Automation Platform',
         'version': '1.0.0',
-        'uptime': 'operational'
+        'uptime': 'operational',
+        'detector_cache': placeholder_detector.name_cache_stats(),
+        'detection_cache': detection_cache.stats()
     })
 
 
@@ -233,39 +683,102 @@ def upload_document():
         file.save(filepath)
         logger.info(f"Saved uploaded file: {unique_filename}")
         
-        # Process document to extract content and structure
-        logger.info(f"Processing document: {unique_filename}")
-        doc_content = doc_processor.parse_document(filepath)
+        # Repeat uploads of the same template reuse a cached parse-and-detect result
+        content_hash = hash_file(filepath)
+        cached = detection_cache.get(content_hash)
+        indexing = False
+        
+        if cached:
+            logger.info(f"Detection cache hit for {unique_filename} ({content_hash[:12]})")
+            doc_content = cached['content']
+            placeholders = unpack_placeholders(cached['placeholders'])
+            cached_ids = [p.get('id', p['key']) for p in placeholders]
+            # Occurrence ids are per session, never shared between uploads
+            placeholder_detector.refresh_occurrence_ids(placeholders)
+            detection_info = dict(cached['detection'], cached=True)
+        else:
+            # Process document to extract content and structure, detecting placeholders
+            # block by block as paragraphs are parsed (bounded by a per-document CPU budget)
+            logger.info(f"Processing document: {unique_filename}")
+            doc_content = {}
+            detection_budget = DetectionBudget(app.config['DETECTION_BUDGET_SECONDS'])
+            placeholder_stream = placeholder_detector.detect_placeholders_iter(
+                doc_processor.parse_document_iter(filepath, doc_content),
+                budget=detection_budget
+            )
+            try:
+                first_placeholder = next(placeholder_stream, None)
+            except Exception as e:
+                # Not a readable .docx (bad zip, missing or malformed document part)
+                logger.error(f"Failed to parse document {unique_filename}: {e}")
+                return jsonify({
+                    'error': 'Document processing failed',
+                    'message': 'Unable to read the document. Please ensure it\'s a valid .docx file.'
+                }), 400
+            placeholders = [first_placeholder] if first_placeholder else []
+            
+            early_response = request.form.get(
+                'early_response', str(app.config['UPLOAD_EARLY_RESPONSE'])
+            ).lower() in ('1', 'true', 'yes')
+            
+            if early_response and first_placeholder:
+                # Answer with the first question now; the rest is indexed after the response
+                indexing = True
+                detection_budget.pause()
+                detection_info = {'indexing': True, 'cached': False}
+            else:
+                detection_info = finish_detection(
+                    placeholder_stream, placeholders, doc_content,
+                    detection_budget, content_hash, unique_filename
+                )
         
-        if not doc_content:
-            logger.error(f"Failed to parse document: {unique_filename}")
-            return jsonify({
-                'error': 'Document processing failed',
-                'message': 'Unable to read the document. Please ensure it\'s a valid .docx file.'
-            }), 500
+        # Placeholder ids by paragraph / table cell, used by preview and completion
+        location_index = build_location_index(placeholders)
         
-        # Detect placeholders in the document
-        placeholders = placeholder_detector.detect_placeholders(doc_content)
-        logger.info(f"Detected {len(placeholders)} placeholders in document")
+        if cached:
+            # Plans cached with the detection result; compiled if missing (over the entry size limit)
+            fill_plan = doc_processor.reuse_fill_plan(filepath, cached.get('fill_plan'), placeholders, cached_ids)
+            if fill_plan is None:
+                doc_processor.compile_fill_plan(filepath, placeholders, location_index)
+        elif not indexing:
+            # Completion only splices values into the XML (see services.fill_plan)
+            fill_plan = doc_processor.compile_fill_plan(filepath, placeholders, location_index)
+        
+        # While indexing, the session gets a snapshot; the parser keeps filling doc_content
+        session_content = doc_content
+        if indexing:
+            session_content = dict(doc_content, paragraphs=list(doc_content['paragraphs']),
+                                   tables=list(doc_content['tables']))
         
         # Initialize AI conversation context
-        ai_context = ai_service.initialize_conversation(doc_content, placeholders)
+        ai_context = ai_service.initialize_conversation(session_content, placeholders)
         
         # Store session data
         now = datetime.now().isoformat()
+        # A cached plan was compiled for the cached placeholders (ids aside, which it does not refer to)
+        preview_plan = PreviewPlan.from_data(cached.get('preview_plan')) if cached else None
+        if preview_plan is None:
+            preview_plan = doc_processor.compile_preview(session_content, placeholders, location_index)
+        if not cached and not indexing:
+            cache_detection(content_hash, doc_content, placeholders, detection_info, fill_plan, preview_plan)
         session_data = {
             'session_id': session_id,
             'filepath': filepath,
             'filename': filename,
-            'content': doc_content,
-            'placeholders': placeholders,
+            'content': session_content,
+            'placeholders': list(placeholders),
+            'location_index': location_index,
+            'preview_plan': preview_plan.data,
+            'preview_plan_id': preview_plan.plan_id,
             'filled_values': {},
             'current_placeholder_index': 0,
             'ai_context': ai_context,
             'conversation_history': [],
             'created_at': now,
             'last_accessed_at': now,  # Track last access to prevent premature expiration
-            'status': 'active'
+            'status': 'active',
+            'indexing': indexing,
+            'detection': detection_info
         }
         
         # Get user_id from token if available
@@ -287,6 +800,18 @@ def upload_document():
             'user_id': user_id
         })
         
+        if indexing:
+            threading.Thread(
+                target=index_in_background,
+                args=(session_id, placeholder_stream, list(placeholders), doc_content,
+                      detection_budget, content_hash, unique_filename),
+                name=f"index-{session_id[:8]}",
+                daemon=True
+            ).start()
+            message = 'Document uploaded successfully. Still scanning the rest of the document for placeholders.'
+        else:
+            message = f'Document uploaded successfully. Found {len(placeholders)} placeholder{"s" if len(placeholders) != 1 else ""} to fill.'
+        
         # Prepare response
         response_data = {
             'success': True,
@@ -294,8 +819,10 @@ def upload_document():
             'filename': filename,
             'placeholders_count': len(placeholders),
             'placeholders': placeholders,
-            'message': f'Document uploaded successfully. Found {len(placeholders)} placeholder{"s" if len(placeholders) != 1 else ""} to fill.',
-            'initial_message': ai_service.get_greeting_message(placeholders)
+            'message': message,
+            'initial_message': ai_service.get_greeting_message(placeholders, indexing=indexing),
+            'indexing': indexing,
+            'detection': detection_info
         }
         
         logger.info(f"Upload successful for session {session_id}")
@@ -345,7 +872,7 @@ def chat():
             }), 400
         
         # Retrieve session data with better error handling
-        session_data = get_session_data(session_id)
+        session_data = get_session_data(session_id, FILL_SESSION_FIELDS + ('ai_context', 'conversation_history'))
         if not session_data:
             # Try to get more info for debugging
             all_sessions = session_manager.get_all_sessions(limit=5)
@@ -367,6 +894,7 @@ def chat():
         current_index = session_data['current_placeholder_index']
         ai_context = session_data['ai_context']
         conversation_history = session_data.get('conversation_history', [])
+        values_before = dict(filled_values)
         
         # Add user message to history
         conversation_history.append({
@@ -425,7 +953,12 @@ def chat():
         })
         
         session_data['conversation_history'] = conversation_history
-        save_session_data(session_id, session_data)
+        if not update_session_data(session_id, {
+            'conversation_history': conversation_history,
+            'current_placeholder_index': session_data['current_placeholder_index']
+        }, changed_values(values_before, filled_values)):
+            # Reset while the reply was being generated
+            return session_expired_response()
         
         # Check if all placeholders are filled
         all_filled = len(filled_values) == len(placeholders)
@@ -441,13 +974,9 @@ def chat():
             if preview_index >= len(placeholders):
                 preview_index = None  # Safety check
         
-        # Generate fresh preview HTML to return with response
-        preview_html = doc_processor.generate_preview(
-            content=session_data['content'],
-            placeholders=placeholders,
-            filled_values=filled_values,
-            current_index=preview_index
-        )
+        # Generate fresh preview HTML to return with response (only the changed
+        # fragments if the client sent the preview_version it is showing)
+        preview = render_session_preview(session_id, session_data, preview_index, data.get('preview_version'))
         
         # Prepare response
         response_data = {
@@ -459,7 +988,7 @@ def chat():
             'all_filled': all_filled,
             'filled_values': filled_values,
             'current_placeholder': placeholders[preview_index] if preview_index is not None and preview_index < len(placeholders) else None,
-            'preview': preview_html  # NEW: fresh preview with each response
+            **preview  # Fresh preview (or delta) with each response
         }
         
         return jsonify(response_data), 200
@@ -501,7 +1030,7 @@ def edit_field():
             }), 400
         
         # Retrieve session data
-        session_data = get_session_data(session_id)
+        session_data = get_session_data(session_id, FILL_SESSION_FIELDS)
         if not session_data:
             return jsonify({
                 'error': 'Session expired',
@@ -510,6 +1039,7 @@ def edit_field():
         
         placeholders = session_data['placeholders']
         filled_values = session_data['filled_values']
+        values_before = dict(filled_values)
         
         # Find the placeholder by ID or key (support both)
         placeholder = None
@@ -560,22 +1090,20 @@ def edit_field():
         if field_index is not None:
             session_data['current_placeholder_index'] = field_index
         
-        save_session_data(session_id, session_data)
+        if not update_session_data(session_id, {
+            'current_placeholder_index': session_data['current_placeholder_index']
+        }, changed_values(values_before, filled_values)):
+            return session_expired_response()
         
         # Generate updated preview
         current_index = len(filled_values) if len(filled_values) < len(placeholders) else None
-        preview_html = doc_processor.generate_preview(
-            content=session_data['content'],
-            placeholders=placeholders,
-            filled_values=filled_values,
-            current_index=current_index
-        )
+        preview = render_session_preview(session_id, session_data, current_index, data.get('preview_version'))
         
         # Prepare response
         response_data = {
             'success': True,
             'message': f'Field "{placeholder.get("name", "Field")}" updated successfully.',
-            'preview': preview_html,
+            **preview,
             'filled_count': len(filled_values),
             'total_count': len(placeholders),
             'progress_percentage': round(
@@ -595,11 +1123,141 @@ def edit_field():
         }), 500
 
 
+@app.route('/api/redetect', methods=['POST'])
+def redetect_document():
+    """
+    Refresh placeholders after an edited version of the document is uploaded.
+    
+    Only the changed paragraphs/table cells are re-detected and spliced into
+    the session's placeholder list; placeholders (ids and filled values) at
+    untouched locations are kept.
+    
+    Form fields:
+        session_id: Existing session
+        document: Updated .docx file
+        changed (optional): JSON list of changed locations - paragraph indices
+            (ints) and/or table cells ("table-row-col" strings). When omitted,
+            changed locations are found by comparing the old and new text.
+    
+    Returns:
+        JSON response with the updated placeholders
+    """
+    try:
+        session_id = request.form.get('session_id')
+        if not session_id:
+            return jsonify({
+                'error': 'No session specified',
+                'message': 'Session ID is required for re-detection.'
+            }), 400
+        
+        session_data = get_session_data(session_id)
+        if not session_data:
+            return jsonify({
+                'error': 'Session not found',
+                'message': 'Session expired or invalid. Please upload the document again.'
+            }), 400
+        
+        if session_data.get('indexing'):
+            return jsonify({
+                'error': 'Indexing in progress',
+                'message': 'The document is still being scanned. Please try again in a moment.'
+            }), 409
+        
+        file = request.files.get('document')
+        if not file or file.filename == '' or not allowed_file(file.filename):
+            return jsonify({
+                'error': 'Invalid file format',
+                'message': 'Please upload the updated .docx file.'
+            }), 400
+        
+        changed_locations = None
+        if request.form.get('changed'):
+            try:
+                changed_locations = {
+                    ('paragraph', entry) if isinstance(entry, int) else ('table', str(entry))
+                    for entry in json.loads(request.form['changed'])
+                }
+            except (ValueError, TypeError):
+                return jsonify({
+                    'error': 'Invalid changed locations',
+                    'message': 'changed must be a JSON list of paragraph indices and "table-row-col" cells.'
+                }), 400
+        
+        # Save the updated file alongside the original upload
+        filename = secure_filename(file.filename)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = os.path.join(app.config['UPLOAD_FOLDER'], f"{session_id}_{timestamp}_{filename}")
+        file.save(filepath)
+        
+        doc_content = doc_processor.parse_document(filepath)
+        if changed_locations is None:
+            changed_locations = placeholder_detector.diff_locations(session_data['content'], doc_content)
+        
+        old_placeholders = session_data['placeholders']
+        placeholders = placeholder_detector.redetect_locations(
+            doc_content, old_placeholders, changed_locations,
+            budget=DetectionBudget(app.config['DETECTION_BUDGET_SECONDS'])
+        )
+        
+        # Drop filled values of placeholders that no longer exist
+        old_ids = {p.get('id', p['key']) for p in old_placeholders}
+        new_ids = {p.get('id', p['key']) for p in placeholders}
+        new_keys = {p['key'] for p in placeholders}
+        filled_values = session_data['filled_values']
+        for field_key in list(filled_values):
+            if field_key not in new_ids and field_key not in new_keys:
+                del filled_values[field_key]
+        
+        session_data['filepath'] = filepath
+        session_data['content'] = doc_content
+        session_data['placeholders'] = placeholders
+        refresh_preview_plan(session_data)
+        doc_processor.compile_fill_plan(filepath, placeholders, session_data['location_index'])
+        session_data['current_placeholder_index'] = next(
+            (i for i, p in enumerate(placeholders) if p.get('id', p['key']) not in filled_values),
+            len(placeholders)
+        )
+        refresh_ai_context(session_data)
+        save_session_data(session_id, session_data)
+        session_manager.add_history(session_id, 'placeholders_redetected', {
+            'filename': filename,
+            'changed_locations': len(changed_locations),
+            'added': len(new_ids - old_ids),
+            'removed': len(old_ids - new_ids)
+        })
+        
+        logger.info(
+            f"Re-detected session {session_id}: {len(changed_locations)} changed location(s), "
+            f"{len(new_ids - old_ids)} added, {len(old_ids - new_ids)} removed"
+        )
+        
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'changed_locations': len(changed_locations),
+            'added': sorted(new_ids - old_ids),
+            'removed': sorted(old_ids - new_ids),
+            'placeholders_count': len(placeholders),
+            'placeholders': placeholders,
+            'filled_values': filled_values
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error re-detecting placeholders: {str(e)}")
+        return jsonify({
+            'error': 'Re-detection error',
+            'message': 'Unable to refresh placeholders for the updated document. Please try again.'
+        }), 500
+
+
 @app.route('/api/session/health', methods=['GET'])
 def session_health():
     """
     Check if a session is still valid and active.
     
+    Supports If-None-Match with the ETag of a previous response (304 while
+    the session content is unchanged).
+    
     Returns:
         JSON response with session status
     """
@@ -613,17 +1271,23 @@ def session_health():
                 'message': 'Session ID is required.'
             }), 400
         
+        # Unchanged session: answered from its version, without loading it
+        version, not_modified = check_session_version(session_id)
+        if not_modified:
+            return not_modified
+        
         session_data = get_session_data(session_id)
         
         if session_data:
-            return jsonify({
+            return versioned_response(jsonify({
                 'valid': True,
                 'session_id': session_id,
                 'has_document': 'content' in session_data,
                 'placeholders_count': len(session_data.get('placeholders', [])),
                 'filled_count': len(session_data.get('filled_values', {})),
+                'indexing': session_data.get('indexing', False),
                 'last_accessed': session_data.get('last_accessed_at')
-            }), 200
+            }), version), 200
         else:
             return jsonify({
                 'valid': False,
@@ -688,6 +1352,8 @@ def get_session_history():
     Query params:
         session_id: Session identifier (required)
         limit: Maximum number of history entries (default: 50)
+        at: Sequence number of an entry; the response then also holds the
+            session state rebuilt as of that entry ('latest' for the current one)
     
     Returns:
         JSON response with session history
@@ -695,6 +1361,7 @@ def get_session_history():
     try:
         session_id = request.args.get('session_id')
         limit = int(request.args.get('limit', 50))
+        at = request.args.get('at')
         
         if not session_id:
             return jsonify({
@@ -703,13 +1370,18 @@ def get_session_history():
             }), 400
         
         history = session_manager.get_session_history(session_id, limit=limit)
-        
-        return jsonify({
+        response_data = {
             'success': True,
             'session_id': session_id,
             'history': history,
             'count': len(history)
-        }), 200
+        }
+        if at is not None:
+            response_data['state'] = session_manager.get_history_state(
+                session_id, None if at == 'latest' else int(at)
+            )
+        
+        return jsonify(response_data), 200
         
     except Exception as e:
         logger.error(f"Error getting session history: {str(e)}")
@@ -771,7 +1443,7 @@ def fill_field_directly():
             }), 400
         
         # Retrieve session data
-        session_data = get_session_data(session_id)
+        session_data = get_session_data(session_id, FILL_SESSION_FIELDS)
         if not session_data:
             return jsonify({
                 'error': 'Session expired',
@@ -781,6 +1453,7 @@ def fill_field_directly():
         
         placeholders = session_data['placeholders']
         filled_values = session_data['filled_values']
+        values_before = dict(filled_values)
         
         # Find placeholder by ID or key
         placeholder = None
@@ -823,7 +1496,8 @@ def fill_field_directly():
                     auto_filled.append(ph['name'])
         
         session_data['filled_values'] = filled_values
-        save_session_data(session_id, session_data)
+        if not update_session_data(session_id, {}, changed_values(values_before, filled_values)):
+            return session_expired_response()
         
         # Calculate next unfilled index
         all_filled_keys = set(filled_values.keys())
@@ -835,18 +1509,13 @@ def fill_field_directly():
                 break
         
         # Generate preview
-        preview_html = doc_processor.generate_preview(
-            content=session_data['content'],
-            placeholders=placeholders,
-            filled_values=filled_values,
-            current_index=next_index
-        )
+        preview = render_session_preview(session_id, session_data, next_index, data.get('preview_version'))
         
         response_data = {
             'success': True,
             'message': f'Field "{current_name}" filled successfully.' + 
                       (f' Auto-filled {len(auto_filled)} duplicate field(s).' if auto_filled else ''),
-            'preview': preview_html,
+            **preview,
             'filled_count': len(filled_values),
             'total_count': len(placeholders),
             'progress_percentage': round((len(filled_values) / len(placeholders) * 100), 1) if placeholders else 0,
@@ -870,6 +1539,10 @@ def preview_document():
     """
     Generate and return a preview of the document with current filled values.
     
+    Query parameters select a window of the document instead (see
+    resolve_preview_window); the response then holds only that window's
+    HTML, placeholders and filled values, plus the document totals.
+    
     Returns:
         JSON response with HTML preview of the document
     """
@@ -882,6 +1555,11 @@ def preview_document():
                 'message': 'Session ID is required for preview.'
             }), 400
         
+        # Unchanged session: answered from its version, without loading or rendering
+        version, not_modified = check_session_version(session_id)
+        if not_modified:
+            return not_modified
+        
         # Retrieve session data
         session_data = get_session_data(session_id)
         if not session_data:
@@ -898,17 +1576,49 @@ def preview_document():
         if current_index is None:
             current_index = filled_count if filled_count < len(session_data['placeholders']) else None
         
+        placeholders = session_data['placeholders']
+        filled_values = session_data['filled_values']
+        plan = session_preview_plan(session_id, session_data)
+        try:
+            window = resolve_preview_window(request.args, plan, current_index)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid preview window',
+                'message': str(e)
+            }), 400
+        
+        if window is not None:
+            # Only the window's blocks and the placeholders they show (looked up by location)
+            start, end = window
+            indexes = plan.window_placeholders(start, end)
+            window_placeholders = [placeholders[idx] for idx in indexes]
+            value_keys = {key for p in window_placeholders for key in (p.get('id', p['key']), p['key'])}
+            return versioned_response(jsonify({
+                'preview': plan.render(placeholders, filled_values, current_index, window),
+                'window': {
+                    'unit': 'blocks',
+                    'from': start,
+                    'to': end,
+                    'block_count': plan.block_count
+                },
+                'filled_count': filled_count,
+                'total_count': len(placeholders),
+                'progress_percentage': round(
+                    (filled_count / len(placeholders) * 100), 1
+                ) if placeholders else 0,
+                'placeholders': window_placeholders,
+                'placeholder_indexes': indexes,
+                'filled_values': {key: filled_values[key] for key in value_keys if key in filled_values},
+                'current_index': current_index,
+                'indexing': session_data.get('indexing', False)
+            }), version), 200
+        
         # Generate preview with current field highlighting
-        preview_html = doc_processor.generate_preview(
-            content=session_data['content'],
-            placeholders=session_data['placeholders'],
-            filled_values=session_data['filled_values'],
-            current_index=current_index
-        )
+        preview = render_session_preview(session_id, session_data, current_index, None)
         
         # Prepare response
         response_data = {
-            'preview': preview_html,
+            **preview,
             'filled_count': filled_count,
             'total_count': len(session_data['placeholders']),
             'progress_percentage': round(
@@ -916,10 +1626,11 @@ def preview_document():
             ) if session_data['placeholders'] else 0,
             'placeholders': session_data['placeholders'],
             'filled_values': session_data['filled_values'],
-            'current_index': current_index
+            'current_index': current_index,
+            'indexing': session_data.get('indexing', False)
         }
         
-        return jsonify(response_data), 200
+        return versioned_response(jsonify(response_data), version), 200
         
     except Exception as e:
         logger.error(f"Error generating preview: {str(e)}")
@@ -1010,7 +1721,8 @@ def complete_document():
             template_path=session_data['filepath'],
             output_path=output_path,
             placeholders=placeholders,
-            filled_values=filled_values
+            filled_values=filled_values,
+            location_index=session_data['location_index']
         )
         
         if not success:
@@ -1107,9 +1819,14 @@ def reset_session():
                         logger.info(f"Cleaned up file for session {session_id}")
                     except:
                         pass
+                    try:
+                        os.remove(fill_plan_path(session_data['filepath']))
+                    except OSError:
+                        pass
                 
                 # Delete session from Redis
                 session_manager.delete_session(session_id)
+                preview_cache.discard(session_id)
                 logger.info(f"Reset session: {session_id}")
         
         return jsonify({
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Core Pipeline Benchmark
+=======================
+Times the document pipeline on synthetic .docx files at several sizes:
+
+- DocumentProcessor.parse_document
+- PlaceholderDetector.detect_placeholders
+- DocumentProcessor.generate_preview (from the compiled preview plan)
+- PreviewPlan.render of a 40-block window around the middle field (windowed /api/preview)
+- DocumentProcessor.compile_fill_plan + compile_preview (done once per upload)
+- DocumentProcessor.generate_final_document (from the compiled plan)
+- With --redis: SessionManager save / update / read / delete of a session
+  holding the document, timed and counted in Redis round trips
+
+Documents are generated locally with configurable paragraph/table counts,
+placeholder density and pattern mix, so runs are reproducible (fixed seed)
+and need no network or API keys.
+
+Results are written as JSON. Timings are also reported relative to a short
+pure-Python calibration loop, which makes a baseline recorded on one machine
+usable on another with the same Python; any stage slower than baseline by
+more than the tolerance fails the run (exit code 1). The calibration loop
+does not scale like the pipeline across interpreters (parsing and
+detection are mostly lxml and regex C code), so a baseline recorded on
+another Python implementation or minor version is not compared at all
+(exit code 2): record one for this interpreter with --update-baseline. Stages under MIN_COMPARED_SECONDS (1 ms) are
+not compared, since their differences are timer noise. Session operations
+depend on the network to Redis, so they are compared by round trips only:
+any operation needing more round trips than in the baseline fails the run.
+
+Usage:
+    python benchmark.py                                  # default sizes, print JSON
+    python benchmark.py --sizes 100,1000 --repeat 5
+    python benchmark.py --parser python-docx             # time the full object-model parser
+    python benchmark.py --output results.json
+    python benchmark.py --redis                          # also time session writes (REDIS_HOST / REDIS_PORT)
+    python benchmark.py --baseline benchmark_baseline.json            # compare
+    python benchmark.py --baseline benchmark_baseline.json --update-baseline
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+from pathlib import Path
+from typing import Optional
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from docx import Document
+from redis.connection import AbstractConnection
+
+from services.document_processor import (
+    DocumentProcessor, PARSER_BACKENDS, DOCX_PARSER, DETAIL_LEVELS, DETAIL_PARAGRAPH
+)
+from services.placeholder_detector import PlaceholderDetector, build_location_index, pack_placeholders
+from services.preview_plan import plan_signature
+
+# Sample text for each placeholder pattern (keys match PlaceholderDetector pattern types)
+PATTERN_SAMPLES = {
+    'dollar_bracket': ['$[_____________]', '$[Purchase Amount]'],
+    'square_bracket': ['[Company Name]', '[Investor Name]', '[Date of Safe]'],
+    'double_curly': ['{{Effective Date}}', '{{Governing Law}}'],
+    'underscore': ['__COMPANY_NAME__', '__NOTICE_ADDRESS__'],
+    'angle_bracket': ['<PARTY NAME>', '<STATE OF INCORPORATION>'],
+    'insert_style': ['[INSERT ADDRESS]', '[INSERT TITLE]'],
+    'blank_with_description': ['__________ (Signature)', '_______ (Name)'],
+    'field_with_blank': ['Email: __________', 'Title: _______'],
+}
+
+DEFAULT_MIX = ','.join(f"{pattern}=1" for pattern in PATTERN_SAMPLES)
+
+FILLER_WORDS = (
+    'the company shall agreement party hereby investor notice provided that such '
+    'rights obligations including without limitation pursuant section terms'
+).split()
+
+STAGES = ('parse', 'detect', 'preview', 'window', 'compile', 'generate')
+
+# Stages faster than this (in baseline and run) are within timer noise and never compared
+MIN_COMPARED_SECONDS = 0.001
+
+# Blocks in the timed preview window (the app's default PREVIEW_WINDOW_SIZE)
+WINDOW_BLOCKS = 40
+
+SESSION_OPERATIONS = ('save', 'update', 'read', 'delete')
+
+# Session keys a fill reads (the app's FILL_SESSION_FIELDS)
+FILL_SESSION_FIELDS = ('placeholders', 'filled_values', 'current_placeholder_index', 'preview_plan_id')
+
+
+def parse_mix(mix: str) -> dict:
+    """Parse a 'pattern=weight,...' string into a weight table."""
+    weights = {}
+    for item in mix.split(','):
+        pattern, _, weight = item.partition('=')
+        pattern = pattern.strip()
+        if pattern not in PATTERN_SAMPLES:
+            raise ValueError(f"Unknown pattern type '{pattern}' (choose from {', '.join(PATTERN_SAMPLES)})")
+        weights[pattern] = float(weight or 1)
+    return weights
+
+
+def filler(rng: random.Random, words: int) -> str:
+    """Random filler sentence."""
+    return ' '.join(rng.choice(FILLER_WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def build_document(path: str, paragraphs: int, tables: int, rows: int, cols: int,
+                   density: float, mix: dict, seed: int = 0) -> None:
+    """
+    Write a synthetic .docx file.
+
+    Args:
+        path: Output path
+        paragraphs: Number of body paragraphs
+        tables: Number of tables
+        rows: Rows per table
+        cols: Columns per table
+        density: Fraction of paragraphs/cells that contain a placeholder
+        mix: Pattern type -> relative weight
+        seed: Random seed (same inputs always give the same document)
+    """
+    rng = random.Random(seed)
+    patterns = list(mix)
+    weights = [mix[pattern] for pattern in patterns]
+
+    def text_block(words: int) -> str:
+        text = filler(rng, words)
+        if rng.random() < density:
+            sample = rng.choice(PATTERN_SAMPLES[rng.choices(patterns, weights)[0]])
+            cut = rng.randint(0, len(text))
+            text = f"{text[:cut]} {sample} {text[cut:]}"
+        return text
+
+    doc = Document()
+    doc.add_heading('Synthetic Agreement', level=1)
+    for _ in range(paragraphs):
+        doc.add_paragraph(text_block(rng.randint(12, 40)))
+
+    for _ in range(tables):
+        table = doc.add_table(rows=rows, cols=cols)
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = text_block(rng.randint(2, 8))
+
+    doc.save(path)
+
+
+def calibrate(rounds: int = 5) -> float:
+    """Time a fixed pure-Python workload (machine speed reference)."""
+    def workload():
+        total = 0
+        text = 'placeholder ' * 200
+        for i in range(20000):
+            total += len(text.split(' ', i % 50)) + (i * i) % 7
+        return total
+
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        workload()
+        samples.append(time.perf_counter() - started)
+    return min(samples)
+
+
+def time_call(func, repeat: int):
+    """Run func repeat times; return (median seconds, min seconds, last result)."""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), min(samples), result
+
+
+class RoundTripCounter:
+    """Counts requests sent to Redis: one per command, one per pipeline."""
+
+    def __init__(self):
+        self.count = 0
+        send_packed_command = AbstractConnection.send_packed_command
+
+        def counted(connection, command, check_health=True):
+            self.count += 1
+            return send_packed_command(connection, command, check_health)
+
+        AbstractConnection.send_packed_command = counted
+
+    def measure(self, func):
+        """Run func once; return (seconds, round trips)."""
+        count = self.count
+        started = time.perf_counter()
+        func()
+        return time.perf_counter() - started, self.count - count
+
+
+def run_sessions(manager, counter: RoundTripCounter, content: dict, placeholders: list,
+                 location_index: dict, preview_plan, repeat: int) -> dict:
+    """
+    Time session storage the way the app uses it for one document: save at
+    upload, field-level update and partial read per fill, delete at reset.
+
+    Returns:
+        Median seconds and round trips per operation
+    """
+    seconds = {operation: [] for operation in SESSION_OPERATIONS}
+    round_trips = {}
+    for n in range(repeat + 1):
+        session_id = f"bench-{os.getpid()}-{len(placeholders)}-{n}"
+        session = {
+            'session_id': session_id,
+            'content': content,
+            'placeholders': pack_placeholders(placeholders),
+            'location_index': location_index,
+            'preview_plan': preview_plan.data,
+            'preview_plan_id': preview_plan.plan_id,
+            'filled_values': {},
+            'current_placeholder_index': 0,
+            'status': 'active'
+        }
+        filled = {placeholders[0]['id']: 'Value'} if placeholders else {}
+        measured = {
+            'save': counter.measure(lambda: manager.save_session(session_id, session)),
+            'update': counter.measure(lambda: manager.update_session(
+                session_id, {'current_placeholder_index': 1}, filled
+            )),
+            'read': counter.measure(lambda: manager.get_session(session_id, FILL_SESSION_FIELDS)),
+            'delete': counter.measure(lambda: manager.delete_session(session_id))
+        }
+        # The first round stores the shared template; later saves find it stored
+        if n == 0:
+            continue
+        for operation, (elapsed, trips) in measured.items():
+            seconds[operation].append(elapsed)
+            round_trips[operation] = trips
+
+    return {
+        'seconds': {operation: round(statistics.median(values), 6) for operation, values in seconds.items()},
+        'round_trips': round_trips
+    }
+
+
+def run_size(workdir: str, paragraphs: int, args, mix: dict, sessions: Optional[tuple] = None) -> dict:
+    """Build one document and time every stage on it (and session storage, given (manager, counter))."""
+    tables = max(0, round(paragraphs * args.tables_per_100 / 100))
+    source = os.path.join(workdir, f"bench_{paragraphs}.docx")
+    output = os.path.join(workdir, f"bench_{paragraphs}_out.docx")
+    build_document(source, paragraphs, tables, args.rows, args.cols, args.density, mix, seed=args.seed)
+
+    processor = DocumentProcessor(args.parser)
+    detector = PlaceholderDetector()
+
+    timings = {}
+    timings['parse'], parse_min, content = time_call(lambda: processor.parse_document(source, args.detail), args.repeat)
+    timings['detect'], detect_min, placeholders = time_call(lambda: detector.detect_placeholders(content), args.repeat)
+
+    # Stored with the session at detection time, like the app does
+    location_index = build_location_index(placeholders)
+    signature = plan_signature(placeholders)
+
+    # Fill every other placeholder so the preview renders both filled and unfilled fields
+    filled_values = {p['id']: f"Value {i}" for i, p in enumerate(placeholders) if i % 2 == 0}
+    timings['compile'], compile_min, (_, preview_plan) = time_call(
+        lambda: (processor.compile_fill_plan(source, placeholders, location_index),
+                 processor.compile_preview(content, placeholders, location_index)), args.repeat
+    )
+    timings['preview'], preview_min, _ = time_call(
+        lambda: processor.generate_preview(content, placeholders, filled_values, 1, location_index, preview_plan,
+                                           signature),
+        args.repeat
+    )
+    window = preview_plan.window_around(len(placeholders) // 2, WINDOW_BLOCKS)
+    timings['window'], window_min, _ = time_call(
+        lambda: preview_plan.render(placeholders, filled_values, 1, window), args.repeat
+    )
+    timings['generate'], generate_min, _ = time_call(
+        lambda: processor.generate_final_document(source, output, placeholders, filled_values, location_index), args.repeat
+    )
+
+    run = {
+        'paragraphs': paragraphs,
+        'tables': tables,
+        'file_bytes': os.path.getsize(source),
+        'placeholders': len(placeholders),
+        'seconds': {stage: round(value, 6) for stage, value in timings.items()},
+        'min_seconds': {
+            'parse': round(parse_min, 6),
+            'detect': round(detect_min, 6),
+            'preview': round(preview_min, 6),
+            'window': round(window_min, 6),
+            'compile': round(compile_min, 6),
+            'generate': round(generate_min, 6)
+        }
+    }
+    if sessions:
+        manager, counter = sessions
+        run['session'] = run_sessions(manager, counter, content, placeholders, location_index, preview_plan, args.repeat)
+    return run
+
+
+def interpreter(results: dict) -> str:
+    """Interpreter a result set was recorded on, as far as timings depend on it"""
+    major_minor = '.'.join(results.get('python', '').split('.')[:2])
+    return f"{results.get('python_implementation', 'CPython')} {major_minor}"
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compare calibrated timings against a baseline.
+
+    Returns:
+        List of regression descriptions (empty when within tolerance)
+    """
+    regressions = []
+    baseline_runs = {run['paragraphs']: run for run in baseline.get('runs', [])}
+    for run in results['runs']:
+        reference = baseline_runs.get(run['paragraphs'])
+        if not reference:
+            continue
+        for stage, relative in run['relative'].items():
+            expected = reference.get('relative', {}).get(stage)
+            if max(run['seconds'][stage], reference.get('seconds', {}).get(stage, 0)) < MIN_COMPARED_SECONDS:
+                continue
+            if expected and relative > expected * (1 + tolerance):
+                regressions.append(
+                    f"{stage} @ {run['paragraphs']} paragraphs: {relative:.2f} vs baseline "
+                    f"{expected:.2f} (+{(relative / expected - 1) * 100:.0f}%, tolerance {tolerance * 100:.0f}%)"
+                )
+        expected_trips = reference.get('session', {}).get('round_trips', {})
+        for operation, trips in run.get('session', {}).get('round_trips', {}).items():
+            if operation in expected_trips and trips > expected_trips[operation]:
+                regressions.append(
+                    f"session {operation} @ {run['paragraphs']} paragraphs: {trips} Redis round trips "
+                    f"vs baseline {expected_trips[operation]}"
+                )
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark parse/detect/preview/generate on synthetic documents')
+    parser.add_argument('--sizes', default='50,200,1000', help='Comma separated paragraph counts')
+    parser.add_argument('--tables-per-100', type=float, default=2, help='Tables per 100 paragraphs')
+    parser.add_argument('--rows', type=int, default=6, help='Rows per table')
+    parser.add_argument('--cols', type=int, default=3, help='Columns per table')
+    parser.add_argument('--density', type=float, default=0.3, help='Fraction of paragraphs/cells with a placeholder')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='Pattern weights, e.g. square_bracket=3,dollar_bracket=1')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per stage (median reported)')
+    parser.add_argument('--seed', type=int, default=0, help='Document generator seed')
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default=DOCX_PARSER, help='parse_document backend')
+    parser.add_argument('--detail', choices=DETAIL_LEVELS, default=DETAIL_PARAGRAPH, help='parse_document detail level')
+    parser.add_argument('--redis', action='store_true', help='Also time session storage against Redis')
+    parser.add_argument('--output', help='Write JSON results to this file (default: stdout)')
+    parser.add_argument('--baseline', help='Baseline JSON to compare against')
+    parser.add_argument('--update-baseline', action='store_true', help='Write results to --baseline instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed slowdown vs baseline (0.5 = 50%%)')
+    args = parser.parse_args()
+
+    # Keep service logging out of the timings and the output
+    logging.disable(logging.CRITICAL)
+
+    mix = parse_mix(args.mix)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    baseline = None
+    if args.baseline and not args.update_baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        current = interpreter({
+            'python': platform.python_version(), 'python_implementation': platform.python_implementation()
+        })
+        if interpreter(baseline) != current:
+            print(
+                f"[FAIL] Baseline was recorded on {interpreter(baseline)}, this is {current}: timings are "
+                f"not comparable across interpreters; record a baseline here with --update-baseline",
+                file=sys.stderr
+            )
+            return 2
+
+    sessions = None
+    if args.redis:
+        # Connects on import; only when asked, so default runs need no server
+        from services.session_manager import session_manager
+        if not session_manager.use_redis:
+            print("[FAIL] --redis given but Redis is not available", file=sys.stderr)
+            return 1
+        sessions = (session_manager, RoundTripCounter())
+
+    calibration = calibrate()
+    results = {
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'python_implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'calibration_seconds': round(calibration, 6),
+        'config': {
+            'tables_per_100': args.tables_per_100,
+            'rows': args.rows,
+            'cols': args.cols,
+            'density': args.density,
+            'mix': mix,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'parser': args.parser,
+            'detail': args.detail,
+            'redis': args.redis
+        },
+        'runs': []
+    }
+
+    with tempfile.TemporaryDirectory(prefix='lexsy_bench_') as workdir:
+        for paragraphs in sizes:
+            run = run_size(workdir, paragraphs, args, mix, sessions)
+            # Machine-independent view: stage time in units of the calibration loop
+            run['relative'] = {stage: round(seconds / calibration, 3) for stage, seconds in run['seconds'].items()}
+            results['runs'].append(run)
+            print(
+                f"[{paragraphs:>6} paragraphs, {run['placeholders']:>5} placeholders] " +
+                '  '.join(f"{stage} {run['seconds'][stage] * 1000:8.1f}ms" for stage in STAGES),
+                file=sys.stderr
+            )
+            if 'session' in run:
+                print(
+                    ' ' * 42 + '  '.join(
+                        f"{operation} {run['session']['seconds'][operation] * 1000:.1f}ms"
+                        f"/{run['session']['round_trips'][operation]}rt"
+                        for operation in SESSION_OPERATIONS
+                    ),
+                    file=sys.stderr
+                )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+    if args.baseline:
+        if args.update_baseline:
+            Path(args.baseline).write_text(output + '\n')
+            print(f"[OK] Baseline written to {args.baseline}", file=sys.stderr)
+            return 0
+
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("[FAIL] Performance regressions against baseline:", file=sys.stderr)
+            for regression in regressions:
+                print(f"   {regression}", file=sys.stderr)
+            return 1
+        print("[OK] Within baseline tolerance", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,6 +24,9 @@ from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from dateutil import parser as date_parser
 
+from .keyword_classifier import KeywordClassifier
+from .placeholder_detector import PlaceholderRecord
+
 # Import Groq client
 try:
     from groq import Groq
@@ -35,6 +38,31 @@ except ImportError:
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Common legal document patterns (first matching type wins)
+DOCUMENT_TYPE_KEYWORDS = {
+    'SAFE Agreement': ['safe', 'simple agreement for future equity', 'valuation cap'],
+    'Non-Disclosure Agreement': ['non-disclosure', 'nda', 'confidential', 'proprietary information'],
+    'Employment Agreement': ['employment', 'employee', 'compensation', 'benefits', 'termination'],
+    'Service Agreement': ['services', 'contractor', 'deliverables', 'scope of work'],
+    'Purchase Agreement': ['purchase', 'sale', 'buyer', 'seller', 'purchase price'],
+    'Terms of Service': ['terms of service', 'terms and conditions', 'user agreement'],
+    'Privacy Policy': ['privacy policy', 'personal information', 'data protection'],
+    'Partnership Agreement': ['partnership', 'partners', 'profit sharing', 'capital contribution'],
+    'Licensing Agreement': ['license', 'licensing', 'royalty', 'intellectual property'],
+    'Loan Agreement': ['loan', 'lender', 'borrower', 'interest rate', 'repayment']
+}
+
+# Placeholder categories by name terms (first matching category wins)
+PLACEHOLDER_CATEGORY_TERMS = {
+    'Company Information': ['company', 'entity', 'corporation', 'business'],
+    'Personal Information': ['name', 'person', 'individual', 'party'],
+    'Dates and Deadlines': ['date', 'time', 'deadline', 'effective', 'expiration'],
+    'Financial Terms': ['amount', 'price', 'fee', 'payment', 'valuation', '$'],
+    'Locations': ['address', 'location', 'jurisdiction', 'state', 'city'],
+    'Contact Information': ['email', 'phone', 'contact', 'telephone'],
+    'Percentages and Rates': ['percentage', 'rate', 'discount', '%']
+}
+
 
 class AIService:
     """
@@ -54,6 +82,8 @@ class AIService:
         self.provider = self._initialize_provider()
         self.conversation_history = []
         self.system_prompt = self._create_system_prompt()
+        self.document_type_classifier = KeywordClassifier(DOCUMENT_TYPE_KEYWORDS)
+        self.category_classifier = KeywordClassifier(PLACEHOLDER_CATEGORY_TERMS)
         logger.info(f"AIService initialized with provider: {self.provider}")
     
     def _initialize_provider(self) -> str:
@@ -168,26 +198,8 @@ Start with a friendly greeting and explain the process."""
         """
         text = content.get('raw_text', '').lower()
         
-        # Common legal document patterns
-        document_types = {
-            'SAFE Agreement': ['safe', 'simple agreement for future equity', 'valuation cap'],
-            'Non-Disclosure Agreement': ['non-disclosure', 'nda', 'confidential', 'proprietary information'],
-            'Employment Agreement': ['employment', 'employee', 'compensation', 'benefits', 'termination'],
-            'Service Agreement': ['services', 'contractor', 'deliverables', 'scope of work'],
-            'Purchase Agreement': ['purchase', 'sale', 'buyer', 'seller', 'purchase price'],
-            'Terms of Service': ['terms of service', 'terms and conditions', 'user agreement'],
-            'Privacy Policy': ['privacy policy', 'personal information', 'data protection'],
-            'Partnership Agreement': ['partnership', 'partners', 'profit sharing', 'capital contribution'],
-            'Licensing Agreement': ['license', 'licensing', 'royalty', 'intellectual property'],
-            'Loan Agreement': ['loan', 'lender', 'borrower', 'interest rate', 'repayment']
-        }
-        
-        # Check for document type markers
-        for doc_type, keywords in document_types.items():
-            if any(keyword in text for keyword in keywords):
-                return doc_type
-        
-        return 'Legal Agreement'
+        # Single pass over the document for all document type markers
+        return self.document_type_classifier.classify(text, default='Legal Agreement')
     
     def _categorize_placeholders(self, placeholders: List[Dict]) -> List[str]:
         """
@@ -203,32 +215,18 @@ Start with a friendly greeting and explain the process."""
         
         for placeholder in placeholders:
             name = placeholder.get('name', '').lower()
-            
-            if any(term in name for term in ['company', 'entity', 'corporation', 'business']):
-                categories.add('Company Information')
-            elif any(term in name for term in ['name', 'person', 'individual', 'party']):
-                categories.add('Personal Information')
-            elif any(term in name for term in ['date', 'time', 'deadline', 'effective', 'expiration']):
-                categories.add('Dates and Deadlines')
-            elif any(term in name for term in ['amount', 'price', 'fee', 'payment', 'valuation', '$']):
-                categories.add('Financial Terms')
-            elif any(term in name for term in ['address', 'location', 'jurisdiction', 'state', 'city']):
-                categories.add('Locations')
-            elif any(term in name for term in ['email', 'phone', 'contact', 'telephone']):
-                categories.add('Contact Information')
-            elif any(term in name for term in ['percentage', 'rate', 'discount', '%']):
-                categories.add('Percentages and Rates')
-            else:
-                categories.add('Other Terms')
+            categories.add(self.category_classifier.classify(name, default='Other Terms'))
         
         return sorted(list(categories))
     
-    def get_greeting_message(self, placeholders: List[Dict]) -> str:
+    def get_greeting_message(self, placeholders: List[Dict], indexing: bool = False) -> str:
         """
         Generate an initial greeting message with first field question.
         
         Args:
             placeholders (List[Dict]): List of placeholders
+            indexing (bool): The rest of the document is still being scanned,
+                so the field count is not final yet
             
         Returns:
             str: Greeting message with first field question
@@ -239,11 +237,18 @@ Start with a friendly greeting and explain the process."""
         # Get the first field name
         first_field = placeholders[0].get('name', 'Field') if placeholders else 'Field'
         
+        if indexing:
+            summary = "I'm still scanning the rest of your document, so let's start with the first field I found."
+        else:
+            summary = (
+                f"I've detected **{num_fields} field{'s' if num_fields != 1 else ''}** in your document "
+                f"that need{'s' if num_fields == 1 else ''} to be completed.\n\n"
+                f"⏱️ Estimated time: {estimated_time} minute{'s' if estimated_time != 1 else ''}"
+            )
+        
         greeting = f"""👋 **Welcome to Lexsy Document Assistant!**
 
-I've detected **{num_fields} field{'s' if num_fields != 1 else ''}** in your document that need{'s' if num_fields == 1 else ''} to be completed.
-
-⏱️ Estimated time: {estimated_time} minute{'s' if estimated_time != 1 else ''}
+{summary}
 
 I'll guide you through each field, validate your responses, and help ensure everything is filled correctly.
 
@@ -252,7 +257,7 @@ I'll guide you through each field, validate your responses, and help ensure ever
 """
         
         # Add the first field question
-        first_question = self._generate_placeholder_question(placeholders[0], 0, num_fields)
+        first_question = self._generate_placeholder_question(placeholders[0], 0, None if indexing else num_fields)
         
         return greeting + first_question
     
@@ -465,7 +470,7 @@ Keep it concise (1-2 sentences) and professional. Return ONLY the message."""
         }
     
     def _generate_placeholder_question(self, placeholder: Dict, 
-                                      current: int, total: int) -> str:
+                                      current: int, total: Optional[int]) -> str:
         """
         Generate a contextual question for a specific placeholder.
         Uses AI for more natural, engaging questions.
@@ -473,7 +478,7 @@ Keep it concise (1-2 sentences) and professional. Return ONLY the message."""
         Args:
             placeholder (Dict): Placeholder information
             current (int): Current position
-            total (int): Total number of placeholders
+            total (Optional[int]): Total number of placeholders (None while still indexing)
             
         Returns:
             str: Question for the placeholder
@@ -483,7 +488,10 @@ Keep it concise (1-2 sentences) and professional. Return ONLY the message."""
         placeholder_lower = name.lower()
         
         # Progress indicator with helpful hint
-        progress = f"📝 **Field {current + 1} of {total}: {name}**\n\n"
+        if total is None:
+            progress = f"📝 **Field {current + 1}: {name}**\n\n"
+        else:
+            progress = f"📝 **Field {current + 1} of {total}: {name}**\n\n"
         
         # If AI is enabled, try to generate a more engaging, natural question
         if self.provider == 'groq' and GROQ_AVAILABLE:
@@ -874,13 +882,13 @@ Your document is ready to review and download.
 
 Thank you for using Lexsy Document Assistant!"""
     
-    def analyze_field_context(self, placeholder: Dict, document_context: str) -> Dict[str, str]:
+    def analyze_field_context(self, placeholder: PlaceholderRecord, location_text: str) -> Dict[str, str]:
         """
         Use AI to analyze field context and suggest better field name and question.
         
         Args:
-            placeholder (Dict): Placeholder information
-            document_context (str): Surrounding document context
+            placeholder (PlaceholderRecord): Placeholder occurrence
+            location_text (str): Text of the placeholder's paragraph or table cell
             
         Returns:
             Dict with 'suggested_name', 'suggested_question', 'field_type'
@@ -889,7 +897,8 @@ Thank you for using Lexsy Document Assistant!"""
             try:
                 # Create a focused prompt for field analysis
                 field_name = placeholder.get('name', 'Unknown Field')
-                field_context = placeholder.get('context', document_context[:200])
+                # Records keep only the position; the context window is cut on demand
+                field_context = placeholder.context(location_text)
                 original_placeholder = placeholder.get('original', '')
                 
                 analysis_prompt = f"""Analyze this placeholder field from a legal document and suggest:
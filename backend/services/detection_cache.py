@@ -0,0 +1,287 @@
+"""
+Detection Cache
+===============
+Shared cache of parse-and-detect results keyed by the SHA-256 of the
+uploaded file bytes, so repeat uploads of the same template skip
+DocumentProcessor.parse_document and PlaceholderDetector.detect_placeholders,
+and (with the plans compiled from the result cached alongside) reading the
+package again for the fill plan and compiling the preview plan.
+
+Features:
+- Redis backend (shared by all workers) with LRU eviction via a sorted set
+- Local-disk fallback when Redis is unavailable
+- Entry count and total size limits on both backends
+- Version stamp in every key: changing detector patterns or the parse
+  format makes old entries unreachable (the next eviction drops them)
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Cache configuration
+DETECTION_CACHE_ENABLED = os.environ.get('DETECTION_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+DETECTION_CACHE_DIR = os.environ.get('DETECTION_CACHE_DIR', os.path.join('cache', 'detection'))
+DETECTION_CACHE_MAX_ENTRIES = int(os.environ.get('DETECTION_CACHE_MAX_ENTRIES', 256))
+DETECTION_CACHE_MAX_ENTRY_BYTES = int(os.environ.get('DETECTION_CACHE_MAX_ENTRY_BYTES', 4 * 1024 * 1024))
+DETECTION_CACHE_MAX_BYTES = int(os.environ.get('DETECTION_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+DETECTION_CACHE_TTL_HOURS = int(os.environ.get('DETECTION_CACHE_TTL_HOURS', 168))  # 7 days
+
+# Bump when the cached payload layout changes
+CACHE_FORMAT_VERSION = 3
+
+# Redis key prefixes
+CACHE_PREFIX = "detection_cache:"
+CACHE_LRU_KEY = "detection_cache_lru"
+
+
+def hash_file(filepath: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a file's bytes.
+
+    Args:
+        filepath: Path to the file
+        chunk_size: Read size per iteration
+
+    Returns:
+        Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DetectionCache:
+    """Content-hash keyed cache of parsed document content and detected placeholders"""
+
+    def __init__(self, version: str, redis_client=None, cache_dir: str = DETECTION_CACHE_DIR,
+                 max_entries: int = DETECTION_CACHE_MAX_ENTRIES,
+                 max_entry_bytes: int = DETECTION_CACHE_MAX_ENTRY_BYTES,
+                 max_bytes: int = DETECTION_CACHE_MAX_BYTES,
+                 enabled: bool = DETECTION_CACHE_ENABLED):
+        """
+        Args:
+            version: Stamp of everything that shapes the cached result
+                (detector patterns/tables, parse format)
+            redis_client: Connected Redis client, or None to use local disk
+            cache_dir: Directory for the local-disk backend
+            max_entries: Maximum number of cached documents
+            max_entry_bytes: Results larger than this are not cached
+            max_bytes: Total size limit of the cached entries
+            enabled: Master switch
+        """
+        self.version = hashlib.sha256(f"{CACHE_FORMAT_VERSION}:{version}".encode('utf-8')).hexdigest()[:16]
+        self.redis_client = redis_client
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if self.enabled and self.redis_client is None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        logger.info(f"DetectionCache initialized ({self.backend}, version {self.version})")
+
+    @property
+    def backend(self) -> str:
+        """Name of the active backend"""
+        if not self.enabled:
+            return 'disabled'
+        return 'redis' if self.redis_client is not None else 'disk'
+
+    def _key(self, content_hash: str) -> str:
+        return f"{CACHE_PREFIX}{self.version}:{content_hash}"
+
+    def _path(self, content_hash: str) -> Path:
+        return self.cache_dir / f"{self.version}_{content_hash}.json"
+
+    def get(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached result.
+
+        Args:
+            content_hash: SHA-256 of the uploaded file bytes
+
+        Returns:
+            Cached payload (a fresh copy) or None on a miss
+        """
+        if not self.enabled:
+            return None
+
+        data = None
+        try:
+            if self.redis_client is not None:
+                key = self._key(content_hash)
+                data = self.redis_client.get(key)
+                if data is not None:
+                    self.redis_client.zadd(CACHE_LRU_KEY, {key: time.time()})
+            else:
+                path = self._path(content_hash)
+                try:
+                    data = path.read_text(encoding='utf-8')
+                    os.utime(path)  # mtime is the LRU clock on disk
+                except FileNotFoundError:
+                    data = None
+        except Exception as e:
+            logger.error(f"Detection cache read error: {e}")
+            data = None
+
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if data is None:
+            return None
+
+        try:
+            return json.loads(data)
+        except ValueError:
+            logger.warning(f"Discarding corrupt detection cache entry {content_hash[:12]}")
+            self.delete(content_hash)
+            return None
+
+    def put(self, content_hash: str, payload: Dict[str, Any], optional: Tuple[str, ...] = ()) -> bool:
+        """
+        Store a result and evict least recently used entries over the limits.
+
+        Args:
+            content_hash: SHA-256 of the uploaded file bytes
+            payload: JSON-serializable result
+            optional: Payload keys left out, in this order, while the entry
+                exceeds max_entry_bytes
+
+        Returns:
+            True if the entry was stored
+        """
+        if not self.enabled:
+            return False
+
+        optional = [key for key in optional if key in payload]
+        while True:
+            try:
+                data = json.dumps(payload)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Detection result not cacheable: {e}")
+                return False
+            if len(data.encode('utf-8')) <= self.max_entry_bytes:
+                break
+            if not optional:
+                logger.info(f"Detection result for {content_hash[:12]} exceeds cache entry limit, not cached")
+                return False
+            payload = {key: value for key, value in payload.items() if key != optional[0]}
+            optional.pop(0)
+
+        try:
+            if self.redis_client is not None:
+                key = self._key(content_hash)
+                self.redis_client.setex(key, DETECTION_CACHE_TTL_HOURS * 3600, data)
+                self.redis_client.zadd(CACHE_LRU_KEY, {key: time.time()})
+                self._evict_redis()
+            else:
+                path = self._path(content_hash)
+                # Write-then-rename so concurrent workers never read a partial file
+                tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp_path.write_text(data, encoding='utf-8')
+                os.replace(tmp_path, path)
+                self._evict_disk()
+            return True
+        except Exception as e:
+            logger.error(f"Detection cache write error: {e}")
+            return False
+
+    def delete(self, content_hash: str) -> None:
+        """Remove a single entry"""
+        try:
+            if self.redis_client is not None:
+                key = self._key(content_hash)
+                self.redis_client.delete(key)
+                self.redis_client.zrem(CACHE_LRU_KEY, key)
+            else:
+                self._path(content_hash).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Detection cache delete error: {e}")
+
+    def _evict_redis(self) -> None:
+        """Drop other-version and expired keys, then least recently used keys beyond the limits"""
+        members = self.redis_client.zrange(CACHE_LRU_KEY, 0, -1)  # oldest first
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key in members:
+            pipe.strlen(key)  # 0 once the entry expired
+        sizes = pipe.execute() if members else []
+
+        prefix = self._key('')
+        stale = []
+        entries = []
+        for key, size in zip(members, sizes):
+            if not key.startswith(prefix) or not size:
+                stale.append(key)
+            else:
+                entries.append((key, size))
+
+        total_bytes = sum(size for _, size in entries)
+        evicted = 0
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            key, size = entries.pop(0)
+            stale.append(key)
+            total_bytes -= size
+            evicted += 1
+
+        if stale:
+            self.redis_client.delete(*stale)
+            self.redis_client.zrem(CACHE_LRU_KEY, *stale)
+        if evicted:
+            logger.info(f"Evicted {evicted} detection cache entries")
+
+    def _evict_disk(self) -> None:
+        """Drop other-version files, then least recently used files beyond the limits"""
+        entries = []
+        for path in self.cache_dir.glob('*.json'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if not path.name.startswith(f"{self.version}_"):
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        evicted = 0
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+            evicted += 1
+
+        if evicted:
+            logger.info(f"Evicted {evicted} detection cache entries")
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache usage for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': self.backend,
+                'version': self.version,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
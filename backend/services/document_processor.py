@@ -19,17 +19,38 @@ import os
 import re
 import copy
 import logging
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Iterable
 from pathlib import Path
 
 from docx import Document
 from docx.shared import RGBColor, Pt, Inches
 from docx.enum.text import WD_COLOR_INDEX
 from docx.enum.style import WD_STYLE_TYPE
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from .ooxml_parser import StreamingDocxReader, iter_table_cells
+from .fill_plan import FillPlan, plan_path
+from .package_writer import write_package
+from .placeholder_detector import build_location_index, placeholders_by_id, located_placeholders
+from .preview_plan import PreviewPlan
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Bump when the structure returned by parse_document changes (versions cached results)
+PARSE_FORMAT_VERSION = 3
+
+# parse_document detail levels (each includes the previous one)
+DETAIL_TEXT = 'text'            # paragraph index and text, table cells
+DETAIL_PARAGRAPH = 'paragraph'  # + paragraph/table style and alignment
+DETAIL_RUNS = 'runs'            # + run-level formatting (bold, italic, font...)
+DETAIL_LEVELS = (DETAIL_TEXT, DETAIL_PARAGRAPH, DETAIL_RUNS)
+
+# parse_document backend: 'streaming' (incremental XML) or 'python-docx' (full object model)
+PARSER_BACKENDS = ('streaming', 'python-docx')
+DOCX_PARSER = os.environ.get('DOCX_PARSER', 'streaming')
+
 
 class DocumentProcessor:
     """
@@ -42,26 +63,36 @@ class DocumentProcessor:
     - Creating final documents with filled values
     """
     
-    def __init__(self):
+    def __init__(self, parser_backend: str = DOCX_PARSER):
         """
         Initialize the DocumentProcessor with default settings.
+        
+        Args:
+            parser_backend (str): parse_document backend, one of PARSER_BACKENDS
         """
+        if parser_backend not in PARSER_BACKENDS:
+            raise ValueError(f"Unknown parser backend '{parser_backend}' (choose from {', '.join(PARSER_BACKENDS)})")
+        self.parser_backend = parser_backend
         self.placeholder_pattern = re.compile(r'\{\{([^}]+)\}\}')
         self.supported_formats = ['.docx', '.doc']
-        logger.info("DocumentProcessor initialized")
+        logger.info(f"DocumentProcessor initialized ({parser_backend} parser)")
     
-    def parse_document(self, filepath: str) -> Dict[str, Any]:
+    def parse_document(self, filepath: str, detail: str = DETAIL_PARAGRAPH) -> Dict[str, Any]:
         """
         Parse a DOCX document and extract its content structure.
         
         This method extracts:
-        - All paragraphs with formatting information
+        - All paragraphs, with formatting information up to ``detail``
         - Tables with cell data
         - Document metadata
         - Raw text for analysis
         
+        Run-level formatting is only built for DETAIL_RUNS; other callers can
+        fetch it for selected paragraphs later with get_paragraph_runs.
+        
         Args:
             filepath (str): Path to the DOCX file to parse
+            detail (str): One of DETAIL_LEVELS
             
         Returns:
             Dict[str, Any]: Document content structure with paragraphs, tables, and metadata
@@ -71,116 +102,361 @@ class DocumentProcessor:
             Exception: For document parsing errors
         """
         try:
-            # Validate file exists
-            if not os.path.exists(filepath):
-                logger.error(f"Document file not found: {filepath}")
-                raise FileNotFoundError(f"Document not found: {filepath}")
+            content = {}
+            for _ in self.parse_document_iter(filepath, content, detail):
+                pass
+            return content
             
-            # Open and parse the document
-            doc = Document(filepath)
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            logger.error(f"Error parsing document {filepath}: {str(e)}")
+            raise Exception(f"Document parsing failed: {str(e)}")
+    
+    def parse_document_iter(self, filepath: str, content: Dict[str, Any],
+                            detail: str = DETAIL_PARAGRAPH) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Parse a DOCX document incrementally, yielding blocks as they are read.
+        
+        ``content`` is filled in place with the same structure parse_document
+        returns; it is complete (including raw_text) once the generator is
+        exhausted, so consumers can start on early blocks without waiting
+        for the whole document.
+        
+        Args:
+            filepath (str): Path to the DOCX file to parse
+            content (Dict[str, Any]): Empty dict to populate
+            detail (str): One of DETAIL_LEVELS
+            
+        Yields:
+            Tuple[str, Dict[str, Any]]: ('paragraph', para_data) for each non-empty
+                paragraph, then ('table', table_data) for each table
+            
+        Raises:
+            FileNotFoundError: If the document file doesn't exist
+            ValueError: For an unknown detail level
+        """
+        if detail not in DETAIL_LEVELS:
+            raise ValueError(f"Unknown detail level '{detail}' (choose from {', '.join(DETAIL_LEVELS)})")
+        
+        # Validate file exists
+        if not os.path.exists(filepath):
+            logger.error(f"Document file not found: {filepath}")
+            raise FileNotFoundError(f"Document not found: {filepath}")
+        
+        if self.parser_backend == 'streaming':
+            yield from self._parse_streaming(filepath, content, detail)
+        else:
+            yield from self._parse_python_docx(filepath, content, detail)
+        
+        logger.info(f"Successfully parsed document with {len(content['paragraphs'])} paragraphs and {len(content['tables'])} tables")
+    
+    def _parse_python_docx(self, filepath: str, content: Dict[str, Any],
+                           detail: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        parse_document_iter backend that loads the full python-docx object model.
+        
+        Args:
+            filepath (str): Path to the DOCX file to parse
+            content (Dict[str, Any]): Empty dict to populate
+            detail (str): One of DETAIL_LEVELS
+            
+        Yields:
+            Tuple[str, Dict[str, Any]]: Blocks, as for parse_document_iter
+        """
+        doc = Document(filepath)
+        logger.info(f"Opened document: {filepath}")
+        
+        # Initialize content structure
+        content.update({
+            'paragraphs': [],
+            'tables': [],
+            'raw_text': '',
+            'metadata': {
+                'sections': len(doc.sections),
+                'paragraphs_count': len(doc.paragraphs),
+                'tables_count': len(doc.tables),
+                'detail': detail,
+                'core_properties': self._extract_core_properties(doc.core_properties)
+            }
+        })
+        
+        # Extract paragraphs with formatting
+        full_text = []
+        for i, paragraph in enumerate(doc.paragraphs):
+            para_text = paragraph.text.strip()
+            
+            # Skip empty paragraphs
+            if not para_text:
+                continue
+            
+            # Style lookup is the costly part of python-docx parsing; skip it for text only
+            style_name = None
+            if detail != DETAIL_TEXT:
+                style_name = paragraph.style.name if paragraph.style else None
+            
+            para_data = self._paragraph_data(i, paragraph, para_text, style_name, detail)
+            content['paragraphs'].append(para_data)
+            full_text.append(para_data['text'])
+            yield 'paragraph', para_data
+        
+        # Extract tables with structure preservation
+        for table_idx, table in enumerate(doc.tables):
+            style_name = None
+            if detail != DETAIL_TEXT:
+                style_name = table.style.name if table.style else None
+            
+            table_data = self._table_data(table_idx, table, style_name, full_text, detail)
+            content['tables'].append(table_data)
+            yield 'table', table_data
+        
+        # Combine all text for analysis
+        content['raw_text'] = '\n'.join(full_text)
+    
+    def _parse_streaming(self, filepath: str, content: Dict[str, Any],
+                         detail: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        parse_document_iter backend that streams word/document.xml.
+        
+        Produces the same content as _parse_python_docx, but only one body
+        block is held in memory at a time (see StreamingDocxReader).
+        
+        Args:
+            filepath (str): Path to the DOCX file to parse
+            content (Dict[str, Any]): Empty dict to populate
+            detail (str): One of DETAIL_LEVELS
+            
+        Yields:
+            Tuple[str, Dict[str, Any]]: Blocks, as for parse_document_iter
+        """
+        with StreamingDocxReader(filepath) as reader:
             logger.info(f"Opened document: {filepath}")
             
-            # Initialize content structure
-            content = {
+            # Counts are only known at the end of the stream
+            metadata = {
+                'sections': 0,
+                'paragraphs_count': 0,
+                'tables_count': 0,
+                'detail': detail,
+                'core_properties': self._extract_core_properties(reader.core_properties())
+            }
+            content.update({
                 'paragraphs': [],
                 'tables': [],
                 'raw_text': '',
-                'metadata': {
-                    'sections': len(doc.sections),
-                    'paragraphs_count': len(doc.paragraphs),
-                    'tables_count': len(doc.tables),
-                    'core_properties': self._extract_core_properties(doc)
-                }
-            }
+                'metadata': metadata
+            })
             
-            # Extract paragraphs with formatting
             full_text = []
-            for i, paragraph in enumerate(doc.paragraphs):
-                para_text = paragraph.text.strip()
-                
-                # Skip empty paragraphs
-                if not para_text:
-                    continue
-                
-                # Extract paragraph data
-                para_data = {
-                    'index': i,
-                    'text': para_text,
-                    'style': paragraph.style.name if paragraph.style else 'Normal',
-                    'alignment': str(paragraph.alignment) if paragraph.alignment else 'LEFT',
-                    'runs': []
-                }
-                
-                # Extract run-level formatting for precise reconstruction
-                for run in paragraph.runs:
-                    run_data = {
-                        'text': run.text,
-                        'bold': run.bold if run.bold is not None else False,
-                        'italic': run.italic if run.italic is not None else False,
-                        'underline': run.underline if run.underline else False,
-                        'font_size': run.font.size.pt if run.font.size else 12,
-                        'font_name': run.font.name if run.font.name else 'Calibri',
-                        'font_color': self._get_color_value(run.font.color) if run.font.color else None
-                    }
-                    para_data['runs'].append(run_data)
-                
-                content['paragraphs'].append(para_data)
-                full_text.append(para_text)
-            
-            # Extract tables with structure preservation
-            for table_idx, table in enumerate(doc.tables):
-                table_data = {
-                    'index': table_idx,
-                    'rows': [],
-                    'dimensions': (len(table.rows), len(table.columns) if table.rows else 0),
-                    'style': table.style.name if table.style else None
-                }
-                
-                # Extract each cell's content
-                for row_idx, row in enumerate(table.rows):
-                    row_data = []
-                    for cell_idx, cell in enumerate(row.cells):
-                        cell_text = cell.text.strip()
-                        cell_data = {
-                            'text': cell_text,
-                            'row': row_idx,
-                            'col': cell_idx,
-                            'paragraphs': [p.text for p in cell.paragraphs]
-                        }
-                        row_data.append(cell_data)
-                        
-                        # Add cell text to full text for searching
-                        if cell_text:
-                            full_text.append(cell_text)
+            table_texts = []
+            paragraph_idx = 0
+            table_idx = 0
+            for block in reader.iter_blocks():
+                if isinstance(block, Paragraph):
+                    i = paragraph_idx
+                    paragraph_idx += 1
+                    para_text = block.text.strip()
+                    if not para_text:
+                        continue
                     
-                    table_data['rows'].append(row_data)
-                
-                content['tables'].append(table_data)
+                    style_name = None
+                    if detail != DETAIL_TEXT:
+                        style_name = reader.style_name(block._p.style, WD_STYLE_TYPE.PARAGRAPH)
+                    
+                    para_data = self._paragraph_data(i, block, para_text, style_name, detail)
+                    content['paragraphs'].append(para_data)
+                    full_text.append(para_data['text'])
+                    yield 'paragraph', para_data
+                else:
+                    # Tables are reported after all paragraphs, as with python-docx;
+                    # their data is small next to the XML being released
+                    style_name = None
+                    if detail != DETAIL_TEXT:
+                        style_name = reader.style_name(block._tbl.tblStyle_val, WD_STYLE_TYPE.TABLE)
+                    
+                    table_data = self._table_data(table_idx, block, style_name, table_texts, detail)
+                    table_idx += 1
+                    content['tables'].append(table_data)
+            
+            metadata.update({
+                'sections': reader.section_count,
+                'paragraphs_count': reader.paragraph_count,
+                'tables_count': reader.table_count
+            })
+        
+        for table_data in content['tables']:
+            yield 'table', table_data
+        
+        content['raw_text'] = '\n'.join(full_text + table_texts)
+    
+    def _paragraph_data(self, index: int, paragraph: Paragraph, text: str,
+                        style_name: Optional[str], detail: str) -> Dict[str, Any]:
+        """
+        Build the parsed representation of a body paragraph.
+        
+        Args:
+            index (int): Position among all body paragraphs (empty ones included)
+            paragraph (Paragraph): python-docx paragraph
+            text (str): Stripped paragraph text
+            style_name (Optional[str]): Resolved style name (unused for DETAIL_TEXT)
+            detail (str): One of DETAIL_LEVELS
+            
+        Returns:
+            Dict[str, Any]: Paragraph data up to the requested detail level
+        """
+        para_data = {
+            'index': index,
+            'text': text
+        }
+        
+        if detail != DETAIL_TEXT:
+            para_data['style'] = style_name or 'Normal'
+            para_data['alignment'] = str(paragraph.alignment) if paragraph.alignment else 'LEFT'
+        
+        if detail == DETAIL_RUNS:
+            para_data['runs'] = self._run_data(paragraph)
+        
+        return para_data
+    
+    def _run_data(self, paragraph: Paragraph) -> List[Dict[str, Any]]:
+        """
+        Extract run-level formatting for precise reconstruction.
+        
+        Args:
+            paragraph (Paragraph): python-docx paragraph
             
-            # Combine all text for analysis
-            content['raw_text'] = '\n'.join(full_text)
+        Returns:
+            List[Dict[str, Any]]: One formatting record per run
+        """
+        runs = []
+        for run in paragraph.runs:
+            font = run.font
+            runs.append({
+                'text': run.text,
+                'bold': run.bold if run.bold is not None else False,
+                'italic': run.italic if run.italic is not None else False,
+                'underline': run.underline if run.underline else False,
+                'font_size': font.size.pt if font.size else 12,
+                'font_name': font.name if font.name else 'Calibri',
+                'font_color': self._get_color_value(font.color) if font.color else None
+            })
+        return runs
+    
+    def get_paragraph_runs(self, filepath: str,
+                           indexes: Optional[Iterable[int]] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Compute run-level formatting on demand, for documents parsed below DETAIL_RUNS.
+        
+        Only the requested paragraphs are formatted; with the streaming parser
+        reading stops after the last requested paragraph.
+        
+        Args:
+            filepath (str): Path to the DOCX file
+            indexes (Optional[Iterable[int]]): Paragraph indexes (``para['index']``);
+                None for every non-empty paragraph
             
-            logger.info(f"Successfully parsed document with {len(content['paragraphs'])} paragraphs and {len(content['tables'])} tables")
-            return content
+        Returns:
+            Dict[int, List[Dict[str, Any]]]: Paragraph index -> run records
             
-        except FileNotFoundError:
-            raise
-        except Exception as e:
-            logger.error(f"Error parsing document {filepath}: {str(e)}")
-            raise Exception(f"Document parsing failed: {str(e)}")
+        Raises:
+            FileNotFoundError: If the document file doesn't exist
+        """
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Document not found: {filepath}")
+        
+        wanted = None if indexes is None else set(indexes)
+        runs = {}
+        if wanted is not None and not wanted:
+            return runs
+        
+        for i, paragraph in enumerate(self._iter_body_paragraphs(filepath)):
+            if wanted is None:
+                if paragraph.text.strip():
+                    runs[i] = self._run_data(paragraph)
+            elif i in wanted:
+                runs[i] = self._run_data(paragraph)
+                if len(runs) == len(wanted):
+                    break
+        
+        return runs
     
-    def _extract_core_properties(self, doc: Document) -> Dict[str, Any]:
+    def _iter_body_paragraphs(self, filepath: str) -> Iterator[Paragraph]:
+        """
+        Body-level paragraphs (empty ones included) with the configured backend.
+        
+        Args:
+            filepath (str): Path to the DOCX file
+            
+        Yields:
+            Paragraph: Each body paragraph in document order
+        """
+        if self.parser_backend == 'streaming':
+            with StreamingDocxReader(filepath) as reader:
+                for block in reader.iter_blocks():
+                    if isinstance(block, Paragraph):
+                        yield block
+        else:
+            yield from Document(filepath).paragraphs
+    
+    def _table_data(self, index: int, table: Table, style_name: Optional[str],
+                    full_text: List[str], detail: str) -> Dict[str, Any]:
+        """
+        Build the parsed representation of a body table.
+        
+        Args:
+            index (int): Position among body tables
+            table (Table): python-docx table
+            style_name (Optional[str]): Resolved style name (unused for DETAIL_TEXT)
+            full_text (List[str]): Non-empty cell texts are appended here
+            detail (str): One of DETAIL_LEVELS
+            
+        Returns:
+            Dict[str, Any]: Table data with one entry per cell; merged cells
+                appear once, at their first row/grid column, with
+                'col_span'/'row_span' set when larger than 1
+        """
+        num_rows = len(table._tbl.tr_lst)
+        table_data = {
+            'index': index,
+            'rows': [[] for _ in range(num_rows)],
+            'dimensions': (num_rows, len(table.columns) if num_rows else 0)
+        }
+        if detail != DETAIL_TEXT:
+            table_data['style'] = style_name
+        
+        # Extract each cell's content
+        for table_cell in iter_table_cells(table):
+            paragraphs = [p.text for p in table_cell.cell.paragraphs]
+            cell_text = '\n'.join(paragraphs).strip()
+            cell_data = {
+                'text': cell_text,
+                'row': table_cell.row,
+                'col': table_cell.col,
+                'paragraphs': paragraphs
+            }
+            if table_cell.col_span > 1:
+                cell_data['col_span'] = table_cell.col_span
+            if table_cell.row_span > 1:
+                cell_data['row_span'] = table_cell.row_span
+            table_data['rows'][table_cell.row].append(cell_data)
+            
+            # Add cell text to full text for searching
+            if cell_text:
+                full_text.append(cell_text)
+        
+        return table_data
+    
+    def _extract_core_properties(self, core_props) -> Dict[str, Any]:
         """
         Extract document metadata and properties.
         
         Args:
-            doc (Document): python-docx Document object
+            core_props: python-docx CoreProperties object
             
         Returns:
             Dict containing document properties
         """
         try:
-            core_props = doc.core_properties
             return {
                 'title': core_props.title or 'Untitled',
                 'author': core_props.author or 'Unknown',
@@ -210,7 +486,10 @@ class DocumentProcessor:
             return None
     
     def generate_preview(self, content: Dict[str, Any], placeholders: List[Dict],
-                        filled_values: Dict[str, str], current_index: Optional[int] = None) -> str:
+                        filled_values: Dict[str, str], current_index: Optional[int] = None,
+                        location_index: Optional[Dict[str, Dict[str, List[str]]]] = None,
+                        preview_plan: Optional[PreviewPlan] = None,
+                        placeholder_signature: Optional[str] = None) -> str:
         """
         Generate an HTML preview of the document with highlighted placeholders.
         
@@ -225,206 +504,48 @@ class DocumentProcessor:
             placeholders (List[Dict]): List of detected placeholders
             filled_values (Dict[str, str]): Dictionary of filled placeholder values
             current_index (Optional[int]): Index of current field being filled (None if none)
+            location_index (Optional[Dict]): Placeholder ids by location (see
+                build_location_index); built from placeholders when not given
+            preview_plan (Optional[PreviewPlan]): Plan compiled for this content
+                and placeholder list (see compile_preview); compiled now when
+                not given or stale
+            placeholder_signature (Optional[str]): plan_signature of the
+                placeholders, if stored with them (see PreviewPlan.matches)
             
         Returns:
             str: HTML string representing the document preview
         """
         try:
-            preview_html = ['<div class="document-preview">']
-            
-            # Add custom CSS for preview styling
-            preview_html.append("""
-            <style>
-                .document-preview {
-                    font-family: 'Calibri', 'Arial', sans-serif;
-                    line-height: 1.6;
-                    color: #333;
-                    background: white;
-                    padding: 40px;
-                    max-width: 800px;
-                    margin: 0 auto;
-                }
-                .paragraph {
-                    margin-bottom: 12px;
-                }
-                .heading {
-                    font-weight: bold;
-                    font-size: 1.2em;
-                    margin-top: 20px;
-                    margin-bottom: 10px;
-                }
-                .title {
-                    font-weight: bold;
-                    font-size: 1.5em;
-                    margin-bottom: 20px;
-                    text-align: center;
-                }
-                .placeholder-current {
-                    background-color: #fee2e2;
-                    color: #991b1b;
-                    padding: 4px 8px;
-                    border-radius: 4px;
-                    font-weight: 700;
-                    border: 2px solid #dc2626;
-                    box-shadow: 0 0 8px rgba(220, 38, 38, 0.3);
-                    display: inline-block;
-                }
-                .placeholder-filled {
-                    background-color: #d4edda;
-                    color: #155724;
-                    padding: 2px 6px;
-                    border-radius: 3px;
-                    font-weight: 600;
-                    border: 1px solid #c3e6cb;
-                    cursor: pointer;
-                }
-                .placeholder-filled:hover {
-                    background-color: #c3e6cb;
-                    text-decoration: underline;
-                }
-                .placeholder-unfilled {
-                    background-color: transparent;
-                    color: #333;
-                    padding: 2px 6px;
-                    border-radius: 3px;
-                    font-weight: 500;
-                    border: 1px dashed #ccc;
-                    opacity: 0.6;
-                }
-                .document-table {
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin: 20px 0;
-                }
-                .document-table td, .document-table th {
-                    border: 1px solid #ddd;
-                    padding: 8px;
-                    text-align: left;
-                }
-                .document-table th {
-                    background-color: #f3f4f6;
-                    font-weight: bold;
-                }
-                .document-table tr:nth-child(even) {
-                    background-color: #ffffff;
-                }
-            </style>
-            """)
-            
-            # Process paragraphs
-            for para in content.get('paragraphs', []):
-                para_text = para['text']
-                
-                # Track what we've replaced to avoid double-replacement
-                replaced_in_this_para = set()
-                
-                # Replace placeholders with highlighted versions
-                for idx, placeholder in enumerate(placeholders):
-                    placeholder_key = placeholder['key']
-                    placeholder_text = placeholder['original']
-                    placeholder_name = placeholder.get('name', 'Field')
-                    placeholder_id = placeholder.get('id', placeholder_key)  # Get ID early
-                    
-                    # Check if this placeholder pattern exists in this paragraph
-                    if placeholder_text not in para_text:
-                        continue
-                    
-                    # Check if we already replaced this pattern in this paragraph
-                    if placeholder_text in replaced_in_this_para:
-                        continue
-                    
-                    is_current = (current_index is not None and idx == current_index)
-                    # Check filled status by ID first, then key as fallback
-                    is_filled = placeholder_id in filled_values or placeholder_key in filled_values
-                    
-                    # Determine CSS class and styling
-                    if is_current:
-                        # Current field - highlight in RED with field name
-                        field_name_display = f"[{placeholder_name}]"
-                        replacement = f'''<span class="placeholder-current" 
-                                       title="Field: {placeholder_name} - Currently filling this field"
-                                       data-ph="{placeholder_id}"
-                                       data-key="{placeholder_key}"
-                                       data-index="{idx}">
-                                       {field_name_display}</span>'''
-                    elif is_filled:
-                        # Filled field - show in GREEN with value and field name
-                        # Look up by ID first, then key as fallback
-                        field_value = filled_values.get(placeholder_id, filled_values.get(placeholder_key, ''))
-                        replacement = f'''<span class="placeholder-filled" 
-                                       title="Field: {placeholder_name} - Click to edit (Value: {field_value})"
-                                       data-ph="{placeholder_id}"
-                                       data-key="{placeholder_key}"
-                                       data-index="{idx}">
-                                       {field_value}</span>'''
-                    else:
-                        # Unfilled field - show minimally (no highlight until it's current)
-                        replacement = f'''<span class="placeholder-unfilled" 
-                                       title="Field: {placeholder_name} - Not yet filled"
-                                       data-ph="{placeholder_id}"
-                                       data-key="{placeholder_key}"
-                                       data-index="{idx}">
-                                       {placeholder_text}</span>'''
-                    
-                    # Replace only the FIRST occurrence
-                    para_text = para_text.replace(placeholder_text, replacement, 1)
-                    replaced_in_this_para.add(placeholder_text)
-                
-                # Apply paragraph styling based on style name
-                style_class = 'paragraph'
-                if 'heading' in para['style'].lower():
-                    style_class = 'heading'
-                elif 'title' in para['style'].lower():
-                    style_class = 'title'
-                
-                # Escape any remaining HTML entities
-                para_text = self._escape_html(para_text, preserve_spans=True)
-                
-                preview_html.append(f'<p class="{style_class}">{para_text}</p>')
-            
-            # Process tables
-            for table in content.get('tables', []):
-                preview_html.append('<table class="document-table">')
-                
-                for row_idx, row in enumerate(table['rows']):
-                    preview_html.append('<tr>')
-                    
-                    for cell in row:
-                        cell_text = cell['text'] if isinstance(cell, dict) else cell
-                        
-                        # Apply placeholder highlighting in table cells
-                        for placeholder in placeholders:
-                            placeholder_id = placeholder.get('id', placeholder['key'])
-                            # Check by ID first, then key as fallback
-                            if placeholder_id in filled_values or placeholder['key'] in filled_values:
-                                value = filled_values.get(placeholder_id, filled_values.get(placeholder['key'], ''))
-                                cell_text = cell_text.replace(
-                                    placeholder['original'],
-                                    f'<span class="placeholder-filled">{value}</span>'
-                                )
-                            else:
-                                cell_text = cell_text.replace(
-                                    placeholder['original'],
-                                    f'<span class="placeholder-unfilled">{placeholder["original"]}</span>'
-                                )
-                        
-                        # Use th for first row (header)
-                        tag = 'th' if row_idx == 0 else 'td'
-                        preview_html.append(f'<{tag}>{cell_text}</{tag}>')
-                    
-                    preview_html.append('</tr>')
-                
-                preview_html.append('</table>')
-            
-            preview_html.append('</div>')
-            
-            return '\n'.join(preview_html)
+            if preview_plan is None or not preview_plan.matches(placeholders, placeholder_signature):
+                preview_plan = self.compile_preview(content, placeholders, location_index)
+            return preview_plan.render(placeholders, filled_values, current_index)
             
         except Exception as e:
             logger.error(f"Error generating preview: {str(e)}")
             # Return a simple error message in preview
             return f'<div class="document-preview"><p style="color: red;">Error generating preview: {str(e)}</p></div>'
     
+    def compile_preview(self, content: Dict[str, Any], placeholders: List[Dict],
+                        location_index: Optional[Dict[str, Dict[str, List[str]]]] = None) -> PreviewPlan:
+        """
+        Compile the preview plan of a document (see services.preview_plan).
+        
+        Called once placeholders are final (upload, indexing, re-detection)
+        so that each preview is a join of static chunks and placeholder spans.
+        
+        Args:
+            content (Dict): Document content structure
+            placeholders (List[Dict]): Placeholders with ids and locations
+            location_index (Optional[Dict]): Placeholder ids by location (see
+                build_location_index); built from placeholders when not given
+            
+        Returns:
+            PreviewPlan: Compiled plan
+        """
+        plan = PreviewPlan.compile(content, placeholders, location_index)
+        logger.debug(f"Compiled preview plan with {plan.slot_count} placeholder slots")
+        return plan
+    
     def _escape_html(self, text: str, preserve_spans: bool = False) -> str:
         """
         Escape HTML entities while optionally preserving span tags.
@@ -445,35 +566,137 @@ class DocumentProcessor:
         
         return text
     
+    def compile_fill_plan(self, template_path: str, placeholders: List[Dict],
+                          location_index: Optional[Dict[str, Dict[str, List[str]]]] = None) -> Optional[FillPlan]:
+        """
+        Compile and store the fill plan for a template (see services.fill_plan).
+        
+        Called once placeholders are final (upload, re-detection) so that
+        generate_final_document only has to splice values into the XML.
+        
+        Args:
+            template_path (str): Path to the template document
+            placeholders (List[Dict]): Placeholders with ids and locations
+            location_index (Optional[Dict]): Placeholder ids by location (see
+                build_location_index); built from placeholders when not given
+            
+        Returns:
+            Optional[FillPlan]: The plan, or None if this template cannot be
+                completed from a plan (generation falls back to python-docx)
+        """
+        try:
+            plan = FillPlan.compile(template_path, placeholders, location_index)
+            plan.save(plan_path(template_path))
+            logger.info(f"Compiled fill plan with {plan.splice_count} splice points for {template_path}")
+            return plan
+        except Exception as e:
+            logger.warning(f"Could not compile fill plan for {template_path}: {str(e)}")
+            return None
+    
+    def reuse_fill_plan(self, template_path: str, plan_data: Optional[Dict[str, Any]],
+                        placeholders: List[Dict], previous_ids: List[str]) -> Optional[FillPlan]:
+        """
+        Store a fill plan cached for the same template bytes (see
+        services.detection_cache) instead of compiling one.
+        
+        Args:
+            template_path (str): Path to this upload of the template
+            plan_data (Optional[Dict]): Cached plan contents
+            placeholders (List[Dict]): Placeholders with this upload's ids
+            previous_ids (List[str]): Ids the cached plan was compiled with
+            
+        Returns:
+            Optional[FillPlan]: The plan, or None if none was cached (or it
+                is from another plan version); callers compile one then
+        """
+        plan = FillPlan.from_data(plan_data)
+        if plan is None:
+            return None
+        try:
+            plan = plan.rebind(template_path, placeholders, previous_ids)
+            plan.save(plan_path(template_path))
+            logger.info(f"Reused cached fill plan with {plan.splice_count} splice points for {template_path}")
+            return plan
+        except Exception as e:
+            logger.warning(f"Could not reuse cached fill plan for {template_path}: {str(e)}")
+            return None
+    
     def generate_final_document(self, template_path: str, output_path: str,
-                               placeholders: List[Dict], filled_values: Dict[str, str]) -> bool:
+                               placeholders: List[Dict], filled_values: Dict[str, str],
+                               location_index: Optional[Dict[str, Dict[str, List[str]]]] = None) -> bool:
         """
         Generate the final document with all placeholders replaced.
         
+        The template's fill plan (compiled at upload, or now if missing or
+        stale) splices the values straight into the document XML; templates
+        without a usable plan go through python-docx.
+        
+        Args:
+            template_path (str): Path to the template document
+            output_path (str): Path where the final document should be saved
+            placeholders (List[Dict]): List of placeholders to replace
+            filled_values (Dict[str, str]): Dictionary of values to insert
+            location_index (Optional[Dict]): Placeholder ids by location (see
+                build_location_index); built from placeholders when not given
+            
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        # Validate inputs
+        if not os.path.exists(template_path):
+            logger.error(f"Template document not found: {template_path}")
+            return False
+        
+        # Ensure output directory exists
+        output_dir = os.path.dirname(output_path)
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        
+        if location_index is None:
+            location_index = build_location_index(placeholders)
+        
+        plan = FillPlan.load(plan_path(template_path))
+        if plan is None or not plan.matches(template_path, placeholders):
+            plan = self.compile_fill_plan(template_path, placeholders, location_index)
+        
+        if plan is not None:
+            try:
+                replacements_made = plan.write(template_path, output_path, filled_values)
+                logger.info(f"Successfully generated document with {replacements_made} replacements: {output_path}")
+                return True
+            except Exception as e:
+                logger.warning(f"Fill plan generation failed, falling back to python-docx: {str(e)}")
+        
+        return self._generate_with_python_docx(template_path, output_path, placeholders, filled_values, location_index)
+    
+    def _generate_with_python_docx(self, template_path: str, output_path: str,
+                                   placeholders: List[Dict], filled_values: Dict[str, str],
+                                   location_index: Dict[str, Dict[str, List[str]]]) -> bool:
+        """
+        Generate the final document by editing the python-docx object model.
+        
         This method:
         1. Opens the template document
         2. Replaces all placeholders with filled values
-        3. Highlights the replaced text (optional)
-        4. Saves the completed document
+        3. Saves the completed document
         
         Args:
             template_path (str): Path to the template document
             output_path (str): Path where the final document should be saved
             placeholders (List[Dict]): List of placeholders to replace
             filled_values (Dict[str, str]): Dictionary of values to insert
+            location_index (Dict): Placeholder ids by location (see build_location_index)
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Validate inputs
-            if not os.path.exists(template_path):
-                logger.error(f"Template document not found: {template_path}")
-                return False
-            
-            # Ensure output directory exists
-            output_dir = os.path.dirname(output_path)
-            Path(output_dir).mkdir(parents=True, exist_ok=True)
+            by_id = placeholders_by_id(placeholders)
+            # The header "[Company Name]" is filled from the first filled Company Name field
+            company_name_value = next((
+                filled_values.get(ph.get('id', ph['key']), filled_values.get(ph['key'], ''))
+                for ph in placeholders
+                if ph['name'] == 'Company Name' and (ph.get('id', ph['key']) in filled_values or ph['key'] in filled_values)
+            ), None)
             
             # Load the template document
             doc = Document(template_path)
@@ -494,14 +717,8 @@ class DocumentProcessor:
                 paragraph_text = paragraph.text
                 text_changed = False
                 
-                # Filter placeholders that belong to THIS paragraph
-                para_placeholders = [
-                    p for p in placeholders 
-                    if p.get('location_type') == 'paragraph' and p.get('location') == i
-                ]
-                
-                # Replace each placeholder with its specific value
-                for placeholder in para_placeholders:
+                # Replace each placeholder of THIS paragraph with its specific value
+                for _, placeholder in located_placeholders(location_index, 'paragraph', i, by_id):
                     placeholder_id = placeholder.get('id', placeholder['key'])
                     # Check by ID first, then key as fallback
                     if (placeholder_id in filled_values or placeholder['key'] in filled_values) and placeholder['original'] in paragraph_text:
@@ -516,15 +733,10 @@ class DocumentProcessor:
                         logger.info(f"Replaced '{placeholder['name']}' (id: {placeholder_id}) in para {i}: '{old_value}' → '{new_value}'")
                 
                 # Handle auto-fill for header Company Name
-                if '[Company Name]' in paragraph_text:
-                    for ph in placeholders:
-                        ph_id = ph.get('id', ph['key'])
-                        if ph['name'] == 'Company Name' and (ph_id in filled_values or ph['key'] in filled_values):
-                            value = filled_values.get(ph_id, filled_values.get(ph['key'], ''))
-                            paragraph_text = paragraph_text.replace('[Company Name]', value, 1)
-                            text_changed = True
-                            replacements_made += 1
-                            break
+                if '[Company Name]' in paragraph_text and company_name_value is not None:
+                    paragraph_text = paragraph_text.replace('[Company Name]', company_name_value, 1)
+                    text_changed = True
+                    replacements_made += 1
                 
                 # Update paragraph if text changed
                 if text_changed:
@@ -534,44 +746,40 @@ class DocumentProcessor:
             
             # Process all tables
             for table_idx, table in enumerate(doc.tables):
-                for row_idx, row in enumerate(table.rows):
-                    for col_idx, cell in enumerate(row.cells):
-                        # Process each paragraph in the cell
-                        for paragraph in cell.paragraphs:
-                            # Replace at paragraph level to handle placeholders split across runs
-                            paragraph_text = paragraph.text
-                            text_changed = False
-                            
-                            # Build location key for this table cell
-                            table_location = f"{table_idx}-{row_idx}-{col_idx}"
-                            
-                            # Replace placeholders that match THIS table cell location
-                            for placeholder in placeholders:
-                                # Check if this placeholder belongs to this table cell
-                                placeholder_id = placeholder.get('id', placeholder['key'])
-                                if (placeholder.get('location_type') == 'table' and
-                                    str(placeholder.get('location')) == table_location and
-                                    placeholder['original'] in paragraph_text and 
-                                    (placeholder_id in filled_values or placeholder['key'] in filled_values)):
-                                    
-                                    value = filled_values.get(placeholder_id, filled_values.get(placeholder['key'], ''))
-                                    paragraph_text = paragraph_text.replace(
-                                        placeholder['original'],
-                                        value,
-                                        1  # Replace only first occurrence
-                                    )
-                                    replacements_made += 1
-                                    text_changed = True
-                                    logger.debug(f"Replaced {placeholder['name']} (id: {placeholder_id}) in table {table_location}")
-                            
-                            # Only update if text changed
-                            if text_changed:
-                                # Clear existing runs and add new text as single run
-                                paragraph.clear()
-                                paragraph.add_run(paragraph_text)
-            
-            # Save the completed document
-            doc.save(output_path)
+                for table_cell in iter_table_cells(table):
+                    # Process each paragraph in the cell
+                    for paragraph in table_cell.cell.paragraphs:
+                        # Replace at paragraph level to handle placeholders split across runs
+                        paragraph_text = paragraph.text
+                        text_changed = False
+                        
+                        # Build location key for this table cell
+                        table_location = f"{table_idx}-{table_cell.row}-{table_cell.col}"
+                        
+                        # Replace placeholders that match THIS table cell location
+                        for _, placeholder in located_placeholders(location_index, 'table', table_location, by_id):
+                            placeholder_id = placeholder.get('id', placeholder['key'])
+                            if (placeholder['original'] in paragraph_text and 
+                                (placeholder_id in filled_values or placeholder['key'] in filled_values)):
+                                
+                                value = filled_values.get(placeholder_id, filled_values.get(placeholder['key'], ''))
+                                paragraph_text = paragraph_text.replace(
+                                    placeholder['original'],
+                                    value,
+                                    1  # Replace only first occurrence
+                                )
+                                replacements_made += 1
+                                text_changed = True
+                                logger.debug(f"Replaced {placeholder['name']} (id: {placeholder_id}) in table {table_location}")
+                        
+                        # Only update if text changed
+                        if text_changed:
+                            # Clear existing runs and add new text as single run
+                            paragraph.clear()
+                            paragraph.add_run(paragraph_text)
+            
+            # Only the main document part changed; every other part is copied as-is
+            write_package(template_path, output_path, {doc.part.partname.lstrip('/'): doc.part.blob})
             logger.info(f"Successfully generated document with {replacements_made} replacements: {output_path}")
             
             return True
@@ -658,12 +866,8 @@ class DocumentProcessor:
                     break
             
             # Check for nested tables (not supported well)
-            for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        if len(cell.tables) > 0:
-                            validation_result['warnings'].append('Document contains nested tables which may not display correctly')
-                            break
+            if any(table_cell.cell._tc.tbl_lst for table in doc.tables for table_cell in iter_table_cells(table)):
+                validation_result['warnings'].append('Document contains nested tables which may not display correctly')
             
             return validation_result
             
@@ -697,10 +901,10 @@ class DocumentProcessor:
             
             # Extract text from tables
             for table in doc.tables:
-                for row in table.rows:
-                    for cell in row.cells:
-                        if cell.text.strip():
-                            text_parts.append(cell.text.strip())
+                for table_cell in iter_table_cells(table):
+                    cell_text = table_cell.cell.text.strip()
+                    if cell_text:
+                        text_parts.append(cell_text)
             
             return '\n'.join(text_parts)
             
@@ -0,0 +1,407 @@
+"""
+Fill Plan
+=========
+Compiled plan for generating completed documents without python-docx.
+
+generate_final_document used to reload the template with python-docx, scan
+every paragraph and table cell, rebuild changed paragraphs and save the whole
+package again. A fill plan does the template-dependent part once:
+
+- ``word/document.xml`` is serialized exactly as python-docx would save it,
+  cut at every paragraph that holds a placeholder (the splice points)
+- each splice point keeps the paragraph text and the placeholders (by id)
+  that belong to it, in the order generate_final_document applies them
+
+Completing a document is then a single pass over the splice points: the
+same text replacement on each paragraph, the rebuilt run escaped and joined
+between the unchanged XML segments, and the package re-zipped with every
+other part copied as-is (see services.package_writer).
+
+Author: Legal Tech Solutions
+Date: October 2025
+Version: 1.0.0
+"""
+
+import os
+import re
+import json
+import uuid
+import hashlib
+import logging
+from typing import Dict, List, Any, Optional, Tuple
+
+from lxml import etree
+from docx.oxml.parser import parse_xml
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from .ooxml_parser import StreamingDocxReader, iter_table_cells, W_BODY, W_P, W_TBL, W_PPR
+from .package_writer import write_package
+from .placeholder_detector import build_location_index
+
+logger = logging.getLogger(__name__)
+
+# Bump when the plan file layout or the compiled output changes
+FILL_PLAN_VERSION = 1
+
+# Plan files live next to the template they were compiled from
+FILL_PLAN_SUFFIX = '.plan.json'
+
+# Text python-docx refuses to write into XML (lxml raises ValueError)
+INVALID_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]')
+
+COMPANY_NAME_TEXT = '[Company Name]'
+
+
+def plan_path(template_path: str) -> str:
+    """Path of the fill plan compiled for a template"""
+    return f"{template_path}{FILL_PLAN_SUFFIX}"
+
+
+def placeholder_signature(placeholders: List[Dict]) -> str:
+    """
+    Fingerprint of everything in the placeholder list that shapes a plan.
+
+    Args:
+        placeholders (List[Dict]): Session placeholders
+
+    Returns:
+        str: Hex digest; a plan is only valid for the same signature
+    """
+    fields = [
+        [p.get('id', p['key']), p['key'], p['name'], p['original'],
+         p.get('location_type'), str(p.get('location'))]
+        for p in placeholders
+    ]
+    return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()
+
+
+def _escape_text(text: str) -> str:
+    """Escape text content the way lxml serializes it"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def run_xml(text: str) -> str:
+    """
+    Serialize a single plain run holding ``text``.
+
+    Mirrors ``paragraph.add_run(text)`` in python-docx: tabs become
+    ``<w:tab/>``, line breaks ``<w:br/>``, and text with leading or trailing
+    whitespace gets ``xml:space="preserve"``.
+
+    Args:
+        text (str): Run text
+
+    Returns:
+        str: ``<w:r>`` element markup
+
+    Raises:
+        ValueError: If the text holds characters XML cannot represent
+    """
+    if INVALID_XML_CHARS.search(text):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, no NULL bytes or control characters')
+    if not text:
+        return '<w:r/>'
+
+    parts = ['<w:r>']
+    buffer = []
+
+    def flush():
+        if buffer:
+            chunk = ''.join(buffer)
+            space = ' xml:space="preserve"' if len(chunk.strip()) < len(chunk) else ''
+            parts.append(f'<w:t{space}>{_escape_text(chunk)}</w:t>')
+            buffer.clear()
+
+    for char in text:
+        if char == '\t':
+            flush()
+            parts.append('<w:tab/>')
+        elif char in '\r\n':
+            flush()
+            parts.append('<w:br/>')
+        else:
+            buffer.append(char)
+    flush()
+
+    parts.append('</w:r>')
+    return ''.join(parts)
+
+
+class FillPlan:
+    """Splice points of one template for one placeholder list"""
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Args:
+            data (Dict[str, Any]): Plan contents (see compile / load)
+        """
+        self.data = data
+
+    @property
+    def signature(self) -> str:
+        return self.data['signature']
+
+    @property
+    def splice_count(self) -> int:
+        return len(self.data['splices'])
+
+    @classmethod
+    def compile(cls, template_path: str, placeholders: List[Dict],
+                location_index: Optional[Dict[str, Dict[str, List[str]]]] = None) -> 'FillPlan':
+        """
+        Compile the plan for a template.
+
+        Args:
+            template_path (str): Path to the template .docx
+            placeholders (List[Dict]): Placeholders with ids and locations
+            location_index (Optional[Dict]): Placeholder ids by location (see
+                build_location_index); built from placeholders when not given
+
+        Returns:
+            FillPlan: Compiled plan
+
+        Raises:
+            ValueError: If the document XML cannot be spliced safely
+        """
+        if location_index is None:
+            location_index = build_location_index(placeholders)
+        entries: Dict[str, List[str]] = {}
+        company_name = []
+        for p in placeholders:
+            entries.setdefault(p.get('id', p['key']), [p.get('id', p['key']), p['key'], p['original']])
+            if p['name'] == 'Company Name':
+                company_name.append([p.get('id', p['key']), p['key']])
+
+        def located(location_type: str, location: str) -> List[List[str]]:
+            ids = location_index[location_type].get(location, ())
+            return [entries[placeholder_id] for placeholder_id in ids if placeholder_id in entries]
+
+        body_locations = location_index['paragraph']
+        cell_locations = location_index['table']
+
+        with StreamingDocxReader(template_path) as reader:
+            part = reader.document_part
+            root = parse_xml(reader.read_part(part))
+
+        body = root.find(W_BODY)
+        if body is None:
+            raise ValueError('Document has no body')
+
+        # Same walk as generate_final_document: body paragraphs by index, then table cells
+        targets: List[Tuple[etree._Element, Dict[str, Any]]] = []
+        table_idx = 0
+        paragraph_idx = 0
+        for element in body.iterchildren(W_P, W_TBL):
+            if element.tag == W_P:
+                i = paragraph_idx
+                paragraph_idx += 1
+                text = Paragraph(element, None).text
+                if not text.strip():
+                    continue
+                has_company_name = COMPANY_NAME_TEXT in text
+                if str(i) in body_locations or has_company_name:
+                    targets.append((element, {
+                        'text': text,
+                        'placeholders': located('paragraph', str(i)),
+                        'company_name': has_company_name
+                    }))
+                continue
+
+            for table_cell in iter_table_cells(Table(element, None)):
+                location = f"{table_idx}-{table_cell.row}-{table_cell.col}"
+                if location not in cell_locations:
+                    continue
+                cell_placeholders = located('table', location)
+                for paragraph in table_cell.cell.paragraphs:
+                    # An empty <w:p/> has no text to replace (and no content to bracket)
+                    if len(paragraph._p) == 0:
+                        continue
+                    targets.append((paragraph._p, {
+                        'text': paragraph.text,
+                        'placeholders': cell_placeholders,
+                        'company_name': False
+                    }))
+            table_idx += 1
+
+        # Bracket each target's content (everything after w:pPr) with a marker comment
+        marker = f"fill-plan-{uuid.uuid4().hex}"
+        for p, _ in targets:
+            if p.prefix != 'w':
+                raise ValueError(f"Unsupported WordprocessingML prefix '{p.prefix}'")
+            ppr = p.find(W_PPR)
+            p.insert(0 if ppr is None else p.index(ppr) + 1, etree.Comment(marker))
+            p.append(etree.Comment(marker))
+
+        # Serialized exactly like python-docx saves a part
+        xml = etree.tostring(root, encoding='UTF-8', standalone=True).decode('utf-8')
+        pieces = xml.split(f"<!--{marker}-->")
+        if len(pieces) != 2 * len(targets) + 1:
+            raise ValueError('Splice markers could not be located in the serialized XML')
+
+        template_stat = os.stat(template_path)
+        return cls({
+            'version': FILL_PLAN_VERSION,
+            'template_size': template_stat.st_size,
+            'template_mtime_ns': template_stat.st_mtime_ns,
+            'part': part,
+            'signature': placeholder_signature(placeholders),
+            'segments': pieces[0::2],
+            'originals': pieces[1::2],
+            'splices': [splice for _, splice in targets],
+            'company_name': company_name
+        })
+
+    def save(self, path: str) -> None:
+        """Write the plan atomically (write-then-rename)"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(self.data, handle)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['FillPlan']:
+        """
+        Read a plan file.
+
+        Returns:
+            Optional[FillPlan]: The plan, or None if missing, unreadable or
+                from another plan version
+        """
+        try:
+            with open(path, encoding='utf-8') as handle:
+                data = json.load(handle)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable fill plan {path}: {e}")
+            return None
+        return cls.from_data(data)
+
+    @classmethod
+    def from_data(cls, data: Optional[Dict[str, Any]]) -> Optional['FillPlan']:
+        """
+        Wrap stored plan contents.
+
+        Returns:
+            Optional[FillPlan]: The plan, or None if missing or from another
+                plan version
+        """
+        if not data or data.get('version') != FILL_PLAN_VERSION:
+            return None
+        return cls(data)
+
+    def rebind(self, template_path: str, placeholders: List[Dict], previous_ids: List[str]) -> 'FillPlan':
+        """
+        The same plan for another copy of its template whose placeholders
+        got new occurrence ids (a repeat upload of the same file).
+
+        Args:
+            template_path (str): The copy
+            placeholders (List[Dict]): Placeholders with their new ids
+            previous_ids (List[str]): Ids the plan was compiled with, in the
+                same order
+
+        Returns:
+            FillPlan: Plan bound to template_path and the new ids
+        """
+        renamed = {
+            previous_id: p.get('id', p['key']) for previous_id, p in zip(previous_ids, placeholders)
+        }
+
+        def rebound(entry: List[str]) -> List[str]:
+            return [renamed.get(entry[0], entry[0])] + entry[1:]
+
+        template_stat = os.stat(template_path)
+        return FillPlan(dict(
+            self.data,
+            template_size=template_stat.st_size,
+            template_mtime_ns=template_stat.st_mtime_ns,
+            signature=placeholder_signature(placeholders),
+            splices=[
+                dict(splice, placeholders=[rebound(entry) for entry in splice['placeholders']])
+                for splice in self.data['splices']
+            ],
+            company_name=[rebound(entry) for entry in self.data['company_name']]
+        ))
+
+    def matches(self, template_path: str, placeholders: List[Dict]) -> bool:
+        """
+        Check the plan was compiled from this template file and placeholder list.
+
+        Args:
+            template_path (str): Template the plan should belong to
+            placeholders (List[Dict]): Current placeholders
+
+        Returns:
+            bool: True if the plan can be used
+        """
+        try:
+            template_stat = os.stat(template_path)
+        except OSError:
+            return False
+        return (
+            template_stat.st_size == self.data['template_size']
+            and template_stat.st_mtime_ns == self.data['template_mtime_ns']
+            and placeholder_signature(placeholders) == self.signature
+        )
+
+    def render(self, filled_values: Dict[str, str]) -> Tuple[bytes, int]:
+        """
+        Build the completed document XML.
+
+        Replacement follows generate_final_document: each placeholder of a
+        paragraph replaces the first remaining occurrence of its original
+        text, and a changed paragraph becomes a single plain run.
+
+        Args:
+            filled_values (Dict[str, str]): Values by placeholder id (or key)
+
+        Returns:
+            Tuple[bytes, int]: Document part XML and number of replacements
+        """
+        segments = self.data['segments']
+        originals = self.data['originals']
+        output = [segments[0]]
+        replacements = 0
+
+        for n, splice in enumerate(self.data['splices']):
+            text = splice['text']
+            changed = False
+
+            for placeholder_id, key, original in splice['placeholders']:
+                if (placeholder_id in filled_values or key in filled_values) and original in text:
+                    text = text.replace(original, filled_values.get(placeholder_id, filled_values.get(key, '')), 1)
+                    changed = True
+                    replacements += 1
+
+            # Header "[Company Name]" is filled from the Company Name field
+            if splice['company_name'] and COMPANY_NAME_TEXT in text:
+                for placeholder_id, key in self.data['company_name']:
+                    if placeholder_id in filled_values or key in filled_values:
+                        value = filled_values.get(placeholder_id, filled_values.get(key, ''))
+                        text = text.replace(COMPANY_NAME_TEXT, value, 1)
+                        changed = True
+                        replacements += 1
+                        break
+
+            output.append(run_xml(text) if changed else originals[n])
+            output.append(segments[n + 1])
+
+        return ''.join(output).encode('utf-8'), replacements
+
+    def write(self, template_path: str, output_path: str, filled_values: Dict[str, str]) -> int:
+        """
+        Write the completed document.
+
+        Args:
+            template_path (str): Template the plan was compiled from
+            output_path (str): Destination .docx path
+            filled_values (Dict[str, str]): Values by placeholder id (or key)
+
+        Returns:
+            int: Number of replacements made
+        """
+        document_xml, replacements = self.render(filled_values)
+        write_package(template_path, output_path, {self.data['part']: document_xml})
+        return replacements
@@ -0,0 +1,162 @@
+"""
+Keyword Classifier
+==================
+Shared multi-keyword matcher used to classify text against ordered keyword
+tables (placeholder field types, placeholder categories, document types).
+
+This module provides:
+- One-pass detection of every keyword occurring in a text
+- Ordered label tables where the first label with a hit wins
+- Extra keywords for callers that layer special-case rules on top
+
+Author: Legal Tech Solutions
+Date: October 2025
+Version: 1.0.0
+"""
+
+import re
+from typing import Dict, List, Iterable, Optional, Set, FrozenSet
+
+
+class KeywordClassifier:
+    """
+    Aho-Corasick style keyword matcher built once per keyword table.
+
+    The keywords are merged into a trie which is compiled into a single
+    regex (each node becomes an alternation over its children), so the
+    automaton runs inside the C regex engine instead of a Python loop.
+    Searching from every hit start reports the longest keyword beginning
+    at each position; the output closure (every keyword that is a
+    substring of that keyword) then recovers overlapping and nested hits,
+    giving the same answer as testing ``keyword in text`` for each keyword.
+
+    Matching is case-sensitive; callers lower-case text as before.
+    """
+
+    def __init__(self, table: Dict[str, List[str]], extra_keywords: Iterable[str] = ()):
+        """
+        Build the automaton for a keyword table.
+
+        Args:
+            table (Dict[str, List[str]]): Ordered mapping of label -> keywords;
+                earlier labels take precedence in ``classify``
+            extra_keywords (Iterable[str]): Keywords reported by
+                ``find_keywords`` without belonging to any label
+        """
+        self.labels = list(table)
+        self._label_keywords = {label: frozenset(keywords) for label, keywords in table.items()}
+
+        keywords = set(extra_keywords)
+        for label_keywords in self._label_keywords.values():
+            keywords.update(label_keywords)
+        keywords.discard('')
+        self.keywords = frozenset(keywords)
+
+        # Output closure: a hit on a keyword implies a hit on all its substrings
+        self._outputs: Dict[str, FrozenSet[str]] = {
+            keyword: frozenset(other for other in self.keywords if other in keyword)
+            for keyword in self.keywords
+        }
+
+        # Precedence index of each keyword's best label (for early exit)
+        self._keyword_rank: Dict[str, int] = {}
+        for rank, label in enumerate(self.labels):
+            for keyword in self._label_keywords[label]:
+                self._keyword_rank.setdefault(keyword, rank)
+
+        self._automaton = self._compile_trie(self.keywords)
+
+    @staticmethod
+    def _compile_trie(keywords: Iterable[str]) -> Optional[re.Pattern]:
+        """
+        Compile keywords into a trie-shaped regex that prefers the longest match.
+
+        Args:
+            keywords (Iterable[str]): Keywords to match
+
+        Returns:
+            Optional[re.Pattern]: Compiled automaton, or None for an empty table
+        """
+        trie: Dict = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}  # End-of-keyword marker
+
+        if not trie:
+            return None
+
+        def emit(node: Dict) -> str:
+            branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+            if not branches:
+                return ''
+            body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+            # A keyword ends here: the continuation is optional (greedy = longest)
+            if '' in node:
+                body = '(?:' + body + ')?'
+            return body
+
+        return re.compile(emit(trie))
+
+    def find_keywords(self, text: str, stop_rank: Optional[int] = None) -> Set[str]:
+        """
+        Find every keyword occurring in the text in a single pass.
+
+        Args:
+            text (str): Text to scan (already lower-cased by the caller)
+            stop_rank (Optional[int]): Stop as soon as a keyword of a label
+                ranked at or above this index is found
+
+        Returns:
+            Set[str]: Keywords occurring anywhere in the text
+        """
+        hits: Set[str] = set()
+        if self._automaton is None:
+            return hits
+
+        search = self._automaton.search
+        outputs = self._outputs
+        position = 0
+
+        while True:
+            match = search(text, position)
+            if match is None:
+                return hits
+
+            found = outputs[match.group()]
+            hits.update(found)
+
+            if stop_rank is not None and any(
+                self._keyword_rank.get(keyword, stop_rank + 1) <= stop_rank for keyword in found
+            ):
+                return hits
+
+            position = match.start() + 1
+
+    def matched_labels(self, hits: Set[str]) -> List[str]:
+        """
+        Map keyword hits to labels in precedence order.
+
+        Args:
+            hits (Set[str]): Keywords returned by ``find_keywords``
+
+        Returns:
+            List[str]: Labels with at least one keyword hit, in table order
+        """
+        return [label for label in self.labels if not self._label_keywords[label].isdisjoint(hits)]
+
+    def classify(self, text: str, default: Optional[str] = None) -> Optional[str]:
+        """
+        Return the first label (in table order) with a keyword in the text.
+
+        Args:
+            text (str): Text to classify (already lower-cased by the caller)
+            default (Optional[str]): Label returned when nothing matches
+
+        Returns:
+            Optional[str]: Winning label or the default
+        """
+        # The top-precedence label cannot be beaten, so stop on its first hit
+        labels = self.matched_labels(self.find_keywords(text, stop_rank=0))
+        return labels[0] if labels else default
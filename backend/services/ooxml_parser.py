@@ -0,0 +1,332 @@
+"""
+Streaming OOXML Reader
+======================
+Incremental reader for the body of a .docx package, used as the default
+parser backend of DocumentProcessor.parse_document.
+
+python-docx's ``Document()`` loads every part of the package and keeps the
+whole ``word/document.xml`` tree alive while we walk it. This reader streams
+``word/document.xml`` out of the zip with ``lxml.etree.iterparse`` instead:
+
+- Body-level paragraphs and tables are handed out one at a time, as soon as
+  their closing tag is read, then cleared and detached from the tree, so
+  memory is bounded by the largest single block rather than the document
+- Elements use python-docx's oxml classes, so text, run and cell semantics
+  (tabs, breaks, hyperlinks, merged cells) are exactly those of python-docx
+- Styles and core properties are read once from their own (small) parts
+
+It also provides the table walker shared by every DocumentProcessor method
+that reads tables (see iter_table_cells).
+
+Author: Legal Tech Solutions
+Date: October 2025
+Version: 1.0.0
+"""
+
+import zipfile
+import posixpath
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from lxml import etree
+from docx.enum.style import WD_STYLE_TYPE
+from docx.opc.constants import CONTENT_TYPE as CT, RELATIONSHIP_TYPE as RT
+from docx.opc.coreprops import CoreProperties
+from docx.oxml.coreprops import CT_CoreProperties
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup, parse_xml
+from docx.oxml.simpletypes import ST_Merge
+from docx.parts.styles import StylesPart
+from docx.styles.styles import Styles
+from docx.table import Table, _Cell
+from docx.text.paragraph import Paragraph
+
+logger = logging.getLogger(__name__)
+
+# Package-level namespaces (not WordprocessingML, so not in docx.oxml.ns)
+RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+CONTENT_TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+W_BODY = qn('w:body')
+W_P = qn('w:p')
+W_TBL = qn('w:tbl')
+W_PPR = qn('w:pPr')
+W_SECTPR = qn('w:sectPr')
+W_GRID_BEFORE_XPATH = './w:trPr/w:gridBefore/@w:val'
+
+
+class StreamingDocxReader:
+    """
+    Read the body of a .docx file block by block.
+
+    Usage::
+
+        with StreamingDocxReader(path) as reader:
+            for paragraph_or_table in reader.iter_blocks():
+                ...
+            reader.paragraph_count, reader.table_count, reader.section_count
+
+    Blocks are python-docx ``Paragraph`` / ``Table`` proxies without a parent
+    part; use ``style_name`` instead of their ``style`` property. A block is
+    only valid until the iterator advances.
+    """
+
+    def __init__(self, filepath: str):
+        """
+        Open the package and locate the main document part.
+
+        Args:
+            filepath (str): Path to the .docx file
+
+        Raises:
+            ValueError: If the package has no WordprocessingML main document
+            zipfile.BadZipFile: If the file is not a zip package
+        """
+        self.filepath = filepath
+        self._zip = zipfile.ZipFile(filepath)
+        self._names = set(self._zip.namelist())
+
+        package_rels = self._read_rels('')
+        self.document_part = package_rels.get(RT.OFFICE_DOCUMENT)
+        if self.document_part is None or self.document_part not in self._names:
+            self.close()
+            raise ValueError(f"file '{filepath}' has no main document part")
+
+        content_type = self._content_type(self.document_part)
+        if content_type != CT.WML_DOCUMENT_MAIN:
+            self.close()
+            raise ValueError(f"file '{filepath}' is not a Word file, content type is '{content_type}'")
+
+        self._core_part = package_rels.get(RT.CORE_PROPERTIES)
+        self._document_rels = self._read_rels(self.document_part)
+        self._styles: Optional[Styles] = None
+        self._style_names: Dict[Tuple[Optional[str], WD_STYLE_TYPE], Optional[str]] = {}
+
+        self.paragraph_count = 0
+        self.table_count = 0
+        self.section_count = 0
+
+    def __enter__(self) -> 'StreamingDocxReader':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the underlying zip file"""
+        self._zip.close()
+
+    def read_part(self, part_name: str) -> bytes:
+        """
+        Raw bytes of a package part.
+
+        Args:
+            part_name (str): Part name without leading slash (e.g. 'word/document.xml')
+
+        Returns:
+            bytes: Decompressed part content
+        """
+        return self._zip.read(part_name)
+
+    def _read_rels(self, source_part: str) -> Dict[str, str]:
+        """
+        Map relationship type -> target part name for a part (first of each type).
+
+        Args:
+            source_part (str): Part name, or '' for the package itself
+
+        Returns:
+            Dict[str, str]: Internal relationships of the part
+        """
+        directory, filename = posixpath.split(source_part)
+        rels_name = posixpath.join(directory, '_rels', f"{filename}.rels")
+        if rels_name not in self._names:
+            return {}
+
+        targets = {}
+        root = etree.fromstring(self._zip.read(rels_name))
+        for rel in root.iter(f"{{{RELS_NS}}}Relationship"):
+            if rel.get('TargetMode') == 'External':
+                continue
+            target = rel.get('Target', '')
+            if target.startswith('/'):
+                part_name = target.lstrip('/')
+            else:
+                part_name = posixpath.normpath(posixpath.join(directory, target))
+            targets.setdefault(rel.get('Type'), part_name)
+        return targets
+
+    def _content_type(self, part_name: str) -> Optional[str]:
+        """Content type of a part from [Content_Types].xml (override, then extension default)"""
+        root = etree.fromstring(self._zip.read('[Content_Types].xml'))
+        for override in root.iter(f"{{{CONTENT_TYPES_NS}}}Override"):
+            if override.get('PartName', '').lstrip('/').lower() == part_name.lower():
+                return override.get('ContentType')
+        extension = posixpath.splitext(part_name)[1].lstrip('.').lower()
+        for default in root.iter(f"{{{CONTENT_TYPES_NS}}}Default"):
+            if default.get('Extension', '').lower() == extension:
+                return default.get('ContentType')
+        return None
+
+    def core_properties(self) -> CoreProperties:
+        """
+        Core document properties (title, author, dates...).
+
+        Returns:
+            CoreProperties: Parsed docProps/core.xml, or python-docx's defaults
+                when the package has none
+        """
+        if self._core_part and self._core_part in self._names:
+            return CoreProperties(parse_xml(self._zip.read(self._core_part)))
+
+        # Same values python-docx fills in for a package without core properties
+        core_properties = CoreProperties(CT_CoreProperties.new())
+        core_properties.title = 'Word Document'
+        core_properties.last_modified_by = 'python-docx'
+        core_properties.revision = 1
+        core_properties.modified = datetime.utcnow()
+        return core_properties
+
+    @property
+    def styles(self) -> Styles:
+        """Styles of the document (python-docx's default styles if it has none)"""
+        if self._styles is None:
+            styles_part = self._document_rels.get(RT.STYLES)
+            if styles_part and styles_part in self._names:
+                xml = self._zip.read(styles_part)
+            else:
+                xml = StylesPart._default_styles_xml()
+            self._styles = Styles(parse_xml(xml))
+        return self._styles
+
+    def style_name(self, style_id: Optional[str], style_type: WD_STYLE_TYPE) -> Optional[str]:
+        """
+        UI name of a style, resolved like python-docx's ``paragraph.style.name``.
+
+        Unknown, missing or wrong-type style ids fall back to the document's
+        default style for ``style_type``. Results are memoized per id.
+
+        Args:
+            style_id (Optional[str]): Style id referenced by the block
+            style_type (WD_STYLE_TYPE): Style type of the block
+
+        Returns:
+            Optional[str]: Style name, or None if no style applies
+        """
+        key = (style_id, style_type)
+        if key not in self._style_names:
+            style = self.styles.get_by_id(style_id, style_type)
+            self._style_names[key] = style.name if style is not None else None
+        return self._style_names[key]
+
+    def iter_blocks(self) -> Iterator[Union[Paragraph, Table]]:
+        """
+        Stream body-level paragraphs and tables in document order.
+
+        Counts (paragraph_count, table_count, section_count) are final once
+        the iterator is exhausted. Paragraphs count empty ones too, matching
+        ``len(doc.paragraphs)``.
+
+        Yields:
+            Union[Paragraph, Table]: Each body-level block
+        """
+        with self._zip.open(self.document_part) as stream:
+            events = etree.iterparse(
+                stream, events=('start', 'end'),
+                remove_blank_text=True, resolve_entities=False
+            )
+            events.set_element_class_lookup(element_class_lookup)
+
+            body = None
+            for event, element in events:
+                if event == 'start':
+                    if body is None and element.tag == W_BODY:
+                        body = element
+                    continue
+
+                if body is None or element.getparent() is not body:
+                    continue
+
+                tag = element.tag
+                if tag == W_P:
+                    self.paragraph_count += 1
+                    # Section breaks other than the last live in w:p/w:pPr/w:sectPr
+                    ppr = element.find(W_PPR)
+                    if ppr is not None and ppr.find(W_SECTPR) is not None:
+                        self.section_count += 1
+                    yield Paragraph(element, None)
+                elif tag == W_TBL:
+                    self.table_count += 1
+                    yield Table(element, None)
+                elif tag == W_SECTPR:
+                    self.section_count += 1
+
+                # Done with this block: drop it so the tree never grows
+                element.clear()
+                body.remove(element)
+
+        logger.debug(
+            f"Streamed {self.paragraph_count} paragraphs, {self.table_count} tables "
+            f"from {self.filepath}"
+        )
+
+
+class TableCell:
+    """One physical table cell at its position in the layout grid"""
+
+    __slots__ = ('row', 'col', 'cell', 'col_span', 'row_span')
+
+    def __init__(self, row: int, col: int, cell: _Cell, col_span: int = 1, row_span: int = 1):
+        self.row = row
+        self.col = col
+        self.cell = cell
+        self.col_span = col_span
+        self.row_span = row_span
+
+    def __repr__(self) -> str:
+        return f"TableCell(row={self.row}, col={self.col}, span={self.row_span}x{self.col_span})"
+
+
+def iter_table_cells(table: Table) -> Iterator[TableCell]:
+    """
+    Yield each cell of a table exactly once, in row order.
+
+    python-docx's ``row.cells`` rebuilds the whole cell grid on every call
+    and repeats merged cells once per grid column / row they cover. This
+    walks the ``w:tc`` elements of each row once instead:
+
+    - a horizontally merged cell (``gridSpan``) is yielded once, at the grid
+      column where it starts, with ``col_span`` set
+    - vertical merge continuations (``vMerge``) are not yielded; they extend
+      the ``row_span`` of the cell above
+    - ``col`` is the grid column, so cells after a merge keep the column
+      index python-docx reports for them
+
+    Args:
+        table (Table): python-docx table (parent may be None)
+
+    Returns:
+        Iterator[TableCell]: Cells with their grid position and spans
+    """
+    cells: List[TableCell] = []
+    # Grid column -> cell currently open for vertical merging there
+    open_cells: Dict[int, TableCell] = {}
+
+    for row_idx, tr in enumerate(table._tbl.tr_lst):
+        grid_before = tr.xpath(W_GRID_BEFORE_XPATH)
+        col = int(grid_before[0]) if grid_before else 0
+        for tc in tr.tc_lst:
+            span = tc.grid_span
+            above = open_cells.get(col)
+            if tc.vMerge == ST_Merge.CONTINUE and above is not None and above.col_span == span:
+                above.row_span += 1
+            else:
+                cell = TableCell(row_idx, col, _Cell(tc, table), span)
+                cells.append(cell)
+                for covered in range(col + 1, col + span):
+                    open_cells.pop(covered, None)
+                open_cells[col] = cell
+            col += span
+
+    return iter(cells)
@@ -0,0 +1,153 @@
+"""
+Package Writer
+==============
+Writes a completed .docx as a copy of its template package in which only
+the modified parts are re-encoded.
+
+Saving through python-docx (or re-adding every entry with zipfile)
+decompresses and re-deflates every part of the package - images, fonts,
+styles, embedded objects - although completion only changes
+``word/document.xml``. Here unchanged entries are copied byte-for-byte in
+their compressed form (same CRC, sizes and compression method); only the
+replaced parts are deflated.
+
+Author: Legal Tech Solutions
+Date: October 2025
+Version: 1.0.0
+"""
+
+import os
+import zlib
+import struct
+import logging
+import zipfile
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# ZIP record layouts (APPNOTE 4.3.7, 4.3.12, 4.3.16)
+LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+END_RECORD = struct.Struct('<4s4H2LH')
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+CENTRAL_HEADER_SIGNATURE = b'PK\x01\x02'
+END_RECORD_SIGNATURE = b'PK\x05\x06'
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8_NAME = 0x800
+ZIP64_LIMIT = 0xFFFFFFFF
+MAX_ENTRIES = 0xFFFF
+DEFLATE_VERSION = 20
+
+
+def _dos_datetime(date_time) -> tuple:
+    """(dostime, dosdate) for a ZipInfo.date_time tuple"""
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11 | minute << 5 | second // 2,
+            (year - 1980) << 9 | month << 5 | day)
+
+
+def write_package(template_path: str, output_path: str, replaced_parts: Dict[str, bytes]) -> None:
+    """
+    Write a copy of a .docx package with some parts replaced.
+
+    Entries keep their order, names, timestamps and attributes. Entries in
+    ``replaced_parts`` are deflated from the new bytes; every other entry is
+    copied without decompressing it.
+
+    Args:
+        template_path (str): Source package
+        output_path (str): Destination path (written atomically)
+        replaced_parts (Dict[str, bytes]): Zip entry name -> new content
+
+    Raises:
+        KeyError: If a replaced part is not an entry of the template
+        zipfile.BadZipFile: If the template is not a readable zip
+    """
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        with zipfile.ZipFile(template_path) as source:
+            entries = source.infolist()
+            missing = set(replaced_parts) - {info.filename for info in entries}
+            if missing:
+                raise KeyError(f"Parts not in package: {', '.join(sorted(missing))}")
+            if len(entries) >= MAX_ENTRIES or any(
+                info.file_size >= ZIP64_LIMIT or info.compress_size >= ZIP64_LIMIT
+                or info.header_offset >= ZIP64_LIMIT for info in entries
+            ):
+                # Zip64 packages are rare for Word documents; let zipfile handle them
+                _rewrite_package(source, tmp_path, replaced_parts)
+            else:
+                with open(template_path, 'rb') as raw_source, open(tmp_path, 'wb') as target:
+                    _copy_entries(entries, raw_source, target, replaced_parts)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _copy_entries(entries, raw_source, target, replaced_parts: Dict[str, bytes]) -> None:
+    """Stream every entry into ``target``, then write the central directory"""
+    central_directory = []
+
+    for info in entries:
+        name = info.filename.encode('utf-8')
+        flags = info.flag_bits & ~FLAG_DATA_DESCRIPTOR
+        if any(ord(char) > 0x7F for char in info.filename):
+            flags |= FLAG_UTF8_NAME
+        extract_version = info.extract_version
+
+        if info.filename in replaced_parts:
+            content = replaced_parts[info.filename]
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            data = compressor.compress(content) + compressor.flush()
+            crc = zlib.crc32(content) & 0xFFFFFFFF
+            compress_type = zipfile.ZIP_DEFLATED
+            file_size = len(content)
+            extract_version = max(extract_version, DEFLATE_VERSION)
+        else:
+            # The data starts after the local header's variable-length name and extra fields
+            raw_source.seek(info.header_offset)
+            header = raw_source.read(LOCAL_HEADER.size)
+            if header[:4] != LOCAL_HEADER_SIGNATURE:
+                raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+            name_length, extra_length = struct.unpack('<2H', header[26:30])
+            raw_source.seek(name_length + extra_length, os.SEEK_CUR)
+            data = raw_source.read(info.compress_size)
+            crc = info.CRC
+            compress_type = info.compress_type
+            file_size = info.file_size
+
+        dostime, dosdate = _dos_datetime(info.date_time)
+        offset = target.tell()
+        target.write(LOCAL_HEADER.pack(
+            LOCAL_HEADER_SIGNATURE, extract_version, info.reserved, flags, compress_type,
+            dostime, dosdate, crc, len(data), file_size, len(name), 0
+        ))
+        target.write(name)
+        target.write(data)
+
+        comment = info.comment or b''
+        central_directory.append(CENTRAL_HEADER.pack(
+            CENTRAL_HEADER_SIGNATURE, info.create_version, info.create_system, extract_version,
+            info.reserved, flags, compress_type, dostime, dosdate, crc, len(data), file_size,
+            len(name), 0, len(comment), 0, info.internal_attr, info.external_attr, offset
+        ) + name + comment)
+
+    directory_offset = target.tell()
+    for record in central_directory:
+        target.write(record)
+    directory_size = target.tell() - directory_offset
+
+    target.write(END_RECORD.pack(
+        END_RECORD_SIGNATURE, 0, 0, len(central_directory), len(central_directory),
+        directory_size, directory_offset, 0
+    ))
+
+
+def _rewrite_package(source: zipfile.ZipFile, output_path: str, replaced_parts: Dict[str, bytes]) -> None:
+    """Fallback: re-add every entry through zipfile (recompresses unchanged parts)"""
+    logger.info("Package needs Zip64, rewriting all entries")
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, allowZip64=True) as target:
+        for info in source.infolist():
+            target.writestr(info, replaced_parts.get(info.filename, source.read(info)))
@@ -18,15 +18,498 @@ Version: 1.0.0
 """
 
 import re
+import json
+import time
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional, Set, Tuple
+import threading
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional, Set, Tuple, Union, Iterable, Iterator
 from collections import OrderedDict
+from collections.abc import Mapping
 from datetime import datetime, timedelta
 from uuid import uuid4
 
+from .keyword_classifier import KeywordClassifier
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Default per-document CPU budget for guarded detection (seconds)
+DEFAULT_DETECTION_BUDGET_SECONDS = 5.0
+
+# Bump when a change to the detection code (rather than its tables) changes
+# results, so cached detections from the old code are not reused
+DETECTION_LOGIC_VERSION = 2
+
+# Phrases consulted by the special-case rules in _identify_placeholder_type
+TYPE_SPECIAL_TERMS = (
+    'address', 'state of incorporation', 'governing law', 'valuation cap',
+    'discount rate', 'purchase amount', 'date of safe', 'safe date',
+    'investor name', 'company name', 'term', 'month', 'number of month',
+    'number', 'count', 'quantity', 'duration', 'period', 'state', 'incorporation'
+)
+
+# Blank/label shapes built from underscore runs and free text. These are the
+# expensive heuristics and are skipped once a document's budget is exhausted.
+HEURISTIC_PATTERN_TYPES = ('underscore', 'blank_with_description', 'field_with_blank')
+
+
+class DetectionBudget:
+    """
+    Per-document CPU budget for guarded placeholder detection.
+    
+    Measures thread CPU time (so concurrent gthread workers don't charge each
+    other). Once exhausted, the detector keeps scanning delimited placeholders
+    ($[], [], {{}}, <>) but skips the heuristic blank/label shapes, and records
+    every text block it truncated.
+    """
+    
+    def __init__(self, seconds: Optional[float] = DEFAULT_DETECTION_BUDGET_SECONDS):
+        """
+        Start the budget clock.
+        
+        Args:
+            seconds (Optional[float]): CPU seconds allowed, None for unlimited
+        """
+        self.seconds = seconds
+        self.started_at = time.thread_time()
+        self.paused_elapsed = None
+        self.truncated = []
+    
+    @property
+    def elapsed(self) -> float:
+        """CPU seconds spent since the budget was created."""
+        if self.paused_elapsed is not None:
+            return self.paused_elapsed
+        return time.thread_time() - self.started_at
+    
+    def pause(self) -> None:
+        """Stop the clock, e.g. before handing detection to another thread."""
+        self.paused_elapsed = self.elapsed
+    
+    def resume(self) -> None:
+        """Restart the clock on the calling thread, keeping time already spent."""
+        if self.paused_elapsed is not None:
+            self.started_at = time.thread_time() - self.paused_elapsed
+            self.paused_elapsed = None
+    
+    def exhausted(self) -> bool:
+        """Check whether the budget has run out."""
+        return self.seconds is not None and self.elapsed > self.seconds
+    
+    def record_truncation(self, location: Any, location_type: str,
+                          skipped_patterns: List[str]) -> None:
+        """
+        Record a text block whose heuristic patterns were skipped.
+        
+        Args:
+            location (Any): Location identifier
+            location_type (str): Type of location (paragraph/table)
+            skipped_patterns (List[str]): Pattern types that were not scanned
+        """
+        self.truncated.append({
+            'location': location,
+            'location_type': location_type,
+            'skipped_patterns': skipped_patterns
+        })
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Summarize budget usage for logging and API responses.
+        
+        Returns:
+            Dict[str, Any]: Budget, CPU time used and truncated locations
+        """
+        return {
+            'budget_seconds': self.seconds,
+            'elapsed_seconds': round(self.elapsed, 4),
+            'truncated': bool(self.truncated),
+            'truncated_locations': list(self.truncated)
+        }
+
+
+class PlaceholderRecord(Mapping):
+    """
+    Compact, slotted placeholder occurrence.
+    
+    Behaves like the read-only dict the detector used to return (``p['key']``,
+    ``p.get('id')``, ``'id' in p``) so consumers are unchanged, but stores
+    each value once: ``key`` is derived from ``normalized_key`` and
+    ``location``, ``position`` from the start/end offsets, and the context
+    window is not stored at all - it is rebuilt from the location's text by
+    ``context()`` when a consumer needs it.
+    
+    ``to_tuple``/``from_tuple`` give a stable positional serialization for
+    session storage (append new fields at the end of FIELDS only);
+    ``to_dict`` gives the API shape.
+    """
+    
+    FIELDS = ('id', 'normalized_key', 'name', 'original', 'type', 'pattern_type',
+              'location', 'location_type', 'start', 'end', 'required', 'sequence')
+    # Keys exposed through the mapping interface / API responses
+    KEYS = ('id', 'key', 'name', 'original', 'type', 'pattern_type', 'location',
+            'location_type', 'position', 'required', 'sequence')
+    # Fields consumers may reassign (fresh ids, sequence numbers)
+    MUTABLE = frozenset(('id', 'sequence'))
+    
+    __slots__ = FIELDS
+    
+    def __init__(self, id: str, normalized_key: str, name: str, original: str, type: str,
+                 pattern_type: str, location: Any, location_type: str, start: int, end: int,
+                 required: bool = True, sequence: Optional[int] = None):
+        self.id = id
+        self.normalized_key = normalized_key
+        self.name = name
+        self.original = original
+        self.type = type
+        self.pattern_type = pattern_type
+        self.location = location
+        self.location_type = location_type
+        self.start = start
+        self.end = end
+        self.required = required
+        self.sequence = sequence
+    
+    @property
+    def key(self) -> str:
+        """Location-qualified key (normalized key + location)."""
+        return f"{self.normalized_key}_{self.location}"
+    
+    @property
+    def position(self) -> Tuple[int, int]:
+        """Start and end offsets within the location's text."""
+        return (self.start, self.end)
+    
+    def __getitem__(self, item: str) -> Any:
+        if item in self.KEYS or item == 'normalized_key':
+            value = getattr(self, item)
+            if item == 'sequence' and value is None:
+                raise KeyError(item)
+            return value
+        raise KeyError(item)
+    
+    def __setitem__(self, item: str, value: Any) -> None:
+        if item not in self.MUTABLE:
+            raise KeyError(f"Placeholder field '{item}' is read-only")
+        setattr(self, item, value)
+    
+    def __iter__(self):
+        return (key for key in self.KEYS if key != 'sequence' or self.sequence is not None)
+    
+    def __len__(self) -> int:
+        return len(self.KEYS) - (self.sequence is None)
+    
+    def __repr__(self) -> str:
+        return f"PlaceholderRecord({self.id!r}, {self.name!r}, {self.location_type}:{self.location}@{self.start})"
+    
+    def context(self, text: str, context_size: int = 50) -> str:
+        """
+        Materialize the context window around this occurrence.
+        
+        Args:
+            text (str): Text of the placeholder's location (paragraph or cell)
+            context_size (int): Characters of context on each side
+            
+        Returns:
+            str: Context string (same format as PlaceholderDetector._extract_context)
+        """
+        return extract_context(text, self.position, context_size)
+    
+    def to_tuple(self) -> tuple:
+        """Positional serialization in FIELDS order."""
+        return tuple(getattr(self, field) for field in self.FIELDS)
+    
+    @classmethod
+    def from_tuple(cls, values) -> 'PlaceholderRecord':
+        """Rebuild a record from ``to_tuple`` output (JSON turns it into a list)."""
+        return cls(*values)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """API representation."""
+        return {key: self[key] for key in self}
+
+
+# Position of the id in packed placeholders (PlaceholderRecord.FIELDS)
+PLACEHOLDER_ID_FIELD = PlaceholderRecord.FIELDS.index('id')
+
+
+def pack_placeholders(placeholders: List[Any]) -> List[Any]:
+    """
+    Convert placeholder records to tuples for JSON storage.
+    
+    Args:
+        placeholders (List[Any]): Records (legacy dicts pass through unchanged)
+        
+    Returns:
+        List[Any]: JSON-serializable placeholders
+    """
+    return [p.to_tuple() if isinstance(p, PlaceholderRecord) else p for p in placeholders]
+
+
+def unpack_placeholders(placeholders: List[Any]) -> List[Any]:
+    """
+    Rebuild placeholder records from ``pack_placeholders`` output.
+    
+    Args:
+        placeholders (List[Any]): Stored placeholders (legacy dicts pass through unchanged)
+        
+    Returns:
+        List[Any]: Placeholder records
+    """
+    return [PlaceholderRecord.from_tuple(p) if isinstance(p, (list, tuple)) else p for p in placeholders]
+
+
+def split_placeholder_ids(placeholders: List[Any]) -> Tuple[List[Any], List[str]]:
+    """
+    Separate a session's occurrence ids from its packed placeholders.
+    
+    The placeholders get their list position as id, so sessions of the same
+    document store identical placeholder lists whatever ids they were given.
+    
+    Args:
+        placeholders (List[Any]): ``pack_placeholders`` output
+        
+    Returns:
+        Tuple[List[Any], List[str]]: Placeholders with positional ids, and
+            the ids (``id``, or ``key`` for legacy placeholders) in list order
+    """
+    positional = []
+    ids = []
+    for position, placeholder in enumerate(placeholders):
+        if isinstance(placeholder, (list, tuple)):
+            ids.append(placeholder[PLACEHOLDER_ID_FIELD])
+            positional.append([str(position), *placeholder[PLACEHOLDER_ID_FIELD + 1:]])
+        else:
+            ids.append(placeholder.get('id', placeholder['key']))
+            positional.append(dict(placeholder, id=str(position)))
+    return positional, ids
+
+
+def join_placeholder_ids(placeholders: List[Any], ids: List[str]) -> List[Any]:
+    """
+    Put a session's occurrence ids back on placeholders from ``split_placeholder_ids``.
+    
+    Args:
+        placeholders (List[Any]): Placeholders with positional ids (packed)
+        ids (List[str]): The session's ids in list order
+        
+    Returns:
+        List[Any]: Packed placeholders with the session's ids
+    """
+    return [
+        [ids[position], *placeholder[PLACEHOLDER_ID_FIELD + 1:]] if isinstance(placeholder, (list, tuple))
+        else dict(placeholder, id=ids[position])
+        for position, placeholder in enumerate(placeholders)
+    ]
+
+
+def join_location_index(location_index: Dict[str, Dict[str, List[str]]],
+                        ids: List[str]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Location index of positional placeholder ids -> the same index with a session's ids.
+    
+    Args:
+        location_index (Dict): Index built from ``split_placeholder_ids`` placeholders
+        ids (List[str]): The session's ids in list order
+        
+    Returns:
+        Dict[str, Dict[str, List[str]]]: Index as build_location_index returns it
+    """
+    return {
+        location_type: {
+            location: [ids[int(position)] for position in positions]
+            for location, positions in locations.items()
+        }
+        for location_type, locations in location_index.items()
+    }
+
+
+def build_location_index(placeholders: List[Any]) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Map every location to the ids of the placeholders detected there.
+    
+    Built once per detection result and stored with the session, so preview
+    rendering and document generation look up the placeholders of a
+    paragraph or table cell instead of scanning the whole list for each one.
+    
+    Args:
+        placeholders (List[Any]): Placeholders in document order
+        
+    Returns:
+        Dict[str, Dict[str, List[str]]]: location_type ('paragraph'/'table') ->
+            location as a string (paragraph index, or 't-r-c' for a table cell)
+            -> placeholder ids (``id``, or ``key`` for legacy placeholders) in
+            list order
+    """
+    index = {'paragraph': {}, 'table': {}}
+    for placeholder in placeholders:
+        locations = index.get(placeholder.get('location_type'))
+        if locations is not None:
+            locations.setdefault(str(placeholder.get('location')), []).append(
+                placeholder.get('id', placeholder['key'])
+            )
+    return index
+
+
+def placeholders_by_id(placeholders: List[Any]) -> Dict[str, Tuple[int, Any]]:
+    """
+    Map placeholder id (or key) -> (list index, placeholder); first occurrence wins.
+    
+    Args:
+        placeholders (List[Any]): Placeholders in list order
+        
+    Returns:
+        Dict[str, Tuple[int, Any]]: Lookup for the ids of a location index
+    """
+    by_id = {}
+    for idx, placeholder in enumerate(placeholders):
+        by_id.setdefault(placeholder.get('id', placeholder['key']), (idx, placeholder))
+    return by_id
+
+
+def located_placeholders(location_index: Dict[str, Dict[str, List[str]]], location_type: str,
+                         location: Any, by_id: Dict[str, Tuple[int, Any]]) -> Iterator[Tuple[int, Any]]:
+    """
+    Placeholders detected at one location, in placeholder list order.
+    
+    Args:
+        location_index (Dict): Placeholder ids by location (see build_location_index)
+        location_type (str): 'paragraph' or 'table'
+        location (Any): Paragraph index or 't-r-c' cell location
+        by_id (Dict): Lookup from placeholders_by_id
+        
+    Yields:
+        Tuple[int, Any]: (list index, placeholder); ids missing from by_id
+            (stale index) are skipped
+    """
+    for placeholder_id in location_index.get(location_type, {}).get(str(location), ()):
+        located = by_id.get(placeholder_id)
+        if located is not None:
+            yield located
+
+
+def extract_context(text: str, position: Tuple[int, int], context_size: int = 50) -> str:
+    """
+    Extract surrounding context for a placeholder.
+    
+    Args:
+        text (str): Full text
+        position (Tuple[int, int]): Start and end position
+        context_size (int): Characters of context on each side
+        
+    Returns:
+        str: Context string
+    """
+    start, end = position
+    
+    # Calculate context boundaries
+    context_start = max(0, start - context_size)
+    context_end = min(len(text), end + context_size)
+    
+    # Extract context
+    context = text[context_start:context_end]
+    
+    # Add ellipsis if truncated
+    if context_start > 0:
+        context = '...' + context
+    if context_end < len(text):
+        context = context + '...'
+    
+    return context
+
+
+class NameCache:
+    """
+    Bounded, thread-safe LRU memo for the name-normalization pipeline.
+    
+    Placeholder names repeat heavily within and across documents, and the
+    pipeline that turns a raw name into (cleaned name, normalized key, type)
+    is a pure function of that name. The detector instance is shared by all
+    request threads, so access is guarded by a lock; computation happens
+    outside the lock.
+    """
+    
+    def __init__(self, max_size: int = 4096):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            max_size (int): Maximum number of names kept (least recently used evicted first)
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get_or_compute(self, key: str, compute) -> Any:
+        """
+        Return the cached value for ``key``, computing and storing it on a miss.
+        
+        Args:
+            key (str): Raw placeholder name
+            compute (Callable[[str], Any]): Pure function producing the value
+            
+        Returns:
+            Any: Cached or freshly computed value
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        
+        value = compute(key)
+        
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        
+        return value
+    
+    def clear(self) -> None:
+        """Drop all entries and reset counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Report cache usage for monitoring.
+        
+        Returns:
+            Dict[str, Any]: Size, capacity, hit/miss counters and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def _find_from(text: str, char: str, start: int, cache: Dict[str, int]) -> int:
+    """
+    ``text.find(char, start)`` for non-decreasing ``start`` values.
+    
+    Reuses the previous result while it is still ahead of ``start`` so that
+    repeated lookups for a closing delimiter stay linear overall.
+    """
+    cached = cache.get(char)
+    if cached is not None and (cached == -1 or cached >= start):
+        return cached
+    result = text.find(char, start)
+    cache[char] = result
+    return result
+
 
 class PlaceholderDetector:
     """
@@ -39,10 +522,18 @@ class PlaceholderDetector:
     - Provides smart value suggestions
     """
     
-    def __init__(self):
+    def __init__(self, guarded: bool = True, name_cache_size: int = 4096):
         """
         Initialize the PlaceholderDetector with patterns and keywords.
+        
+        Args:
+            guarded (bool): Use the linear-time scanners instead of the regex
+                engine for matching (same results, no backtracking blowups)
+            name_cache_size (int): Capacity of the name-normalization memo
         """
+        self.guarded = guarded
+        self.name_cache = NameCache(max_size=name_cache_size)
+        
         # Define placeholder patterns to search for
         self.patterns = [
             # $[__________] style - MUST come first for dollar amounts
@@ -62,7 +553,42 @@ class PlaceholderDetector:
             # Field: _______ style
             (r'([A-Za-z\s]+):\s*_{3,}', 'field_with_blank'),
         ]
-        
+
+        # Pattern priority follows table order (lower value wins)
+        self.pattern_priority = {
+            pattern_type: priority for priority, (_, pattern_type) in enumerate(self.patterns)
+        }
+
+        # Compile the pattern table once: anchored matchers per pattern plus a
+        # single alternation used to scan each text block in one pass
+        self._compiled_patterns = [
+            (re.compile(pattern, re.IGNORECASE), pattern_type)
+            for pattern, pattern_type in self.patterns
+        ]
+        self._combined_pattern = self._compile_combined_pattern()
+
+        # Building blocks for the guarded (linear-time) scanners. Each one is a
+        # single character-class run or an anchored literal, so none of them
+        # can backtrack; IGNORECASE keeps them consistent with the table above.
+        self._letter = re.compile(r'[A-Za-z]', re.IGNORECASE)
+        self._word_run = re.compile(r'[A-Za-z]+', re.IGNORECASE)
+        self._label_run = re.compile(r'[A-Za-z\s]+', re.IGNORECASE)
+        self._angle_body = re.compile(r'[A-Z_\s]+', re.IGNORECASE)
+        self._underscore_body = re.compile(r'[A-Za-z_\s]+', re.IGNORECASE)
+        self._blank_run = re.compile(r'_{3,}')
+        self._whitespace = re.compile(r'\s*')
+        self._insert_prefix = re.compile(r'INSERT ', re.IGNORECASE)
+        self._guarded_scanners = {
+            'dollar_bracket': self._scan_dollar_bracket,
+            'square_bracket': self._scan_square_bracket,
+            'double_curly': self._scan_double_curly,
+            'underscore': self._scan_underscore,
+            'angle_bracket': self._scan_angle_bracket,
+            'insert_style': self._scan_insert_style,
+            'blank_with_description': self._scan_blank_with_description,
+            'field_with_blank': self._scan_field_with_blank,
+        }
+
         # Common legal placeholder keywords
         self.legal_keywords = [
             'Company Name', 'Investor Name', 'Date', 'Amount',
@@ -87,9 +613,307 @@ class PlaceholderDetector:
             'title': ['title', 'position', 'role', 'designation', 'office']
         }
         
+        # Single-pass matcher over all type indicators and special-case phrases
+        self.type_classifier = KeywordClassifier(self.type_indicators, extra_keywords=TYPE_SPECIAL_TERMS)
+        
         logger.info("PlaceholderDetector initialized with %d patterns", len(self.patterns))
-    
-    def detect_placeholders(self, document_content: Dict[str, Any]) -> List[Dict]:
+
+    def _compile_combined_pattern(self) -> re.Pattern:
+        """
+        Compile the pattern table into a single alternation with named groups.
+
+        The alternation is wrapped in a lookahead so the scan reports every
+        position where at least one pattern matches (patterns may overlap,
+        e.g. $[___] and [___]). Alternatives are ordered by priority, so the
+        named group that matched identifies the highest-priority pattern
+        starting at that position.
+
+        Patterns that begin with a character-class run (field_with_blank) only
+        ever produce finditer matches at the start of that run, so they are
+        guarded with a lookbehind. This skips re-trying the pattern from every
+        character inside a long run of words.
+
+        Returns:
+            re.Pattern: Compiled combined pattern
+        """
+        start_guards = {
+            'field_with_blank': r'(?<![A-Za-z\s])',
+        }
+        alternatives = '|'.join(
+            f'(?P<{pattern_type}>{start_guards.get(pattern_type, "")}{pattern})'
+            for pattern, pattern_type in self.patterns
+        )
+        return re.compile(f'(?=(?:{alternatives}))', re.IGNORECASE)
+
+    def _scan_text(self, text: str) -> List[Tuple[str, int, int, str]]:
+        """
+        Scan a text block once and return pattern matches.
+
+        Produces exactly the matches that running ``finditer`` separately for
+        each pattern would produce (non-overlapping per pattern, overlapping
+        across patterns), grouped in pattern table order.
+
+        Args:
+            text (str): Text to scan
+
+        Returns:
+            List[Tuple[str, int, int, str]]: (pattern_type, start, end, captured)
+        """
+        num_patterns = len(self._compiled_patterns)
+        matches_by_pattern = [[] for _ in range(num_patterns)]
+        # Per-pattern resume offset, mirroring finditer's non-overlapping scan
+        next_allowed = [0] * num_patterns
+
+        for candidate in self._combined_pattern.finditer(text):
+            position = candidate.start()
+            first = self.pattern_priority[candidate.lastgroup]
+
+            # Higher-priority patterns cannot match here (the alternation tried
+            # them first), so only the winner and lower-priority ones are checked
+            for priority in range(first, num_patterns):
+                if position < next_allowed[priority]:
+                    continue
+
+                compiled, _ = self._compiled_patterns[priority]
+                match = compiled.match(text, position)
+                if match:
+                    matches_by_pattern[priority].append(match)
+                    next_allowed[priority] = match.end()
+
+        return [
+            (pattern_type, match.start(), match.end(), match.group(1))
+            for (_, pattern_type), matches in zip(self._compiled_patterns, matches_by_pattern)
+            for match in matches
+        ]
+
+    def _scan_text_guarded(self, text: str,
+                           budget: Optional[DetectionBudget] = None) -> Tuple[List[Tuple[str, int, int, str]], List[str]]:
+        """
+        Scan a text block with the linear-time scanners.
+        
+        Produces the same matches as ``_scan_text``. When the budget is
+        exhausted, the heuristic blank/label shapes are skipped for this block.
+        
+        Args:
+            text (str): Text to scan
+            budget (Optional[DetectionBudget]): Per-document CPU budget
+            
+        Returns:
+            Tuple: (pattern_type, start, end, captured) matches and the list of
+            pattern types that were skipped
+        """
+        scanned = []
+        skipped = []
+        
+        for _, pattern_type in self.patterns:
+            if (pattern_type in HEURISTIC_PATTERN_TYPES and
+                    budget is not None and budget.exhausted()):
+                skipped.append(pattern_type)
+                continue
+            
+            for start, end, captured in self._guarded_scanners[pattern_type](text):
+                scanned.append((pattern_type, start, end, captured))
+        
+        return scanned, skipped
+
+    # ------------------------------------------------------------------
+    # Guarded scanners
+    #
+    # Each scanner returns (start, end, group 1) spans exactly as
+    # re.finditer would for the corresponding entry in self.patterns, but
+    # walks the text in linear time: delimiters are located with str.find,
+    # and closing-delimiter lookups are shared through _find_from.
+    # ------------------------------------------------------------------
+
+    def _scan_dollar_bracket(self, text: str) -> List[Tuple[int, int, str]]:
+        """Scan for ``$[...]`` (dollar_bracket)."""
+        found = []
+        cache = {}
+        pos = text.find('$[')
+        while pos != -1:
+            close = _find_from(text, ']', pos + 2, cache)
+            if close == -1:
+                break
+            found.append((pos, close + 1, text[pos + 2:close]))
+            pos = text.find('$[', close + 1)
+        return found
+
+    def _scan_square_bracket(self, text: str) -> List[Tuple[int, int, str]]:
+        """Scan for ``[...]`` with non-empty content (square_bracket)."""
+        found = []
+        cache = {}
+        pos = text.find('[')
+        while pos != -1:
+            close = _find_from(text, ']', pos + 1, cache)
+            if close == -1:
+                break
+            if close > pos + 1:
+                found.append((pos, close + 1, text[pos + 1:close]))
+                pos = text.find('[', close + 1)
+            else:
+                pos = text.find('[', pos + 1)
+        return found
+
+    def _scan_double_curly(self, text: str) -> List[Tuple[int, int, str]]:
+        """Scan for ``{{...}}`` (double_curly)."""
+        found = []
+        cache = {}
+        pos = text.find('{{')
+        while pos != -1:
+            close = _find_from(text, '}', pos + 2, cache)
+            if close == -1:
+                break
+            if close > pos + 2 and text.startswith('}', close + 1):
+                found.append((pos, close + 2, text[pos + 2:close]))
+                pos = text.find('{{', close + 2)
+            else:
+                pos = text.find('{{', pos + 1)
+        return found
+
+    def _scan_underscore(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Scan for ``__Name__`` (underscore).
+        
+        A match must lie inside one run of letters/underscores/whitespace and,
+        because the middle of the pattern is greedy, it always ends at the last
+        ``<letter>__`` of that run. So each run yields at most one match and is
+        checked once.
+        """
+        found = []
+        for run in self._underscore_body.finditer(text):
+            run_start, run_end = run.span()
+            
+            # First "__<letter>" opening in this run
+            start = text.find('__', run_start, run_end)
+            while start != -1 and not (start + 2 < run_end and self._letter.match(text, start + 2)):
+                start = text.find('__', start + 1, run_end)
+            if start == -1:
+                continue
+            
+            # Last "<letter>__" closing in this run
+            last_letter = -1
+            close = text.rfind('__', run_start, run_end)
+            while close > run_start:
+                if self._letter.match(text, close - 1):
+                    last_letter = close - 1
+                    break
+                close = text.rfind('__', run_start, close + 1)
+            
+            if last_letter >= start + 3:
+                found.append((start, last_letter + 3, text[start + 2:last_letter + 1]))
+        return found
+
+    def _scan_angle_bracket(self, text: str) -> List[Tuple[int, int, str]]:
+        """Scan for ``<NAME>`` (angle_bracket)."""
+        found = []
+        pos = text.find('<')
+        while pos != -1:
+            body = self._angle_body.match(text, pos + 1)
+            if body and text.startswith('>', body.end()):
+                found.append((pos, body.end() + 1, body.group(0)))
+                pos = text.find('<', body.end() + 1)
+            else:
+                pos = text.find('<', pos + 1)
+        return found
+
+    def _scan_insert_style(self, text: str) -> List[Tuple[int, int, str]]:
+        """Scan for ``[INSERT ...]`` (insert_style)."""
+        found = []
+        cache = {}
+        pos = text.find('[')
+        while pos != -1:
+            prefix = self._insert_prefix.match(text, pos + 1)
+            if prefix:
+                content_start = prefix.end()
+                close = _find_from(text, ']', content_start, cache)
+                if close == -1:
+                    break
+                if close > content_start:
+                    found.append((pos, close + 1, text[content_start:close]))
+                    pos = text.find('[', close + 1)
+                    continue
+            pos = text.find('[', pos + 1)
+        return found
+
+    def _scan_blank_with_description(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Scan for ``_____ (Description)`` (blank_with_description).
+        
+        Text is segmented at underscore runs; a match can only start at the
+        beginning of a run, so each run is checked once.
+        """
+        found = []
+        cache = {}
+        next_allowed = 0
+        for blank in self._blank_run.finditer(text):
+            if blank.start() < next_allowed:
+                continue
+            
+            paren = self._whitespace.match(text, blank.end()).end()
+            if not text.startswith('(', paren):
+                continue
+            
+            close = _find_from(text, ')', paren + 1, cache)
+            if close == -1:
+                break
+            if close > paren + 1:
+                found.append((blank.start(), close + 1, text[paren + 1:close]))
+                next_allowed = close + 1
+        return found
+
+    def _scan_field_with_blank(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Scan for ``Field Name: _____`` (field_with_blank).
+        
+        A match can only start at the beginning of a run of letters and
+        whitespace, and the colon must directly follow that run, so each run is
+        checked once instead of backtracking from every character.
+        """
+        return self._scan_label_colon_blank(text, self._label_run)
+
+    def _scan_label_colon_blank(self, text: str, label_run: re.Pattern) -> List[Tuple[int, int, str]]:
+        """
+        Shared scanner for ``<label run>:\\s*_{3,}`` shapes.
+        
+        Args:
+            text (str): Text to scan
+            label_run (re.Pattern): Character-class run forming the label
+            
+        Returns:
+            List[Tuple[int, int, str]]: (start, end, label) spans
+        """
+        found = []
+        next_allowed = 0
+        for run in label_run.finditer(text):
+            if run.start() < next_allowed or not text.startswith(':', run.end()):
+                continue
+            
+            blank = self._blank_run.match(text, self._whitespace.match(text, run.end() + 1).end())
+            if blank:
+                found.append((run.start(), blank.end(), run.group(0)))
+                next_allowed = blank.end()
+        return found
+
+    def _scan_label_space_blank(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Scan for ``Field Name _____`` (contextual field_space_blank).
+        
+        The label run must end in whitespace that is directly followed by the
+        blank; the label itself is the run minus that last whitespace character.
+        """
+        found = []
+        for run in self._label_run.finditer(text):
+            run_start, run_end = run.span()
+            if run_end - run_start < 2 or not text[run_end - 1].isspace():
+                continue
+            
+            blank = self._blank_run.match(text, run_end)
+            if blank:
+                found.append((run_start, blank.end(), text[run_start:run_end - 1]))
+        return found
+
+    def detect_placeholders(self, document_content: Dict[str, Any],
+                            budget: Optional[DetectionBudget] = None) -> List[Dict]:
         """
         Detect all placeholders in the document.
         
@@ -101,73 +925,232 @@ class PlaceholderDetector:
         
         Args:
             document_content (Dict): Parsed document content
+            budget (Optional[DetectionBudget]): Per-document CPU budget; when it
+                runs out, heuristic blank/label shapes are skipped and the
+                affected locations are recorded on the budget
             
         Returns:
             List[Dict]: List of unique placeholders with metadata
         """
-        all_placeholders = []  # Collect ALL placeholders first (no deduplication yet)
+        # Check for contextual placeholders (blanks that should be filled)
+        # NOTE: Disabled to avoid creating non-fillable placeholders
+        # contextual = self._detect_contextual_placeholders(document_content)
         
-        # Search in paragraphs
-        for para_data in document_content.get('paragraphs', []):
-            text = para_data['text']
-            found = self._find_placeholders_in_text(
-                text=text,
-                location=para_data['index'],
-                location_type='paragraph'
-            )
+        placeholders = list(self.detect_placeholders_iter(document_content, budget=budget))
+        
+        logger.info(f"Detected {len(placeholders)} placeholders")
+        return placeholders
+    
+    def detect_placeholders_iter(self, blocks: Union[Dict[str, Any], Iterable[Tuple[str, Dict]]],
+                                 budget: Optional[DetectionBudget] = None) -> Iterator[Dict]:
+        """
+        Detect placeholders incrementally, yielding them in document order.
+        
+        Overlaps are only resolved within a single text block, so every block
+        is final as soon as it has been scanned: placeholders are deduplicated,
+        filtered, numbered and yielded before the next block is read. Feeding
+        this from DocumentProcessor.parse_document_iter lets callers act on
+        the first placeholder while the rest of the document is still parsing.
+        
+        Args:
+            blocks: Parsed document content, or an iterable of
+                ('paragraph', para_data) / ('table', table_data) pairs
+            budget (Optional[DetectionBudget]): Per-document CPU budget (see
+                detect_placeholders)
             
-            for placeholder in found:
-                all_placeholders.append(placeholder)
-                logger.debug(f"Found placeholder in paragraph: {placeholder['name']}")
+        Yields:
+            Dict: Placeholders with metadata, paragraphs first, then table
+                cells in row/column order
+        """
+        if isinstance(blocks, dict):
+            blocks = self._iter_content_blocks(blocks)
+        
+        sequence = 0
+        for block_type, block_data in blocks:
+            for text, location, location_type in self._iter_block_texts(block_type, block_data):
+                for placeholder in self._detect_location(text, location, location_type, budget):
+                    # Add sequence numbers for better tracking
+                    sequence += 1
+                    placeholder['sequence'] = sequence
+                    logger.debug(f"Found placeholder in {location_type}: {placeholder['name']}")
+                    yield placeholder
+        
+        if budget is not None and budget.truncated:
+            logger.warning(
+                f"Detection budget of {budget.seconds}s exhausted; heuristic patterns skipped "
+                f"in {len(budget.truncated)} location(s)"
+            )
+    
+    @staticmethod
+    def _iter_content_blocks(document_content: Dict[str, Any]) -> Iterator[Tuple[str, Dict]]:
+        """
+        Adapt parsed document content to the block stream used by detect_placeholders_iter.
         
-        # Search in tables
+        Args:
+            document_content (Dict): Parsed document content
+            
+        Yields:
+            Tuple[str, Dict]: ('paragraph', para_data) pairs, then ('table', table_data) pairs
+        """
+        for para_data in document_content.get('paragraphs', []):
+            yield 'paragraph', para_data
         for table_data in document_content.get('tables', []):
-            for row_idx, row in enumerate(table_data['rows']):
-                for col_idx, cell in enumerate(row):
-                    # Handle both dict and string cell formats
-                    cell_text = cell['text'] if isinstance(cell, dict) else str(cell)
-                    
-                    found = self._find_placeholders_in_text(
-                        text=cell_text,
-                        location=f"{table_data['index']}-{row_idx}-{col_idx}",
-                        location_type='table'
-                    )
-                    
-                    for placeholder in found:
-                        all_placeholders.append(placeholder)
-                        logger.debug(f"Found placeholder in table: {placeholder['name']}")
+            yield 'table', table_data
+    
+    @staticmethod
+    def _iter_block_texts(block_type: str, block_data: Dict) -> Iterator[Tuple[str, Any, str]]:
+        """
+        List the searchable text units of a block with their locations.
         
-        # Check for contextual placeholders (blanks that should be filled)
-        # NOTE: Disabled to avoid creating non-fillable placeholders
-        # contextual = self._detect_contextual_placeholders(document_content)
-        # for placeholder in contextual:
-        #     key = placeholder['key']
-        #     if key not in seen_placeholders:
-        #         seen_placeholders[key] = placeholder
-        #         logger.debug(f"Found contextual placeholder: {placeholder['name']}")
-        
-        # Smart deduplication based on context (not just normalized key)
-        placeholders = self._smart_deduplicate(all_placeholders)
-        
-        # Sort by location AND position (appearance order in document)
-        placeholders.sort(key=lambda x: (
-            x['location_type'],
-            x['location'] if isinstance(x['location'], int) else str(x['location']),
-            x['position'][0]  # Character position within paragraph
-        ))
+        Args:
+            block_type (str): 'paragraph' or 'table'
+            block_data (Dict): Parsed paragraph or table
+            
+        Yields:
+            Tuple[str, Any, str]: (text, location, location_type)
+        """
+        if block_type == 'paragraph':
+            yield block_data['text'], block_data['index'], 'paragraph'
+            return
+        
+        for row_idx, row in enumerate(block_data['rows']):
+            for col_idx, cell in enumerate(row):
+                # Handle both dict and string cell formats; dict cells carry their
+                # grid position (merged cells are listed once, so positions can skip)
+                if isinstance(cell, dict):
+                    location = f"{block_data['index']}-{cell.get('row', row_idx)}-{cell.get('col', col_idx)}"
+                    yield cell['text'], location, 'table'
+                else:
+                    yield str(cell), f"{block_data['index']}-{row_idx}-{col_idx}", 'table'
+    
+    def _detect_location(self, text: str, location: Any, location_type: str,
+                         budget: Optional[DetectionBudget] = None) -> List['PlaceholderRecord']:
+        """
+        Detect the final placeholders of one text block (paragraph or table cell).
         
-        # Filter out problematic placeholders
-        filtered_placeholders = self._filter_placeholders(placeholders, document_content)
+        Args:
+            text (str): Text of the location
+            location (Any): Location identifier
+            location_type (str): Type of location (paragraph/table)
+            budget (Optional[DetectionBudget]): Per-document CPU budget
+            
+        Returns:
+            List[PlaceholderRecord]: Deduplicated, filtered placeholders in position order
+        """
+        found = self._find_placeholders_in_text(
+            text=text,
+            location=location,
+            location_type=location_type,
+            budget=budget
+        )
+        if not found:
+            return []
         
-        # Add sequence numbers for better tracking
-        for i, placeholder in enumerate(filtered_placeholders):
+        # Blank matches go first: a dropped blank must not take the span of a
+        # real placeholder around it in the overlap resolution
+        return self._smart_deduplicate(self._filter_placeholders(found))
+    
+    def redetect_locations(self, document_content: Dict[str, Any], placeholders: List[Any],
+                           changed_locations: Iterable[Tuple[str, Any]],
+                           budget: Optional[DetectionBudget] = None) -> List[Any]:
+        """
+        Re-detect placeholders for changed locations and splice them into an existing list.
+        
+        Only the changed paragraphs/table cells are scanned. Placeholders at
+        untouched locations are kept as-is (same ids, so their filled values
+        stay valid). Within a changed location, a re-detected placeholder
+        with the same original text as an old one (matched in order) keeps
+        the old id. Locations that no longer exist lose their placeholders.
+        
+        Args:
+            document_content (Dict): Updated parsed document content
+            placeholders (List[Any]): Current placeholder list
+            changed_locations (Iterable[Tuple[str, Any]]): (location_type, location)
+                pairs, e.g. ('paragraph', 12) or ('table', '0-1-2')
+            budget (Optional[DetectionBudget]): Per-document CPU budget
+            
+        Returns:
+            List[Any]: Spliced placeholder list in document order, renumbered
+        """
+        changed = set(changed_locations)
+        
+        # Document order of every location in the updated content
+        order = {}
+        texts = {}
+        for block_type, block_data in self._iter_content_blocks(document_content):
+            for text, location, location_type in self._iter_block_texts(block_type, block_data):
+                order[(location_type, location)] = len(order)
+                if (location_type, location) in changed:
+                    texts[(location_type, location)] = text
+        
+        kept = []
+        previous = {}  # location -> old placeholders, for id reuse
+        for placeholder in placeholders:
+            location_key = (placeholder['location_type'], placeholder['location'])
+            if location_key in changed:
+                previous.setdefault(location_key, []).append(placeholder)
+            else:
+                kept.append(placeholder)
+        
+        redetected = []
+        for (location_type, location), text in texts.items():
+            reusable = {}
+            for old in previous.get((location_type, location), []):
+                reusable.setdefault(old['original'], []).append(old.get('id', old['key']))
+            
+            for placeholder in self._detect_location(text, location, location_type, budget):
+                old_ids = reusable.get(placeholder['original'])
+                if old_ids:
+                    placeholder['id'] = old_ids.pop(0)
+                redetected.append(placeholder)
+        
+        # Restore document order (locations missing from the content sort last)
+        spliced = kept + redetected
+        spliced.sort(key=lambda p: (
+            order.get((p['location_type'], p['location']), len(order)),
+            p['position'][0]
+        ))
+        
+        for i, placeholder in enumerate(spliced):
             placeholder['sequence'] = i + 1
         
-        logger.info(f"Detected {len(placeholders)} placeholders, {len(filtered_placeholders)} after filtering")
-        return filtered_placeholders
+        logger.info(
+            f"Re-detected {len(texts)} of {len(changed)} changed location(s): "
+            f"{len(redetected)} placeholder(s) there, {len(kept)} kept elsewhere"
+        )
+        return spliced
+    
+    @classmethod
+    def diff_locations(cls, old_content: Dict[str, Any],
+                       new_content: Dict[str, Any]) -> Set[Tuple[str, Any]]:
+        """
+        Find locations whose text differs between two parses of a document.
+        
+        Args:
+            old_content (Dict): Previously parsed content
+            new_content (Dict): Newly parsed content
+            
+        Returns:
+            Set[Tuple[str, Any]]: (location_type, location) pairs that were
+                added, removed or edited
+        """
+        def location_texts(content):
+            return {
+                (location_type, location): text
+                for block_type, block_data in cls._iter_content_blocks(content)
+                for text, location, location_type in cls._iter_block_texts(block_type, block_data)
+            }
+        
+        old_texts = location_texts(old_content)
+        new_texts = location_texts(new_content)
+        return {
+            location_key for location_key in old_texts.keys() | new_texts.keys()
+            if old_texts.get(location_key) != new_texts.get(location_key)
+        }
     
     def _find_placeholders_in_text(self, text: str, location: Any,
-                                  location_type: str) -> List[Dict]:
+                                  location_type: str,
+                                  budget: Optional[DetectionBudget] = None) -> List['PlaceholderRecord']:
         """
         Find placeholders in a given text using various patterns.
         
@@ -175,181 +1158,156 @@ class PlaceholderDetector:
             text (str): Text to search
             location (Any): Location identifier
             location_type (str): Type of location (paragraph/table)
+            budget (Optional[DetectionBudget]): Per-document CPU budget (guarded mode)
             
         Returns:
-            List[Dict]: Found placeholders with metadata
+            List[PlaceholderRecord]: Found placeholders with metadata
         """
         found_placeholders = []
-        
-        # Try each pattern
-        for pattern, pattern_type in self.patterns:
+
+        # Scan the text once (linear-time scanners in guarded mode)
+        try:
+            if self.guarded:
+                scanned, skipped = self._scan_text_guarded(text, budget)
+                if skipped:
+                    budget.record_truncation(location, location_type, skipped)
+            else:
+                scanned = self._scan_text(text)
+        except Exception as e:
+            logger.warning(f"Error scanning text at {location_type} {location}: {str(e)}")
+            return found_placeholders
+
+        for pattern_type, start, end, captured in scanned:
             try:
-                matches = re.finditer(pattern, text, re.IGNORECASE)
+                full_match = text[start:end]
+                span = (start, end)
                 
-                for match in matches:
-                    full_match = match.group(0)
-                    
-                    # Extract the placeholder text based on pattern type
-                    if pattern_type == 'dollar_bracket':
-                        # For $[____] or $[text], infer from context
-                        context = self._extract_context(text, match.span(), 200)  # Expanded context for better detection
-                        captured_text = match.group(1).strip() if match.groups() else ''
-                        if captured_text and captured_text != '_' * len(captured_text):
-                            # Has actual text inside
-                            placeholder_text = captured_text
-                        else:
-                            # Blank or underscores - infer from context
-                            placeholder_text = self._infer_placeholder_name(full_match, context)
-                    elif pattern_type == 'field_with_blank':
-                        # For "Field: _____" pattern, the field name is in group 1
-                        if match.groups():
-                            placeholder_text = match.group(1).strip()
-                        else:
-                            continue
+                # Extract the placeholder text based on pattern type
+                if pattern_type == 'dollar_bracket':
+                    # For $[____] or $[text], infer from context
+                    captured_text = captured.strip()
+                    if captured_text and captured_text != '_' * len(captured_text):
+                        # Has actual text inside
+                        placeholder_text = captured_text
                     else:
-                        # Most patterns capture the placeholder name in group 1
-                        if match.groups():
-                            placeholder_text = match.group(1).strip()
-                        else:
-                            # Skip patterns with no capture groups
-                            continue
-                    
-                    # Clean and normalize the placeholder name
-                    cleaned_name = self._clean_placeholder_name(placeholder_text)
-                    
-                    # Skip if empty after cleaning or too short
-                    if not cleaned_name or len(cleaned_name) < 2:
-                        continue
-                    
-                    # Skip common words that aren't placeholders
-                    if cleaned_name.lower() in ['the', 'this', 'that', 'section', 'see']:
-                        continue
-                    
-                    # Create placeholder data
-                    # Generate normalized key for deduplication
-                    normalized_key = self._generate_normalized_key(cleaned_name)
-                    unique_key = f"{normalized_key}_{location}"
-                    occurrence_id = f"ph_{uuid4().hex[:8]}"
-                    
-                    placeholder_data = {
-                        'id': occurrence_id,  # NEW: per-occurrence id
-                        'key': unique_key,
-                        'normalized_key': normalized_key,  # For deduplication
-                        'name': cleaned_name,
-                        'original': full_match,
-                        'type': self._identify_placeholder_type(cleaned_name),
-                        'pattern_type': pattern_type,
-                        'location': location,
-                        'location_type': location_type,
-                        'position': match.span(),
-                        'context': self._extract_context(text, match.span()),
-                        'required': True,  # Assume all placeholders are required
-                        'suggestions': []  # Will be populated later if needed
-                    }
-                    
-                    found_placeholders.append(placeholder_data)
-                    
+                        # Blank or underscores - infer from context
+                        context = self._extract_context(text, span, 200)  # Expanded context for better detection
+                        placeholder_text = self._infer_placeholder_name(full_match, context)
+                else:
+                    # All other patterns capture the placeholder name in group 1
+                    placeholder_text = captured.strip()
+                
+                # Clean and normalize the placeholder name (memoized per raw name)
+                cleaned_name, normalized_key, placeholder_type = self._normalize_name(placeholder_text)
+                
+                # Skip if empty after cleaning or too short
+                if not cleaned_name or len(cleaned_name) < 2:
+                    continue
+                
+                # Skip common words that aren't placeholders
+                if cleaned_name.lower() in ['the', 'this', 'that', 'section', 'see']:
+                    continue
+                
+                # Create placeholder data (key, position and context are derived on demand)
+                placeholder_data = PlaceholderRecord(
+                    id=self.new_occurrence_id(),  # Per-occurrence id
+                    normalized_key=normalized_key,  # For deduplication
+                    name=cleaned_name,
+                    original=full_match,
+                    type=placeholder_type,
+                    pattern_type=pattern_type,
+                    location=location,
+                    location_type=location_type,
+                    start=start,
+                    end=end,
+                    required=True  # Assume all placeholders are required
+                )
+                
+                found_placeholders.append(placeholder_data)
+                
             except Exception as e:
-                logger.warning(f"Error with pattern {pattern}: {str(e)}")
+                logger.warning(f"Error with pattern {pattern_type}: {str(e)}")
                 continue
         
         return found_placeholders
     
     def _smart_deduplicate(self, all_placeholders: List[Dict]) -> List[Dict]:
         """
-        Smart deduplication that uses CONTEXT to differentiate identical patterns.
+        Resolve overlapping matches within each location by pattern priority.
         
         Key logic:
-        - For identical patterns like $[___], check CONTEXT to determine if they're different fields
-        - Example: $[___] with "purchase amount" context vs $[___] with "valuation cap" context
-        - CRITICAL: NEVER merge placeholders in different locations - always keep them separate
-        - Only merge truly identical fields (same name + same context + SAME location)
+        - Several patterns can match the same text, e.g. [INSERT X] is hit by
+          both square_bracket and insert_style, and $[___] also contains a
+          square_bracket match for [___]
+        - Within a location, the higher-priority pattern (earlier in
+          self.patterns) keeps the span; any match overlapping it is dropped,
+          which also drops exact-span duplicates
+        - CRITICAL: NEVER merge placeholders in different locations - identical
+          $[___] blanks in different paragraphs always stay separate
         
         Args:
             all_placeholders: All detected placeholders (may have duplicates)
             
         Returns:
-            List of unique placeholders with context-aware deduplication
+            List of unique placeholders, ordered by position within each location
         """
         if not all_placeholders:
             return []
         
-        # Group by context-aware signature + location to ensure different locations stay separate
-        groups = {}
-        
+        # Group candidates by location; overlaps are only meaningful within one text block
+        by_location = {}
         for p in all_placeholders:
-            name_lower = p['name'].lower().strip()
-            context_lower = p.get('context', '').lower()
-            original = p['original']
-            location = p['location']
-            location_type = p['location_type']
-            
-            # Special handling for identical patterns (like $[___] or [___])
-            # CRITICAL: Include location in signature to prevent merging across different locations
-            if original.startswith('$[') or (original.startswith('[') and len(original) > 10):
-                # Check if it's a blank dollar amount pattern (with underscores)
-                is_blank_dollar = original.startswith('$[') and ('_' in original or len(original) > 8)
-                if is_blank_dollar:
-                    # Use CONTEXT to differentiate, but ALWAYS include location
-                    if 'purchase amount' in context_lower or 'payment by' in context_lower or 'exchange for' in context_lower:
-                        signature = f'purchase_amount_{location_type}_{location}'
-                    elif 'post-money valuation cap' in context_lower or 'valuation cap' in context_lower:
-                        signature = f'valuation_cap_{location_type}_{location}'
-                    elif 'post money' in context_lower:
-                        signature = f'valuation_cap_{location_type}_{location}'
-                    else:
-                        # Fallback: use location to keep them separate
-                        signature = f"amount_field_{location_type}_{location}"
-                else:
-                    # Has actual text inside - use name + location
-                    signature = f"{name_lower}_{location_type}_{location}"
-            else:
-                # For named placeholders, include location to prevent cross-location merging
-                normalized_key = p.get('normalized_key', name_lower)
-                signature = f"{normalized_key}_{location_type}_{location}"
-            
-            if signature not in groups:
-                groups[signature] = []
-            groups[signature].append(p)
+            by_location.setdefault((p['location_type'], p['location']), []).append(p)
         
-        # For each group, handle duplicates
         unique = []
-        for signature, group in groups.items():
-            if len(group) == 1:
-                # Single occurrence - keep it
-                unique.append(group[0])
-            else:
-                # Multiple occurrences with same signature - these are true duplicates
-                # Sort by position within the same location and keep only the first
-                group.sort(key=lambda x: x['position'][0])
-                
-                # Only deduplicate if they're in the EXACT same location and position is very close
-                # (within 10 characters suggests it's the same placeholder detected twice)
-                filtered_group = []
-                seen_positions = set()
-                
-                for p in group:
-                    pos_key = (p['position'][0], p['position'][1])
-                    # Only consider it a duplicate if position is very close (within 10 chars)
-                    is_duplicate = False
-                    for seen_pos in seen_positions:
-                        if abs(pos_key[0] - seen_pos[0]) < 10:
-                            is_duplicate = True
-                            break
-                    
-                    if not is_duplicate:
-                        filtered_group.append(p)
-                        seen_positions.add(pos_key)
-                
-                # Keep all non-duplicate occurrences
-                unique.extend(filtered_group)
-                
-                if len(group) > len(filtered_group):
-                    logger.info(f"Deduplicated {len(group) - len(filtered_group)} duplicate occurrences of '{group[0]['name']}' (signature: {signature})")
+        for (location_type, location), candidates in by_location.items():
+            kept = self._resolve_overlaps(candidates)
+            unique.extend(kept)
+            
+            if len(candidates) > len(kept):
+                logger.debug(f"Dropped {len(candidates) - len(kept)} overlapping match(es) in {location_type} {location}")
         
-        logger.info(f"Smart deduplication: {len(all_placeholders)} total → {len(unique)} unique")
+        logger.debug(f"Smart deduplication: {len(all_placeholders)} total → {len(unique)} unique")
         return unique
     
+    def _resolve_overlaps(self, candidates: List[Dict]) -> List[Dict]:
+        """
+        Keep the highest-priority, non-overlapping matches of one location.
+        
+        Candidates are visited by (priority, start). Accepted spans are kept in
+        a sorted interval list; since accepted spans never overlap, checking the
+        two neighbours found by bisection is enough, giving O(n log n) overall.
+        
+        Args:
+            candidates: Matches found in a single paragraph or table cell
+            
+        Returns:
+            Accepted matches sorted by start position
+        """
+        lowest_priority = len(self.patterns)
+        ordered = sorted(candidates, key=lambda p: (
+            self.pattern_priority.get(p['pattern_type'], lowest_priority),
+            p['position'][0]
+        ))
+        
+        starts = []
+        ends = []
+        kept = []
+        for p in ordered:
+            start, end = p['position']
+            i = bisect_left(starts, start)
+            
+            # Overlaps the accepted span on the left or the right (covers exact-span duplicates)
+            if (i > 0 and ends[i - 1] > start) or (i < len(starts) and starts[i] < end):
+                continue
+            
+            starts.insert(i, start)
+            ends.insert(i, end)
+            kept.append(p)
+        
+        kept.sort(key=lambda p: p['position'][0])
+        return kept
+    
     def _detect_contextual_placeholders(self, content: Dict[str, Any]) -> List[Dict]:
         """
         Detect contextual placeholders that might not follow standard patterns.
@@ -380,19 +1338,30 @@ class PlaceholderDetector:
             (r'([A-Za-z]+):\s*_{3,}', 'label_blank'),
         ]
         
+        # Linear-time equivalents of the patterns above (guarded mode)
+        guarded_scanners = {
+            'field_blank': self._scan_field_with_blank,
+            'field_space_blank': self._scan_label_space_blank,
+            'blank_description': self._scan_blank_with_description,
+            'label_blank': lambda text: self._scan_label_colon_blank(text, self._word_run),
+        }
+        
         # Search paragraphs for contextual patterns
         for para_data in content.get('paragraphs', []):
             text = para_data['text']
             
             for pattern, pattern_name in blank_patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE)
+                if self.guarded:
+                    matches = guarded_scanners[pattern_name](text)
+                else:
+                    matches = [
+                        (match.start(), match.end(), match.group(1))
+                        for match in re.finditer(pattern, text, re.IGNORECASE)
+                    ]
                 
-                for match in matches:
+                for start, end, captured in matches:
                     # Extract field name
-                    if pattern_name in ['blank_description']:
-                        field_name = match.group(1).strip()
-                    else:
-                        field_name = match.group(1).strip()
+                    field_name = captured.strip()
                     
                     # Clean the field name
                     field_name = self._clean_placeholder_name(field_name)
@@ -404,13 +1373,13 @@ class PlaceholderDetector:
                     placeholder_data = {
                         'key': self._generate_placeholder_key(field_name),
                         'name': field_name,
-                        'original': match.group(0),
+                        'original': text[start:end],
                         'type': self._identify_placeholder_type(field_name),
                         'pattern_type': f'contextual_{pattern_name}',
                         'location': para_data['index'],
                         'location_type': 'paragraph',
-                        'position': match.span(),
-                        'context': self._extract_context(text, match.span()),
+                        'position': (start, end),
+                        'context': self._extract_context(text, (start, end)),
                         'required': True,
                         'suggestions': []
                     }
@@ -490,6 +1459,88 @@ class PlaceholderDetector:
         
         return contextual_placeholders
     
+    def _normalize_name(self, raw_name: str) -> Tuple[str, str, str]:
+        """
+        Run the name-normalization pipeline through the memo.
+        
+        Args:
+            raw_name (str): Placeholder text as captured from the document
+            
+        Returns:
+            Tuple[str, str, str]: (cleaned name, normalized key, placeholder type)
+        """
+        return self.name_cache.get_or_compute(raw_name, self._compute_normalized_name)
+    
+    def _compute_normalized_name(self, raw_name: str) -> Tuple[str, str, str]:
+        """
+        Uncached name-normalization pipeline (see ``_normalize_name``).
+        
+        Args:
+            raw_name (str): Placeholder text as captured from the document
+            
+        Returns:
+            Tuple[str, str, str]: (cleaned name, normalized key, placeholder type)
+        """
+        cleaned_name = self._clean_placeholder_name(raw_name)
+        return (
+            cleaned_name,
+            self._generate_normalized_key(cleaned_name),
+            self._identify_placeholder_type(cleaned_name)
+        )
+    
+    @staticmethod
+    def new_occurrence_id() -> str:
+        """
+        Generate a fresh per-occurrence placeholder id.
+        
+        Returns:
+            str: Occurrence id
+        """
+        return f"ph_{uuid4().hex[:8]}"
+    
+    def refresh_occurrence_ids(self, placeholders: List[Dict]) -> List[Dict]:
+        """
+        Give every placeholder a fresh occurrence id (for reused detection results).
+        
+        Args:
+            placeholders (List[Dict]): Placeholders to update in place
+            
+        Returns:
+            List[Dict]: The same placeholders
+        """
+        for placeholder in placeholders:
+            placeholder['id'] = self.new_occurrence_id()
+        return placeholders
+    
+    def cache_signature(self) -> str:
+        """
+        Fingerprint of everything that shapes detection results.
+        
+        Used to version cached detection results: any change to the pattern
+        table, type indicators or matching mode yields a new signature.
+        
+        Returns:
+            str: Hex digest
+        """
+        signature_source = json.dumps({
+            'patterns': self.patterns,
+            'type_indicators': self.type_indicators,
+            'type_special_terms': TYPE_SPECIAL_TERMS,
+            'heuristic_pattern_types': HEURISTIC_PATTERN_TYPES,
+            'guarded': self.guarded,
+            'logic': DETECTION_LOGIC_VERSION
+        }, sort_keys=True)
+        return hashlib.sha256(signature_source.encode('utf-8')).hexdigest()
+    
+    def name_cache_stats(self) -> Dict[str, Any]:
+        """
+        Report name-normalization memo usage for monitoring.
+        
+        Returns:
+            Dict[str, Any]: Cache size, capacity, hits, misses and hit rate
+        """
+        return self.name_cache.stats()
+    
     def _clean_placeholder_name(self, name: str) -> str:
         """
         Clean and normalize placeholder name.
@@ -621,42 +1672,42 @@ class PlaceholderDetector:
         Returns:
             str: Identified type
         """
-        name_lower = name.lower()
+        # Find every indicator/special-case phrase in one pass over the name
+        hits = self.type_classifier.find_keywords(name.lower())
         
         # CRITICAL: Check special cases FIRST (before type_indicators)
         # to avoid false matches (e.g., "State of Incorporation" should be 'address', not 'company')
         
         # Special cases for compound phrases
         # IMPORTANT: Check address fields FIRST to override 'party' matching in person type
-        if 'address' in name_lower:
+        if 'address' in hits:
             return 'address'
-        elif 'state of incorporation' in name_lower:
+        elif 'state of incorporation' in hits:
             return 'address'
-        elif 'governing law' in name_lower or 'governing law jurisdiction' in name_lower:
+        elif 'governing law' in hits:
             return 'address'
-        elif 'valuation cap' in name_lower:
+        elif 'valuation cap' in hits:
             return 'amount'
-        elif 'discount rate' in name_lower:
+        elif 'discount rate' in hits:
             return 'percentage'
-        elif 'purchase amount' in name_lower:
+        elif 'purchase amount' in hits:
             return 'amount'
-        elif 'date of safe' in name_lower or 'safe date' in name_lower:
+        elif 'date of safe' in hits or 'safe date' in hits:
             return 'date'
-        elif 'investor name' in name_lower:
+        elif 'investor name' in hits:
             return 'person'
-        elif 'company name' in name_lower:
+        elif 'company name' in hits:
             return 'company'
         # Special handling for "Term Months", "Number of Months" etc. - these are numbers, not dates
-        elif ('term' in name_lower and 'month' in name_lower) or ('number of month' in name_lower) or ('month' in name_lower and any(word in name_lower for word in ['term', 'number', 'count', 'quantity', 'duration', 'period'])):
+        elif 'month' in hits and not hits.isdisjoint(('term', 'number', 'count', 'quantity', 'duration', 'period')):
             return 'number'
         
         # Check each type's indicators (after special cases)
-        for type_name, indicators in self.type_indicators.items():
-            if any(indicator in name_lower for indicator in indicators):
-                # Additional validation for 'company' type - exclude addresses
-                if type_name == 'company' and ('state' in name_lower and 'incorporation' in name_lower):
-                    continue  # Skip, this should be address
-                return type_name
+        for type_name in self.type_classifier.matched_labels(hits):
+            # Additional validation for 'company' type - exclude addresses
+            if type_name == 'company' and ('state' in hits and 'incorporation' in hits):
+                continue  # Skip, this should be address
+            return type_name
         
         # Default to text type
         return 'text'
@@ -674,30 +1725,16 @@ class PlaceholderDetector:
         Returns:
             str: Context string
         """
-        start, end = position
-        
-        # Calculate context boundaries
-        context_start = max(0, start - context_size)
-        context_end = min(len(text), end + context_size)
-        
-        # Extract context
-        context = text[context_start:context_end]
-        
-        # Add ellipsis if truncated
-        if context_start > 0:
-            context = '...' + context
-        if context_end < len(text):
-            context = context + '...'
-        
-        return context
+        return extract_context(text, position, context_size)
     
-    def _filter_placeholders(self, placeholders: List[Dict], document_content: Dict) -> List[Dict]:
+    def _filter_placeholders(self, placeholders: List[Dict],
+                             document_content: Optional[Dict] = None) -> List[Dict]:
         """
         Filter out problematic placeholders that shouldn't be prompted.
         
         Args:
             placeholders: List of detected placeholders
-            document_content: Parsed document content
+            document_content: Parsed document content (unused; kept for callers)
             
         Returns:
             List of filtered placeholders
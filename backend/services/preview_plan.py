@@ -0,0 +1,789 @@
+"""
+Preview Plan
+============
+Compiled segments for rendering the HTML document preview.
+
+generate_preview used to rebuild the preview from the parsed content on
+every call: each paragraph and table cell ran a ``str.replace`` per
+placeholder with the highlighted span. A preview plan does the
+content-dependent part once per detection result:
+
+- each paragraph and table cell holding placeholders is cut into static
+  text chunks and placeholder slots (the positions the replacements land on)
+- all other markup (styles, table structure, paragraphs without
+  placeholders) is joined into static strings
+
+Rendering is then a single join that formats each slot for its state
+(current, filled or unfilled). The markup is identical to the replace-based
+renderer, which is still used for the rare blocks where a slot's output
+could be matched by a later replacement (see PreviewPlan.compile).
+
+Entries never span two top-level blocks (paragraphs in order, then one
+block per table), and the plan records where each block starts and which
+placeholders it shows. That lets the preview be rendered one window of
+blocks at a time, at a cost proportional to the window.
+
+Blocks with slots are fragments: their element carries a ``data-fragment``
+id (``p-<paragraph index>`` or ``t-<table>-<row>-<col>``) so a client can
+swap single fragments. PreviewCache keeps the rendered fragments of each
+session and re-renders only those whose placeholders changed state, which
+lets fill endpoints answer with a delta instead of the whole document.
+
+Author: Legal Tech Solutions
+Date: October 2025
+Version: 1.0.0
+"""
+
+import os
+import re
+import json
+import uuid
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Iterable, Tuple, Set
+
+from .placeholder_detector import build_location_index, placeholders_by_id, located_placeholders
+
+logger = logging.getLogger(__name__)
+
+# Bump when the plan layout or the rendered markup changes
+PREVIEW_PLAN_VERSION = 4
+
+# Sessions whose rendered fragments are kept in memory (per process)
+PREVIEW_CACHE_MAX_SESSIONS = int(os.environ.get('PREVIEW_CACHE_MAX_SESSIONS', 128))
+
+# Slots are marked with one supplementary private-use code point each while cutting
+MARKER_BASE = 0xF0000
+MARKER_LIMIT = 0xFFFFD
+MARKER_PATTERN = re.compile('[\U000F0000-\U000FFFFD]')
+
+# Span layout of the original preview templates (the frontend matches on it)
+SPAN_INDENT = ' ' * 39
+
+PREVIEW_STYLE = """
+            <style>
+                .document-preview {
+                    font-family: 'Calibri', 'Arial', sans-serif;
+                    line-height: 1.6;
+                    color: #333;
+                    background: white;
+                    padding: 40px;
+                    max-width: 800px;
+                    margin: 0 auto;
+                }
+                .paragraph {
+                    margin-bottom: 12px;
+                }
+                .heading {
+                    font-weight: bold;
+                    font-size: 1.2em;
+                    margin-top: 20px;
+                    margin-bottom: 10px;
+                }
+                .title {
+                    font-weight: bold;
+                    font-size: 1.5em;
+                    margin-bottom: 20px;
+                    text-align: center;
+                }
+                .placeholder-current {
+                    background-color: #fee2e2;
+                    color: #991b1b;
+                    padding: 4px 8px;
+                    border-radius: 4px;
+                    font-weight: 700;
+                    border: 2px solid #dc2626;
+                    box-shadow: 0 0 8px rgba(220, 38, 38, 0.3);
+                    display: inline-block;
+                }
+                .placeholder-filled {
+                    background-color: #d4edda;
+                    color: #155724;
+                    padding: 2px 6px;
+                    border-radius: 3px;
+                    font-weight: 600;
+                    border: 1px solid #c3e6cb;
+                    cursor: pointer;
+                }
+                .placeholder-filled:hover {
+                    background-color: #c3e6cb;
+                    text-decoration: underline;
+                }
+                .placeholder-unfilled {
+                    background-color: transparent;
+                    color: #333;
+                    padding: 2px 6px;
+                    border-radius: 3px;
+                    font-weight: 500;
+                    border: 1px dashed #ccc;
+                    opacity: 0.6;
+                }
+                .document-table {
+                    width: 100%;
+                    border-collapse: collapse;
+                    margin: 20px 0;
+                }
+                .document-table td, .document-table th {
+                    border: 1px solid #ddd;
+                    padding: 8px;
+                    text-align: left;
+                }
+                .document-table th {
+                    background-color: #f3f4f6;
+                    font-weight: bold;
+                }
+                .document-table tr:nth-child(even) {
+                    background-color: #ffffff;
+                }
+            </style>
+            """
+
+
+def plan_signature(placeholders: List[Dict]) -> str:
+    """
+    Fingerprint of everything in the placeholder list that shapes a preview plan.
+
+    Placeholders are identified by their index, which is what the plan
+    refers to: sessions of one document share the plan under their own
+    occurrence ids, so the ids themselves are left out.
+
+    Args:
+        placeholders (List[Dict]): Session placeholders
+
+    Returns:
+        str: Hex digest; a plan is only valid for the same signature
+    """
+    fields = [
+        [p['key'], p['name'], p['original'], p.get('location_type'), str(p.get('location')),
+         list(p.get('position') or ())]
+        for p in placeholders
+    ]
+    return hashlib.sha256(json.dumps(fields).encode('utf-8')).hexdigest()
+
+
+def filled_value(placeholder: Dict, filled_values: Dict[str, str]) -> Optional[str]:
+    """
+    Value of a placeholder, looked up by id first, then key.
+
+    Returns:
+        Optional[str]: The value, or None if the placeholder is not filled
+    """
+    placeholder_id = placeholder.get('id', placeholder['key'])
+    if placeholder_id in filled_values or placeholder['key'] in filled_values:
+        return filled_values.get(placeholder_id, filled_values.get(placeholder['key'], ''))
+    return None
+
+
+def paragraph_span(idx: int, placeholder: Dict, filled_values: Dict[str, str],
+                   current_index: Optional[int]) -> str:
+    """
+    Highlighted span for a placeholder in a paragraph.
+
+    The current field is shown in red with its name, filled fields in green
+    with their value, and unfilled fields minimally with their original text.
+
+    Args:
+        idx (int): Index of the placeholder in the placeholder list
+        placeholder (Dict): The placeholder
+        filled_values (Dict[str, str]): Filled values by id (or key)
+        current_index (Optional[int]): Index of the field being filled
+
+    Returns:
+        str: Span markup
+    """
+    name = placeholder.get('name', 'Field')
+    if current_index is not None and idx == current_index:
+        css_class, title, body = 'placeholder-current', f"Field: {name} - Currently filling this field", f"[{name}]"
+    else:
+        value = filled_value(placeholder, filled_values)
+        if value is not None:
+            css_class, title, body = 'placeholder-filled', f"Field: {name} - Click to edit (Value: {value})", value
+        else:
+            css_class, title, body = 'placeholder-unfilled', f"Field: {name} - Not yet filled", placeholder['original']
+
+    return (
+        f'<span class="{css_class}" \n'
+        f'{SPAN_INDENT}title="{title}"\n'
+        f'{SPAN_INDENT}data-ph="{placeholder.get("id", placeholder["key"])}"\n'
+        f'{SPAN_INDENT}data-key="{placeholder["key"]}"\n'
+        f'{SPAN_INDENT}data-index="{idx}">\n'
+        f'{SPAN_INDENT}{body}</span>'
+    )
+
+
+def cell_span(placeholder: Dict, filled_values: Dict[str, str]) -> str:
+    """Highlighted span for a placeholder in a table cell (filled or unfilled)"""
+    value = filled_value(placeholder, filled_values)
+    if value is not None:
+        return f'<span class="placeholder-filled">{value}</span>'
+    return f'<span class="placeholder-unfilled">{placeholder["original"]}</span>'
+
+
+def highlight_paragraph(text: str, located: Iterable[Tuple[int, Dict]], filled_values: Dict[str, str],
+                        current_index: Optional[int]) -> str:
+    """
+    Replace-based highlighting of one paragraph (the reference renderer).
+
+    Each placeholder replaces the first occurrence of its original text in
+    the paragraph as highlighted so far; repeated texts are replaced once.
+
+    Args:
+        text (str): Paragraph text
+        located (Iterable[Tuple[int, Dict]]): (list index, placeholder) of the
+            placeholders detected in the paragraph, in list order
+        filled_values (Dict[str, str]): Filled values by id (or key)
+        current_index (Optional[int]): Index of the field being filled
+
+    Returns:
+        str: Paragraph HTML content
+    """
+    replaced = set()
+    for idx, placeholder in located:
+        original = placeholder['original']
+        if original not in text or original in replaced:
+            continue
+        text = text.replace(original, paragraph_span(idx, placeholder, filled_values, current_index), 1)
+        replaced.add(original)
+    return text
+
+
+def highlight_cell(text: str, located: Iterable[Tuple[int, Dict]], filled_values: Dict[str, str]) -> str:
+    """
+    Replace-based highlighting of one table cell (the reference renderer).
+
+    Every occurrence of a placeholder's text is highlighted by the first
+    placeholder of the cell with that text.
+
+    Args:
+        text (str): Cell text
+        located (Iterable[Tuple[int, Dict]]): (list index, placeholder) of the
+            placeholders detected in the cell, in list order
+        filled_values (Dict[str, str]): Filled values by id (or key)
+
+    Returns:
+        str: Cell HTML content
+    """
+    highlighted = set()
+    for _, placeholder in located:
+        if placeholder['original'] in highlighted:
+            continue
+        highlighted.add(placeholder['original'])
+        text = text.replace(placeholder['original'], cell_span(placeholder, filled_values))
+    return text
+
+
+def paragraph_class(style: str) -> str:
+    """CSS class of a paragraph from its style name"""
+    style = style.lower()
+    if 'heading' in style:
+        return 'heading'
+    if 'title' in style:
+        return 'title'
+    return 'paragraph'
+
+
+class PreviewPlan:
+    """Static chunks and placeholder slots of one document preview"""
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Args:
+            data (Dict[str, Any]): Plan contents (see compile); JSON-serializable
+                so it can be stored with the session
+        """
+        self.data = data
+
+    @classmethod
+    def from_data(cls, data: Optional[Dict[str, Any]]) -> Optional['PreviewPlan']:
+        """
+        Wrap stored plan contents.
+
+        Returns:
+            Optional[PreviewPlan]: The plan, or None if missing or from another
+                plan version
+        """
+        if not data or data.get('version') != PREVIEW_PLAN_VERSION:
+            return None
+        return cls(data)
+
+    @property
+    def plan_id(self) -> str:
+        return self.data['plan_id']
+
+    @property
+    def slot_count(self) -> int:
+        return self.data['slot_count']
+
+    @property
+    def entries(self) -> List[Any]:
+        """Static strings and fragment blocks, joined with newlines when rendered"""
+        return self.data['entries']
+
+    @property
+    def block_count(self) -> int:
+        """Top-level preview blocks: paragraphs, then one per table"""
+        return len(self.data['block_starts']) - 1
+
+    def block_of(self, placeholder_index: int) -> Optional[int]:
+        """Block showing a placeholder (None if it is not located in the preview)"""
+        blocks = self.data['placeholder_blocks']
+        if 0 <= placeholder_index < len(blocks):
+            return blocks[placeholder_index]
+        return None
+
+    def window(self, start: int, end: int) -> Tuple[int, int]:
+        """Clamp a block range [start, end) to the document"""
+        start = min(max(start, 0), self.block_count)
+        return start, min(max(end, start), self.block_count)
+
+    def window_around(self, placeholder_index: Optional[int], size: int) -> Tuple[int, int]:
+        """
+        Block window of ``size`` blocks centred on a placeholder.
+
+        Args:
+            placeholder_index (Optional[int]): Placeholder to centre on
+            size (int): Number of blocks in the window
+
+        Returns:
+            Tuple[int, int]: Block range [start, end); starts at the top of
+                the document when the placeholder is not located
+        """
+        block = self.block_of(placeholder_index) if placeholder_index is not None else None
+        start = 0 if block is None else block - (size - 1) // 2
+        start = min(max(start, 0), max(self.block_count - size, 0))
+        return self.window(start, start + size)
+
+    def placeholder_window(self, first: int, last: int) -> Tuple[int, int]:
+        """
+        Smallest block window showing the placeholders [first, last).
+
+        Returns:
+            Tuple[int, int]: Block range [start, end); empty when none of the
+                placeholders is located
+        """
+        blocks = self.data['placeholder_blocks']
+        located = [block for block in blocks[max(first, 0):max(last, 0)] if block is not None]
+        if not located:
+            return self.window(0, 0)
+        return self.window(min(located), max(located) + 1)
+
+    def window_placeholders(self, start: int, end: int) -> List[int]:
+        """Indexes of the placeholders shown by the blocks [start, end)"""
+        block_placeholders = self.data['block_placeholders']
+        return sorted({idx for block in range(start, end) for idx in block_placeholders[block]})
+
+    def matches(self, placeholders: List[Dict], signature: Optional[str] = None) -> bool:
+        """
+        Check the plan was compiled for these placeholders (names, texts,
+        locations and positions, see plan_signature).
+
+        Args:
+            placeholders (List[Dict]): Session placeholders
+            signature (Optional[str]): Their plan_signature, if stored with
+                them (saves hashing the list)
+
+        Returns:
+            bool: True if the plan is valid for the placeholders
+        """
+        if self.data['placeholder_count'] != len(placeholders):
+            return False
+        return self.data['placeholder_signature'] == (signature or plan_signature(placeholders))
+
+    @classmethod
+    def compile(cls, content: Dict[str, Any], placeholders: List[Dict],
+                location_index: Optional[Dict[str, Dict[str, List[str]]]] = None) -> 'PreviewPlan':
+        """
+        Compile the preview plan of a parsed document.
+
+        Each block (paragraph or cell) with placeholders is highlighted once
+        with marker characters instead of spans, which gives the static
+        chunks and the slot positions. Rendering the slots with spans yields
+        the same markup as the replace-based renderer, unless a span could
+        contain the text of a placeholder replaced after it (the replacement
+        would then land inside the span). Each slot keeps those later texts:
+        spans known at compile time (current, unfilled) are checked here and
+        the block is kept replace-based if one matches; filled values are
+        checked when rendering.
+
+        Args:
+            content (Dict[str, Any]): Parsed document content
+            placeholders (List[Dict]): Placeholders with ids and locations
+            location_index (Optional[Dict]): Placeholder ids by location (see
+                build_location_index); built from placeholders when not given
+
+        Returns:
+            PreviewPlan: Compiled plan
+        """
+        if location_index is None:
+            location_index = build_location_index(placeholders)
+        by_id = placeholders_by_id(placeholders)
+
+        entries: List[Any] = []
+        static = ['<div class="document-preview">', PREVIEW_STYLE]
+        slot_count = 0
+        # Entry where each top-level block starts; placeholders per block and back
+        block_starts: List[int] = []
+        block_placeholders: List[List[int]] = []
+        placeholder_blocks: List[Optional[int]] = [None] * len(placeholders)
+
+        def flush() -> None:
+            if static:
+                entries.append('\n'.join(static))
+                static.clear()
+
+        def begin_block() -> None:
+            flush()
+            block_starts.append(len(entries))
+            block_placeholders.append([])
+
+        def add_block(kind: str, text: str, location: Any, tag: str, attributes: str = '') -> None:
+            nonlocal slot_count
+            located = list(located_placeholders(location_index, kind, location, by_id))
+            for idx, _ in located:
+                block_placeholders[-1].append(idx)
+                if placeholder_blocks[idx] is None:
+                    placeholder_blocks[idx] = len(block_starts) - 1
+            block = cls._compile_block(kind, text, located)
+            if block is None:
+                static.append(f"<{tag}{attributes}>{text}</{tag}>")
+                return
+            flush()
+            fragment = f"{kind[0]}-{location}"
+            block.update({
+                'kind': kind,
+                'fragment': fragment,
+                'open': f'<{tag}{attributes} data-fragment="{fragment}">',
+                'close': f"</{tag}>",
+                'located': [idx for idx, _ in located]
+            })
+            slot_count += len(block.get('slots', ()))
+            entries.append(block)
+
+        for para in content.get('paragraphs', []):
+            begin_block()
+            add_block('paragraph', para['text'], para['index'], 'p',
+                      f' class="{paragraph_class(para.get("style", "Normal"))}"')
+
+        for table in content.get('tables', []):
+            begin_block()
+            static.append('<table class="document-table">')
+            for row_idx, row in enumerate(table['rows']):
+                static.append('<tr>')
+                for col_idx, cell in enumerate(row):
+                    # Same location key as the detector (merged cells carry their grid position)
+                    if isinstance(cell, dict):
+                        text = cell['text']
+                        location = f"{table['index']}-{cell.get('row', row_idx)}-{cell.get('col', col_idx)}"
+                    else:
+                        text = cell
+                        location = f"{table['index']}-{row_idx}-{col_idx}"
+
+                    # Use th for first row (header)
+                    tag = 'th' if row_idx == 0 else 'td'
+                    spans = ''
+                    if isinstance(cell, dict):
+                        if cell.get('col_span', 1) > 1:
+                            spans += f' colspan="{cell["col_span"]}"'
+                        if cell.get('row_span', 1) > 1:
+                            spans += f' rowspan="{cell["row_span"]}"'
+                    add_block('table', text, location, tag, spans)
+                static.append('</tr>')
+            static.append('</table>')
+
+        flush()
+        block_starts.append(len(entries))
+        entries.append('</div>')
+
+        return cls({
+            'version': PREVIEW_PLAN_VERSION,
+            'plan_id': uuid.uuid4().hex,
+            'placeholder_count': len(placeholders),
+            'placeholder_signature': plan_signature(placeholders),
+            'slot_count': slot_count,
+            'entries': entries,
+            'block_starts': block_starts,
+            'block_placeholders': block_placeholders,
+            'placeholder_blocks': placeholder_blocks
+        })
+
+    @staticmethod
+    def _compile_block(kind: str, text: str, located: List[Tuple[int, Dict]]) -> Optional[Dict[str, Any]]:
+        """
+        Cut one paragraph or cell into chunks and slots.
+
+        Args:
+            kind (str): 'paragraph' or 'table'
+            text (str): Block text
+            located (List[Tuple[int, Dict]]): Placeholders detected in the block
+
+        Returns:
+            Optional[Dict[str, Any]]: ``chunks`` and ``slots`` ([list index,
+                later texts] in position order), or ``text`` alone for a block
+                that stays replace-based; None if nothing is highlighted
+        """
+        if not located:
+            return None
+        if MARKER_PATTERN.search(text) or MARKER_BASE + len(located) > MARKER_LIMIT:
+            return {'text': text}
+
+        # Highlight with markers, in the reference renderer's order
+        marked = text
+        replaced = []  # (position in located, list index, placeholder) per slot
+        seen = set()
+        for position, (idx, placeholder) in enumerate(located):
+            original = placeholder['original']
+            if original not in marked or original in seen:
+                continue
+            marker = chr(MARKER_BASE + len(replaced))
+            marked = marked.replace(original, marker, 1) if kind == 'paragraph' else marked.replace(original, marker)
+            seen.add(original)
+            replaced.append((position, idx, placeholder))
+        if not replaced:
+            return None
+
+        slots = []
+        for n, (position, idx, placeholder) in enumerate(replaced):
+            # Texts a later replacement would look for (texts already replaced are skipped)
+            done = {p['original'] for _, _, p in replaced[:n + 1]}
+            later = sorted({p['original'] for _, p in located[position + 1:]} - done)
+            if later:
+                # A text with '<' or '>' could also match across a span boundary
+                if any('<' in original or '>' in original for original in later):
+                    return {'text': text}
+                if kind == 'paragraph':
+                    fixed = [paragraph_span(idx, placeholder, {}, idx), paragraph_span(idx, placeholder, {}, None)]
+                else:
+                    fixed = [cell_span(placeholder, {})]
+                if any(original in span for span in fixed for original in later):
+                    return {'text': text}
+            slots.append([idx, later])
+
+        pieces = MARKER_PATTERN.split(marked)
+        order = [slots[ord(marker) - MARKER_BASE] for marker in MARKER_PATTERN.findall(marked)]
+        return {'chunks': pieces, 'slots': order}
+
+    def render(self, placeholders: List[Dict], filled_values: Dict[str, str],
+               current_index: Optional[int] = None, window: Optional[Tuple[int, int]] = None) -> str:
+        """
+        Render the preview HTML.
+
+        Args:
+            placeholders (List[Dict]): Placeholders the plan was compiled for
+            filled_values (Dict[str, str]): Filled values by id (or key)
+            current_index (Optional[int]): Index of the field being filled
+            window (Optional[Tuple[int, int]]): Block range [start, end) to
+                render (see window); the whole document when not given
+
+        Returns:
+            str: HTML string representing the document preview (or the
+                window's blocks inside the same preview container)
+        """
+        entries = self.entries
+        if window is not None:
+            block_starts = self.data['block_starts']
+            start, end = self.window(*window)
+            entries = [entries[0], *entries[block_starts[start]:block_starts[end]], entries[-1]]
+        return '\n'.join(
+            entry if isinstance(entry, str) else self.render_block(entry, placeholders, filled_values, current_index)
+            for entry in entries
+        )
+
+    @staticmethod
+    def render_block(block: Dict[str, Any], placeholders: List[Dict], filled_values: Dict[str, str],
+                     current_index: Optional[int]) -> str:
+        """
+        Render one fragment (paragraph or cell element).
+
+        Falls back to replace-based highlighting when a filled value could
+        be matched by a later replacement of the block.
+
+        Args:
+            block (Dict[str, Any]): Fragment entry of the plan
+            placeholders (List[Dict]): Placeholders the plan was compiled for
+            filled_values (Dict[str, str]): Filled values by id (or key)
+            current_index (Optional[int]): Index of the field being filled
+
+        Returns:
+            str: Element markup
+        """
+        is_paragraph = block['kind'] == 'paragraph'
+        chunks = block.get('chunks')
+        if chunks is not None:
+            parts = [block['open'], chunks[0]]
+            for n, (idx, later) in enumerate(block['slots']):
+                if is_paragraph:
+                    span = paragraph_span(idx, placeholders[idx], filled_values, current_index)
+                else:
+                    span = cell_span(placeholders[idx], filled_values)
+                if later and any(original in span for original in later):
+                    break
+                parts.append(span)
+                parts.append(chunks[n + 1])
+            else:
+                parts.append(block['close'])
+                return ''.join(parts)
+
+        # Replace-based rendering; the text is the chunks with their original texts put back
+        text = block.get('text')
+        if text is None:
+            text = chunks[0] + ''.join(
+                placeholders[idx]['original'] + chunk for (idx, _), chunk in zip(block['slots'], chunks[1:])
+            )
+        located = [(idx, placeholders[idx]) for idx in block['located']]
+        if is_paragraph:
+            text = highlight_paragraph(text, located, filled_values, current_index)
+        else:
+            text = highlight_cell(text, located, filled_values)
+        return f"{block['open']}{text}{block['close']}"
+
+
+class _SessionFragments:
+    """Rendered fragments of one session's preview and the state they show"""
+
+    __slots__ = ('plan', 'plan_id', 'lock', 'token', 'serial', 'fragments', 'filled_values', 'current_index',
+                 'blocks_by_placeholder', 'placeholders_by_value_key')
+
+    def __init__(self, plan: PreviewPlan, placeholders: List[Dict]):
+        self.plan = plan
+        self.plan_id = plan.plan_id
+        # Held while rendering into this session's fragments
+        self.lock = threading.Lock()
+        # Versions of a new cache entry never match ones handed out before
+        self.token = uuid.uuid4().hex[:8]
+        self.serial = 0
+        self.fragments: List[Optional[str]] = [None] * len(plan.entries)
+        self.filled_values: Dict[str, str] = {}
+        self.current_index: Optional[int] = None
+
+        # Placeholder -> entries that render it; filled_values key (id or key) -> placeholders
+        self.blocks_by_placeholder: Dict[int, List[int]] = {}
+        for position, entry in enumerate(plan.entries):
+            if not isinstance(entry, str):
+                for idx in entry['located']:
+                    self.blocks_by_placeholder.setdefault(idx, []).append(position)
+        self.placeholders_by_value_key: Dict[str, List[int]] = {}
+        for idx, placeholder in enumerate(placeholders):
+            placeholder_id = placeholder.get('id', placeholder['key'])
+            self.placeholders_by_value_key.setdefault(placeholder_id, []).append(idx)
+            if placeholder['key'] != placeholder_id:
+                self.placeholders_by_value_key.setdefault(placeholder['key'], []).append(idx)
+
+    @property
+    def version(self) -> str:
+        return f"{self.token}:{self.serial}"
+
+    def stale_blocks(self, filled_values: Dict[str, str], current_index: Optional[int]) -> Set[int]:
+        """Entries showing a placeholder whose value or current-field highlight changed"""
+        changed_keys = [
+            key for key in self.filled_values.keys() | filled_values.keys()
+            if self.filled_values.get(key) != filled_values.get(key)
+        ]
+        changed = {idx for key in changed_keys for idx in self.placeholders_by_value_key.get(key, ())}
+        if current_index != self.current_index:
+            changed.update(idx for idx in (self.current_index, current_index) if idx is not None)
+        return {position for idx in changed for position in self.blocks_by_placeholder.get(idx, ())}
+
+
+class PreviewCache:
+    """
+    Per-session cache of rendered preview fragments (in process memory).
+
+    Each render re-renders only the fragments affected since the session's
+    previous render: placeholders whose filled value changed and the old
+    and new current field. Every render is stamped with a version; a client
+    that sends back the version it is showing gets only the fragments that
+    changed since (``preview_delta``), anyone else gets the full document.
+    """
+
+    def __init__(self, max_sessions: int = PREVIEW_CACHE_MAX_SESSIONS):
+        """
+        Args:
+            max_sessions (int): Sessions kept before the least recently
+                rendered one is dropped
+        """
+        self.max_sessions = max_sessions
+        self._sessions: 'OrderedDict[str, _SessionFragments]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, session_id: str, plan: PreviewPlan, placeholders: List[Dict],
+               filled_values: Dict[str, str], current_index: Optional[int] = None,
+               base_version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Render a session's preview, as a delta when possible.
+
+        Args:
+            session_id (str): Session identifier
+            plan (PreviewPlan): The session's preview plan
+            placeholders (List[Dict]): Placeholders the plan was compiled for
+            filled_values (Dict[str, str]): Filled values by id (or key)
+            current_index (Optional[int]): Index of the field being filled
+            base_version (Optional[str]): Version of the preview the client
+                shows, if it accepts a delta
+
+        Returns:
+            Dict[str, Any]: ``preview_version`` and either ``preview_delta``
+                (fragment id -> element markup) or ``preview`` (full HTML)
+        """
+        # The cache-wide lock only guards the session table; rendering holds
+        # the session's own lock, so other sessions render meanwhile
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is not None and state.plan_id == plan.plan_id:
+                self._sessions.move_to_end(session_id)
+            else:
+                state = None
+        fresh = state is None
+        if fresh:
+            state = _SessionFragments(plan, placeholders)
+            with self._lock:
+                self._sessions[session_id] = state
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+
+        with state.lock:
+            if fresh:
+                stale = [position for position, entry in enumerate(plan.entries) if not isinstance(entry, str)]
+            else:
+                stale = sorted(state.stale_blocks(filled_values, current_index))
+
+            previous_version = state.version
+            delta = {}
+            for position in stale:
+                entry = plan.entries[position]
+                html = plan.render_block(entry, placeholders, filled_values, current_index)
+                if html != state.fragments[position]:
+                    state.fragments[position] = html
+                    delta[entry['fragment']] = html
+            if delta:
+                state.serial += 1
+            state.filled_values = dict(filled_values)
+            state.current_index = current_index
+
+            version = state.version
+            if not fresh and base_version is not None and base_version == previous_version:
+                return {'preview_version': version, 'preview_delta': delta}
+            fragments = list(state.fragments)
+
+        html = '\n'.join(
+            entry if isinstance(entry, str) else fragments[position]
+            for position, entry in enumerate(plan.entries)
+        )
+        return {'preview_version': version, 'preview': html}
+
+    def plan(self, session_id: str, plan_id: Optional[str]) -> Optional[PreviewPlan]:
+        """
+        The preview plan a session last rendered with, if it is ``plan_id``
+        (saves loading the plan from the session store).
+        """
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None or plan_id is None or state.plan_id != plan_id:
+                return None
+            return state.plan
+
+    def discard(self, session_id: str) -> None:
+        """Forget a session's fragments (e.g. on reset)"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
@@ -0,0 +1,331 @@
+"""
+Session History
+===============
+Event entries for the session history list.
+
+Saving a session used to push the whole session (parsed content and
+placeholders included) onto its history list, so a session could hold a
+hundred copies of its document. History now records what changed between
+two saves of a small tracked state (filled values, current field, status
+and a few counters):
+
+- ``field_filled`` / ``field_cleared``: one field's value (and the previous one)
+- ``index_moved``: current field index, from / to
+- ``status_changed``: status, from / to
+- ``session_updated``: any other tracked field, from / to
+
+Every state entry carries a sequence number, and every HISTORY_SNAPSHOT_EVERY
+events a ``snapshot`` entry holds the full tracked state, so the state after
+any retained event can be rebuilt from the nearest earlier snapshot.
+
+Author: Legal Tech Solutions
+Date: October 2025
+Version: 1.0.0
+"""
+
+import os
+from typing import Dict, List, Any, Optional, Tuple
+
+# Events between two snapshot entries
+HISTORY_SNAPSHOT_EVERY = int(os.environ.get('HISTORY_SNAPSHOT_EVERY', 20))
+
+SNAPSHOT_EVENT = 'snapshot'
+
+# Tracked fields other than filled_values / current_placeholder_index / status
+SCALAR_FIELDS = ('filename', 'user_id', 'placeholders_count', 'indexing')
+
+# Tracked field -> session key it is taken from
+STATE_SOURCES = {
+    'status': 'status',
+    'current_placeholder_index': 'current_placeholder_index',
+    'filled_values': 'filled_values',
+    'filename': 'filename',
+    'user_id': 'user_id',
+    'placeholders_count': 'placeholders',
+    'indexing': 'indexing'
+}
+
+
+def tracked_state(data: Dict[str, Any], base: Optional[Dict[str, Any]] = None,
+                  value_updates: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+    """
+    The part of a session that history records.
+
+    Args:
+        data (Dict[str, Any]): Session data as saved, or only the fields of
+            a field-level update
+        base (Optional[Dict[str, Any]]): State at the last save; fields not
+            in ``data`` keep their value from it
+        value_updates (Optional[Dict]): Filled values set (None: cleared)
+            on top of the base state's values
+
+    Returns:
+        Dict[str, Any]: Compact, JSON-serializable state
+    """
+    state = {
+        'status': data.get('status', 'active'),
+        'current_placeholder_index': data.get('current_placeholder_index'),
+        'filled_values': dict(data.get('filled_values', {})),
+        'filename': data.get('filename'),
+        'user_id': data.get('user_id'),
+        'placeholders_count': len(data.get('placeholders', [])),
+        'indexing': bool(data.get('indexing', False))
+    }
+    if base is not None:
+        for field, source in STATE_SOURCES.items():
+            if source not in data:
+                state[field] = base[field]
+        state['filled_values'] = dict(state['filled_values'])
+    for field, value in (value_updates or {}).items():
+        if value is None:
+            state['filled_values'].pop(field, None)
+        else:
+            state['filled_values'][field] = value
+    return state
+
+
+def diff_events(previous: Dict[str, Any], current: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Events that turn one tracked state into another.
+
+    Args:
+        previous (Dict[str, Any]): State at the last save
+        current (Dict[str, Any]): State being saved
+
+    Returns:
+        List[Tuple[str, Dict[str, Any]]]: (event type, data) pairs; empty if
+            nothing tracked changed
+    """
+    events = []
+
+    old_values = previous.get('filled_values', {})
+    new_values = current['filled_values']
+    for field, value in new_values.items():
+        if field not in old_values:
+            events.append(('field_filled', {'field': field, 'value': value}))
+        elif old_values[field] != value:
+            events.append(('field_filled', {'field': field, 'value': value, 'previous': old_values[field]}))
+    for field, value in old_values.items():
+        if field not in new_values:
+            events.append(('field_cleared', {'field': field, 'previous': value}))
+
+    if previous.get('current_placeholder_index') != current['current_placeholder_index']:
+        events.append(('index_moved', {
+            'from': previous.get('current_placeholder_index'),
+            'to': current['current_placeholder_index']
+        }))
+
+    if previous.get('status') != current['status']:
+        events.append(('status_changed', {'from': previous.get('status'), 'to': current['status']}))
+
+    changes = {
+        field: {'from': previous.get(field), 'to': current[field]}
+        for field in SCALAR_FIELDS if previous.get(field) != current[field]
+    }
+    if changes:
+        events.append(('session_updated', {'changes': changes}))
+
+    return events
+
+
+def apply_event(state: Dict[str, Any], event_type: str, data: Dict[str, Any]) -> None:
+    """Apply one state event to a tracked state (in place)"""
+    if event_type == 'field_filled':
+        state['filled_values'][data['field']] = data['value']
+    elif event_type == 'field_cleared':
+        state['filled_values'].pop(data['field'], None)
+    elif event_type == 'index_moved':
+        state['current_placeholder_index'] = data['to']
+    elif event_type == 'status_changed':
+        state['status'] = data['to']
+    elif event_type == 'session_updated':
+        for field, change in data['changes'].items():
+            state[field] = change['to']
+
+
+def replay(entries: List[Dict[str, Any]], seq: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Rebuild the tracked state after a history event.
+
+    Args:
+        entries (List[Dict[str, Any]]): History entries, newest first (as stored)
+        seq (Optional[int]): Sequence number of the event; the latest when
+            not given
+
+    Returns:
+        Optional[Dict[str, Any]]: State after that event, or None if no
+            retained snapshot precedes it
+    """
+    # Oldest first; entries without a sequence number are annotations (session_created, ...)
+    state_entries = [entry for entry in reversed(entries) if 'seq' in entry]
+    if seq is None:
+        if not state_entries:
+            return None
+        seq = state_entries[-1]['seq']
+
+    base = None
+    for position, entry in enumerate(state_entries):
+        if entry['seq'] > seq:
+            break
+        if entry['event_type'] == SNAPSHOT_EVENT:
+            base = position
+    if base is None:
+        return None
+
+    snapshot = state_entries[base]
+    state = dict(snapshot['data'], filled_values=dict(snapshot['data']['filled_values']))
+    for entry in state_entries[base + 1:]:
+        if entry['seq'] > seq:
+            break
+        if entry['event_type'] != SNAPSHOT_EVENT:
+            apply_event(state, entry['event_type'], entry['data'])
+    return state
+
+
+def tracked_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The tracked fields a save sets: those whose session key is in ``data``
+    (the rest keep their value from the last save).
+
+    Args:
+        data (Dict[str, Any]): Session data as saved, or only the fields of
+            a field-level update
+
+    Returns:
+        Dict[str, Any]: Part of tracked_state(data)
+    """
+    state = tracked_state(data)
+    return {field: state[field] for field, source in STATE_SOURCES.items() if source in data}
+
+
+# The same history bookkeeping in Lua, for Redis stores: the session write
+# script diffs against the stored state and numbers the entries in the
+# same atomic step as the write, so concurrent saves cannot both build on
+# one state. Mirrors tracked_state (with a base), diff_events and
+# SessionManager._history_changes; events of one save come out in field
+# order rather than insertion order, which replay does not depend on.
+#
+# record_history(history_key, state_key, update, settings) takes
+# ``update`` = {'fields': tracked_fields(data), 'initial': tracked_state(data,
+# value_updates=...), 'value_updates': ..., 'timestamp': ...} and
+# ``settings`` = {'limit', 'snapshot_every', 'ttl'}, and returns the new state.
+HISTORY_LUA = """
+local SCALAR_FIELDS = {'filename', 'user_id', 'placeholders_count', 'indexing'}
+local SNAPSHOT_EVENT = 'snapshot'
+
+local function nullable(value)
+    if value == nil then return cjson.null end
+    return value
+end
+
+local function sorted_keys(t)
+    local keys = {}
+    for key in pairs(t) do keys[#keys + 1] = key end
+    table.sort(keys)
+    return keys
+end
+
+-- cjson writes an empty table as an array; filled values are an object
+local function encode_state(state)
+    local rest = {}
+    for key, value in pairs(state) do
+        if key ~= 'filled_values' then rest[key] = value end
+    end
+    local values = '{}'
+    if next(state.filled_values) ~= nil then values = cjson.encode(state.filled_values) end
+    return '{"filled_values":' .. values .. ',' .. string.sub(cjson.encode(rest), 2)
+end
+
+local function encode_entry(timestamp, event_type, seq, data)
+    return '{"timestamp":' .. cjson.encode(timestamp) .. ',"event_type":' .. cjson.encode(event_type)
+        .. ',"seq":' .. string.format('%d', seq) .. ',"data":' .. data .. '}'
+end
+
+local function next_state(previous, update)
+    if not previous then return update.initial end
+    local state = {}
+    for key, value in pairs(previous) do state[key] = value end
+    for key, value in pairs(update.fields) do state[key] = value end
+    local values = {}
+    for key, value in pairs(state.filled_values) do values[key] = value end
+    for key, value in pairs(update.value_updates) do
+        if value == cjson.null then values[key] = nil else values[key] = value end
+    end
+    state.filled_values = values
+    return state
+end
+
+local function diff_events(previous, current)
+    local events = {}
+    local old_values, new_values = previous.filled_values, current.filled_values
+    for _, field in ipairs(sorted_keys(new_values)) do
+        local value, old = new_values[field], old_values[field]
+        if old == nil then
+            events[#events + 1] = {'field_filled', {field = field, value = value}}
+        elseif old ~= value then
+            events[#events + 1] = {'field_filled', {field = field, value = value, previous = old}}
+        end
+    end
+    for _, field in ipairs(sorted_keys(old_values)) do
+        if new_values[field] == nil then
+            events[#events + 1] = {'field_cleared', {field = field, previous = old_values[field]}}
+        end
+    end
+
+    local function changed(field)
+        return nullable(previous[field]) ~= nullable(current[field])
+    end
+    local function change(field)
+        return {from = nullable(previous[field]), to = nullable(current[field])}
+    end
+    if changed('current_placeholder_index') then
+        events[#events + 1] = {'index_moved', change('current_placeholder_index')}
+    end
+    if changed('status') then
+        events[#events + 1] = {'status_changed', change('status')}
+    end
+    local changes, any = {}, false
+    for _, field in ipairs(SCALAR_FIELDS) do
+        if changed(field) then
+            changes[field] = change(field)
+            any = true
+        end
+    end
+    if any then
+        events[#events + 1] = {'session_updated', {changes = changes}}
+    end
+    return events
+end
+
+local function record_history(history_key, state_key, update, settings)
+    local stored = redis.call('GET', state_key)
+    local previous = nil
+    if stored then previous = cjson.decode(stored) end
+    local state = next_state(previous and previous.state, update)
+
+    local timestamp = update.timestamp
+    local entries, seq = {}, 0
+    if not previous then
+        entries[1] = encode_entry(timestamp, SNAPSHOT_EVENT, seq, encode_state(state))
+    else
+        seq = previous.seq
+        for _, event in ipairs(diff_events(previous.state, state)) do
+            seq = seq + 1
+            entries[#entries + 1] = encode_entry(timestamp, event[1], seq, cjson.encode(event[2]))
+        end
+        if #entries == 0 then return state end
+        -- Snapshot of the state after this save when it crosses a multiple of snapshot_every
+        if math.floor(previous.seq / settings.snapshot_every) ~= math.floor(seq / settings.snapshot_every) then
+            entries[#entries + 1] = encode_entry(timestamp, SNAPSHOT_EVENT, seq, encode_state(state))
+        end
+    end
+
+    -- LPUSH puts the last value at the head (newest first); older ones would be trimmed anyway
+    redis.call('LPUSH', history_key, unpack(entries, math.max(1, #entries - settings.limit + 1)))
+    redis.call('LTRIM', history_key, 0, settings.limit - 1)
+    redis.call('EXPIRE', history_key, settings.ttl)
+    redis.call('SET', state_key, '{"seq":' .. string.format('%d', seq) .. ',"state":' .. encode_state(state) .. '}',
+        'EX', settings.ttl)
+    return state
+end
+"""
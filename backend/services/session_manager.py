@@ -3,22 +3,56 @@ Redis-based Session Manager with History Tracking
 ==================================================
 Manages user sessions using Redis with comprehensive history logging.
 
+Storage layout: each session is a Redis hash (``session:<id>``, one
+JSON-encoded field per top-level session key) plus a hash of its filled
+values (``values:<id>``, one field per placeholder). Reads can fetch only
+the fields they need and writes can update single fields and single
+values, so filling a field does not re-read or re-write the document
+content or placeholders.
+
+The parts of a session that only depend on the uploaded document (parsed
+content, placeholders, location index and preview plan) live in a shared
+template hash (``template:<hash>``) addressed by a hash of the content and
+placeholders, so it never changes (only its derived fields are recompiled
+when stale). Sessions of the same template point at one copy
+(``template_id``) and keep only their mutable state; callers store
+placeholders with positional ids and keep each session's own ids with the
+session (app.stored_placeholder_fields), so sessions with different
+occurrence ids still share a template. Templates are
+reference counted and expire TEMPLATE_IDLE_HOURS after their last
+reference is released (or, for sessions that simply expire, that long
+after the session's own TTL).
+
+Writes (save, field update, delete) each run as one Lua script
+(SESSION_WRITE_LUA) that also diffs the history and moves template
+references, so concurrent writes to a session never build on the same
+stale state.
+
 Features:
 - Session CRUD operations
-- Session history tracking
+- Session history tracking (change events with periodic snapshots)
 - Automatic expiration
 - Fallback to in-memory storage if Redis unavailable
 - Session statistics and analytics
+- Content versions for conditional reads (ETag / If-None-Match)
+- Shared, reference-counted document templates
 """
 
 import json
+import time
+import hashlib
 import logging
 import redis
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from itertools import chain
+from typing import Dict, Any, Optional, List, Iterable, Tuple
 import os
 from dotenv import load_dotenv
 
+from .session_history import (
+    tracked_state, tracked_fields, diff_events, replay, HISTORY_SNAPSHOT_EVERY, SNAPSHOT_EVENT, HISTORY_LUA
+)
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -29,11 +63,185 @@ REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
 REDIS_DB = int(os.environ.get('REDIS_DB', 0))
 REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD', None)
 SESSION_TIMEOUT_HOURS = int(os.environ.get('SESSION_TIMEOUT_HOURS', 168))  # 7 days
+# Reads record the session's last access at most this often (per session and process)
+ACCESS_RECORD_SECONDS = int(os.environ.get('SESSION_ACCESS_RECORD_SECONDS', 60))
+ACCESS_RECORD_MAX_SESSIONS = 10000
 
 # Redis key prefixes
 SESSION_PREFIX = "session:"
+VALUES_PREFIX = "values:"
 HISTORY_PREFIX = "history:"
 STATS_PREFIX = "stats:"
+INDEXING_PREFIX = "indexing:"
+VERSION_PREFIX = "version:"
+ACCESS_PREFIX = "access:"
+HISTORY_STATE_PREFIX = "history_state:"
+TEMPLATE_PREFIX = "template:"
+
+# History entries kept per session
+HISTORY_LIMIT = 100
+
+# Session key stored in its own hash (values:<id>), one field per placeholder
+FILLED_VALUES_FIELD = 'filled_values'
+
+# Session keys stored in the shared template hash: the identity fields
+# address it, the derived ones are computed from them
+TEMPLATE_IDENTITY_FIELDS = ('content', 'placeholders')
+TEMPLATE_DERIVED_FIELDS = ('location_index', 'placeholder_signature', 'preview_plan', 'preview_plan_id')
+TEMPLATE_FIELDS = TEMPLATE_IDENTITY_FIELDS + TEMPLATE_DERIVED_FIELDS
+TEMPLATE_ID_FIELD = 'template_id'
+# How long a template outlives its last reference (kept for re-uploads)
+TEMPLATE_IDLE_HOURS = int(os.environ.get('TEMPLATE_IDLE_HOURS', 24))
+# Tries of a session write whose template changes under it (see SESSION_WRITE_LUA)
+WRITE_ATTEMPTS = 5
+
+# Every session write (save, field update, delete) is this one script, so
+# the write, the template reference counts and the history diff happen
+# atomically. Every key it touches is declared: the client reads which
+# template the session points at and passes its key, and the script
+# returns -1 (writing nothing) if that changed in between, to be retried.
+#
+# KEYS: session, values, version, history, history state, stats, indexing,
+#   access, then the new template (if template_id) and the previous
+#   template (if previous_id) (see SessionManager._session_keys)
+# ARGV[1]: JSON header: mode ('replace', 'update' or 'delete'), ttl,
+#   template_ttl, idle_ttl, template_id, check_previous, previous_id,
+#   bump_version, history (record_history's update, or null),
+#   history_settings and counts (field pairs, value pairs, cleared values,
+#   template field pairs)
+# ARGV[2...]: those session fields, values, cleared values and template fields, flattened
+SESSION_WRITE_LUA = HISTORY_LUA + """
+local header = cjson.decode(ARGV[1])
+local session_key, values_key, version_key = KEYS[1], KEYS[2], KEYS[3]
+
+local position = 2
+local function take(count)
+    local items = {}
+    for i = 1, count do items[i] = ARGV[position + i - 1] end
+    position = position + count
+    return items
+end
+local fields = take(2 * header.counts[1])
+local values = take(2 * header.counts[2])
+local cleared = take(header.counts[3])
+local template = take(2 * header.counts[4])
+
+-- In slices: Lua's unpack() has a size limit
+local function batched(command, key, items)
+    for first = 1, #items, 1000 do
+        redis.call(command, key, unpack(items, first, math.min(first + 999, #items)))
+    end
+end
+
+local function present(value)
+    return value ~= nil and value ~= cjson.null
+end
+
+-- Unreferenced templates expire after idle_ttl; one that already expired leaves no counter
+local function release(template_key)
+    local refs = redis.call('HINCRBY', template_key, 'refs', -1)
+    if redis.call('HEXISTS', template_key, 'content') == 0 then
+        redis.call('DEL', template_key)
+    elseif refs <= 0 then
+        redis.call('EXPIRE', template_key, header.idle_ttl)
+    end
+end
+
+-- The template the session points at (none while stored as one JSON string),
+-- as the client read it to declare its key
+local previous_id, previous_key = nil, nil
+if header.check_previous then
+    if redis.call('TYPE', session_key).ok == 'hash' then
+        local stored = redis.call('HGET', session_key, 'template_id')
+        if stored then previous_id = cjson.decode(stored) end
+    end
+    if present(header.previous_id) then previous_key = KEYS[#KEYS] end
+    if previous_id ~= (previous_key and header.previous_id) then return -1 end
+end
+
+if header.mode == 'delete' then
+    redis.call('DEL', session_key, values_key, version_key, KEYS[4], KEYS[5], KEYS[6], KEYS[7], KEYS[8])
+    if previous_key then release(previous_key) end
+    return 1
+end
+
+if header.mode == 'replace' then
+    local template_id = header.template_id
+    if present(template_id) then
+        local template_key = KEYS[9]
+        if redis.call('HEXISTS', template_key, 'content') == 0 then
+            batched('HSET', template_key, template)
+            if previous_id == template_id then
+                -- Expired under this session: its reference is the only one known
+                redis.call('HSET', template_key, 'refs', 1)
+            end
+        end
+        if previous_id ~= template_id then
+            redis.call('HINCRBY', template_key, 'refs', 1)
+        end
+        redis.call('EXPIRE', template_key, header.template_ttl)
+    end
+    if previous_key and previous_id ~= template_id then
+        release(previous_key)
+    end
+    redis.call('DEL', session_key, values_key)
+    batched('HSET', session_key, fields)
+else
+    -- Field updates only apply to a stored session (it may have been deleted meanwhile)
+    if redis.call('EXISTS', session_key) == 0 then return 0 end
+    batched('HSET', session_key, fields)
+    if previous_key then
+        batched('HSET', previous_key, template)
+    else
+        -- Sessions stored before templates keep these fields themselves
+        batched('HSET', session_key, template)
+    end
+    batched('HDEL', values_key, cleared)
+end
+batched('HSET', values_key, values)
+redis.call('EXPIRE', session_key, header.ttl)
+redis.call('EXPIRE', values_key, header.ttl)
+if header.bump_version then
+    -- Every save is a content change; the version key lives as long as the session
+    redis.call('INCR', version_key)
+end
+redis.call('EXPIRE', version_key, header.ttl)
+
+if present(header.history) then
+    local state = record_history(KEYS[4], KEYS[5], header.history, header.history_settings)
+    local filled, placeholders = 0, state.placeholders_count
+    for _ in pairs(state.filled_values) do filled = filled + 1 end
+    redis.call('SET', KEYS[6], cjson.encode({
+        placeholders_count = placeholders,
+        filled_count = filled,
+        progress_percentage = filled / math.max(placeholders, 1) * 100,
+        last_updated = header.history.timestamp
+    }), 'EX', header.ttl)
+end
+return 1
+"""
+
+
+def encode_session(data: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Session data -> (session hash fields, filled value hash fields), JSON-encoded"""
+    fields = {
+        field: json.dumps(value, default=str)
+        for field, value in data.items() if field != FILLED_VALUES_FIELD
+    }
+    values = {
+        field: json.dumps(value, default=str)
+        for field, value in data.get(FILLED_VALUES_FIELD, {}).items()
+    }
+    return fields, values
+
+
+def template_id_for(fields: Dict[str, str]) -> str:
+    """Content address of a template, from its encoded identity fields"""
+    digest = hashlib.sha256()
+    for field in TEMPLATE_IDENTITY_FIELDS:
+        digest.update(fields[field].encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
 
 
 class SessionManager:
@@ -41,8 +249,13 @@ class SessionManager:
     
     def __init__(self):
         self.redis_client = None
+        self.write_script = None  # SESSION_WRITE_LUA, registered on connect
         self.use_redis = False
         self.fallback_store = {}  # In-memory fallback
+        self.indexing_results = {}  # In-memory fallback for background indexing results
+        self.versions = {}  # In-memory fallback for session content versions
+        self.history_states = {}  # In-memory fallback for the state history diffs against
+        self.access_recorded = {}  # Session -> monotonic time its last access was recorded
         self._connect_redis()
     
     def _connect_redis(self):
@@ -59,6 +272,7 @@ class SessionManager:
             )
             # Test connection
             self.redis_client.ping()
+            self.write_script = self.redis_client.register_script(SESSION_WRITE_LUA)
             self.use_redis = True
             logger.info(f"✅ Connected to Redis at {REDIS_HOST}:{REDIS_PORT}")
         except (redis.ConnectionError, redis.TimeoutError, Exception) as e:
@@ -71,13 +285,19 @@ class SessionManager:
         if self.use_redis and not self.redis_client:
             self._connect_redis()
     
-    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+    def get_session(self, session_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
         """
         Retrieve session data by session ID.
-        Updates last_accessed_at timestamp.
+        
+        Read-only: the session's expiry is pushed back in the same round trip
+        as the read, and the access time is recorded in a small key of its
+        own (at most every ACCESS_RECORD_SECONDS), never by writing the
+        session back.
         
         Args:
             session_id: Unique session identifier
+            fields: Top-level session keys to read (all if None); keys the
+                session does not have are left out of the result
             
         Returns:
             Session data dict or None if not found
@@ -86,15 +306,12 @@ class SessionManager:
         
         if self.use_redis:
             try:
-                key = f"{SESSION_PREFIX}{session_id}"
-                data = self.redis_client.get(key)
+                session_data = self._read_session(session_id, fields)
                 
-                if data:
-                    session_data = json.loads(data)
-                    # Update last access time
-                    session_data['last_accessed_at'] = datetime.now().isoformat()
-                    # Save updated session
-                    self.save_session(session_id, session_data)
+                if session_data is not None:
+                    now = datetime.now().isoformat()
+                    session_data['last_accessed_at'] = now
+                    self._record_access(session_id, now, session_data.pop(TEMPLATE_ID_FIELD, None))
                     return session_data
                 return None
             except Exception as e:
@@ -106,8 +323,290 @@ class SessionManager:
             session_data = self.fallback_store.get(session_id)
             if session_data:
                 session_data['last_accessed_at'] = datetime.now().isoformat()
+                if fields is not None:
+                    session_data = {field: session_data[field] for field in fields if field in session_data}
             return session_data
     
+    def _read_session(self, session_id: str, fields: Optional[Iterable[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Read session fields and refresh the session's TTL (and its version
+        key's) in one atomic round trip.
+        
+        Template fields (see TEMPLATE_FIELDS) are read from the session's
+        template in a second round trip, only when requested.
+        
+        Args:
+            session_id: Unique session identifier
+            fields: Top-level session keys to read (all if None)
+            
+        Returns:
+            Decoded fields plus the session's 'template_id' (if it has a
+            template), or None if the session does not exist
+        """
+        key = f"{SESSION_PREFIX}{session_id}"
+        values_key = f"{VALUES_PREFIX}{session_id}"
+        ttl_seconds = SESSION_TIMEOUT_HOURS * 3600
+        if fields is not None:
+            fields = list(fields)
+        session_fields = None
+        if fields is not None:
+            session_fields = [field for field in fields if field not in (FILLED_VALUES_FIELD, TEMPLATE_ID_FIELD)]
+            session_fields.append(TEMPLATE_ID_FIELD)
+        read_values = fields is None or FILLED_VALUES_FIELD in fields
+        
+        pipe = self.redis_client.pipeline(transaction=True)
+        if session_fields is None:
+            pipe.hgetall(key)
+        else:
+            pipe.hmget(key, session_fields)
+        if read_values:
+            pipe.hgetall(values_key)
+        pipe.expire(key, ttl_seconds)
+        pipe.expire(values_key, ttl_seconds)
+        # Versions must outlive the session (a restarted count would repeat old ETags)
+        pipe.expire(f"{VERSION_PREFIX}{session_id}", ttl_seconds)
+        
+        try:
+            results = pipe.execute()
+        except redis.ResponseError as e:
+            if 'WRONGTYPE' not in str(e):
+                raise
+            # Stored before sessions were hashes
+            if not self._migrate_session(session_id):
+                return None
+            return self._read_session(session_id, fields)
+        
+        if not results[-3]:
+            return None
+        
+        if session_fields is None:
+            session_data = {field: json.loads(value) for field, value in results[0].items()}
+        else:
+            session_data = {
+                field: json.loads(value) for field, value in zip(session_fields, results[0]) if value is not None
+            }
+        if read_values:
+            session_data[FILLED_VALUES_FIELD] = {field: json.loads(value) for field, value in results[1].items()}
+        
+        template_id = session_data.get(TEMPLATE_ID_FIELD)
+        template_fields = [
+            field for field in TEMPLATE_FIELDS
+            if (fields is None or field in fields) and field not in session_data
+        ]
+        if template_id and template_fields:
+            session_data.update(self._read_template(template_id, template_fields))
+        return session_data
+    
+    def _read_template(self, template_id: str, fields: List[str]) -> Dict[str, Any]:
+        """
+        Read fields of a shared template and push back its expiry.
+        
+        Args:
+            template_id: Template content address
+            fields: Template fields to read
+            
+        Returns:
+            Decoded fields (empty if the template expired)
+        """
+        template_key = f"{TEMPLATE_PREFIX}{template_id}"
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hmget(template_key, fields)
+        pipe.expire(template_key, self._template_ttl())
+        values, _ = pipe.execute()
+        if all(value is None for value in values):
+            logger.warning(f"Template {template_id[:12]} is missing")
+        return {field: json.loads(value) for field, value in zip(fields, values) if value is not None}
+    
+    @staticmethod
+    def _template_ttl() -> int:
+        """TTL of a referenced template: it has to outlive every session pointing at it"""
+        return (SESSION_TIMEOUT_HOURS + TEMPLATE_IDLE_HOURS) * 3600
+    
+    def _migrate_session(self, session_id: str) -> bool:
+        """
+        Convert a session stored as one JSON string into the hash layout.
+        
+        Returns:
+            True if the session exists (now as hashes)
+        """
+        key = f"{SESSION_PREFIX}{session_id}"
+        data = self.redis_client.get(key)
+        if data is None:
+            return False
+        self._write_session(session_id, json.loads(data), bump_version=False, record_history=False)
+        logger.info(f"Migrated session {session_id[:8]}... to field-level storage")
+        return True
+    
+    def _write_session(self, session_id: str, data: Dict[str, Any], bump_version: bool = True,
+                       record_history: bool = True):
+        """
+        Replace a session's hashes with ``data``.
+        
+        Template fields go to the shared template addressed by the content
+        and placeholders (created if no session stored it yet); the session
+        keeps its id. The session's previous template, if different, loses
+        a reference. One atomic round trip (see _run_write).
+        
+        Args:
+            session_id: Unique session identifier
+            data: Session data
+            bump_version: Advance the session's content version
+            record_history: Record what changed in the history (and statistics)
+        """
+        fields, values = encode_session(data)
+        
+        template_id = None
+        template = {}
+        if all(field in fields for field in TEMPLATE_IDENTITY_FIELDS):
+            template_id = template_id_for(fields)
+            template = dict(
+                {field: fields.pop(field) for field in TEMPLATE_FIELDS if field in fields},
+                placeholders_count=json.dumps(len(data['placeholders']))
+            )
+            fields[TEMPLATE_ID_FIELD] = json.dumps(template_id)
+        
+        self._run_write(
+            session_id, 'replace', fields, values, template=template, template_id=template_id,
+            bump_version=bump_version, history=self._history_update(data) if record_history else None
+        )
+    
+    @staticmethod
+    def _session_keys(session_id: str, template_id: Optional[str] = None,
+                      previous_id: Optional[str] = None) -> List[str]:
+        """
+        KEYS of SESSION_WRITE_LUA: the session's keys, then the template it
+        is saved under and the template it pointed at (each if given).
+        """
+        keys = [
+            f"{prefix}{session_id}" for prefix in (
+                SESSION_PREFIX, VALUES_PREFIX, VERSION_PREFIX, HISTORY_PREFIX,
+                HISTORY_STATE_PREFIX, STATS_PREFIX, INDEXING_PREFIX, ACCESS_PREFIX
+            )
+        ]
+        if template_id:
+            keys.append(f"{TEMPLATE_PREFIX}{template_id}")
+        if previous_id:
+            keys.append(f"{TEMPLATE_PREFIX}{previous_id}")
+        return keys
+    
+    def _template_of(self, session_id: str) -> Optional[str]:
+        """Id of the template a session points at (None for sessions stored before templates)"""
+        try:
+            template_id = self.redis_client.hget(f"{SESSION_PREFIX}{session_id}", TEMPLATE_ID_FIELD)
+        except redis.ResponseError as e:
+            if 'WRONGTYPE' not in str(e):
+                raise
+            return None
+        return json.loads(template_id) if template_id is not None else None
+    
+    def _run_write(self, session_id: str, mode: str, fields: Optional[Dict[str, str]] = None,
+                   values: Optional[Dict[str, str]] = None, cleared: Iterable[str] = (),
+                   template: Optional[Dict[str, str]] = None, template_id: Optional[str] = None,
+                   bump_version: bool = True, history: Optional[Dict[str, Any]] = None):
+        """
+        Run SESSION_WRITE_LUA for a session.
+        
+        The script diffs against the stored history state and writes the
+        session, template reference counts, history and statistics without
+        another client in between. Writes that move or release a template
+        first read which one the session points at (a second round trip);
+        field updates that leave the template alone take one.
+        
+        Args:
+            session_id: Unique session identifier
+            mode: 'replace' (a whole session), 'update' (some fields) or 'delete'
+            fields: Encoded session hash fields to set
+            values: Encoded filled values to set
+            cleared: Filled values to remove ('update')
+            template: Encoded template fields (the derived ones for 'update')
+            template_id: Template a replaced session is saved under
+            bump_version: Advance the session's content version
+            history: What the history diff needs (_history_update), None to record nothing
+            
+        Returns:
+            1, or 0 if an 'update' found no stored session (nothing written)
+            
+        Raises:
+            redis.WatchError: The session kept moving to other templates
+                while being written
+        """
+        fields = fields or {}
+        values = values or {}
+        template = template or {}
+        cleared = list(cleared)
+        ttl_seconds = SESSION_TIMEOUT_HOURS * 3600
+        header = {
+            'mode': mode,
+            'ttl': ttl_seconds,
+            'template_ttl': self._template_ttl(),
+            'idle_ttl': TEMPLATE_IDLE_HOURS * 3600,
+            'template_id': template_id,
+            # Field updates only need the template to write derived fields to it
+            'check_previous': mode != 'update' or bool(template),
+            'bump_version': bump_version,
+            'history': history,
+            'history_settings': {'limit': HISTORY_LIMIT, 'snapshot_every': HISTORY_SNAPSHOT_EVERY, 'ttl': ttl_seconds},
+            'counts': [len(fields), len(values), len(cleared), len(template)]
+        }
+        args = list(chain.from_iterable(fields.items()))
+        args.extend(chain.from_iterable(values.items()))
+        args.extend(cleared)
+        args.extend(chain.from_iterable(template.items()))
+        
+        for _ in range(WRITE_ATTEMPTS):
+            previous_id = self._template_of(session_id) if header['check_previous'] else None
+            header['previous_id'] = previous_id
+            result = self.write_script(
+                keys=self._session_keys(session_id, template_id, previous_id),
+                args=[json.dumps(header, default=str)] + args
+            )
+            if result != -1:
+                return result
+            # Moved to another template since it was read: read again
+        raise redis.WatchError(f"Session {session_id[:8]}... changed templates during {WRITE_ATTEMPTS} write attempts")
+    
+    @staticmethod
+    def _history_update(data: Dict[str, Any], value_updates: Optional[Dict[str, Optional[str]]] = None
+                        ) -> Dict[str, Any]:
+        """
+        What the history diff of a Redis write needs (record_history in
+        session_history.HISTORY_LUA): the tracked fields the save sets, and
+        the state to start from if the session has no history yet.
+        
+        Args:
+            data: Session data being saved (or the fields being updated)
+            value_updates: Filled values set (None: cleared) by a field-level update
+        """
+        return {
+            'fields': tracked_fields(data),
+            'initial': tracked_state(data, value_updates=value_updates),
+            'value_updates': value_updates or {},
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def _record_access(self, session_id: str, timestamp: str, template_id: Optional[str] = None):
+        """
+        Store a session's last access time (and push back its template's
+        expiry), unless recorded in the last ACCESS_RECORD_SECONDS.
+        """
+        now = time.monotonic()
+        recorded = self.access_recorded.get(session_id)
+        if recorded is not None and now - recorded < ACCESS_RECORD_SECONDS:
+            return
+        if len(self.access_recorded) >= ACCESS_RECORD_MAX_SESSIONS:
+            # Forgetting only costs an early re-record
+            self.access_recorded.clear()
+        self.access_recorded[session_id] = now
+        
+        try:
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.set(f"{ACCESS_PREFIX}{session_id}", timestamp, ex=SESSION_TIMEOUT_HOURS * 3600)
+            if template_id:
+                pipe.expire(f"{TEMPLATE_PREFIX}{template_id}", self._template_ttl())
+            pipe.execute()
+        except Exception as e:
+            logger.error(f"Redis access record error: {e}")
+    
     def save_session(self, session_id: str, data: Dict[str, Any], user_id: Optional[str] = None) -> bool:
         """
         Save session data to Redis.
@@ -132,23 +631,10 @@ class SessionManager:
         if user_id:
             data['user_id'] = user_id
         
-        # Add history entry
-        self.add_history(session_id, 'session_updated', data)
-        
         if self.use_redis:
             try:
-                key = f"{SESSION_PREFIX}{session_id}"
-                ttl_seconds = SESSION_TIMEOUT_HOURS * 3600
-                
-                # Save session data
-                self.redis_client.setex(
-                    key,
-                    ttl_seconds,
-                    json.dumps(data, default=str)
-                )
-                
-                # Update statistics
-                self._update_stats(session_id, data)
+                # Session, history and statistics in one atomic script
+                self._write_session(session_id, data)
                 
                 logger.debug(f"Saved session {session_id[:8]}... to Redis")
                 return True
@@ -156,12 +642,131 @@ class SessionManager:
                 logger.error(f"Redis save error: {e}")
                 # Fallback to in-memory
                 self.fallback_store[session_id] = data
+                self.versions[session_id] = self.versions.get(session_id, 0) + 1
                 return False
         else:
             # In-memory fallback
+            self._record_changes(session_id, data)
             self.fallback_store[session_id] = data
+            self.versions[session_id] = self.versions.get(session_id, 0) + 1
             return True
     
+    def update_session(self, session_id: str, fields: Dict[str, Any],
+                       filled_values: Optional[Dict[str, Optional[str]]] = None) -> bool:
+        """
+        Write some fields of an existing session, leaving the others untouched.
+        
+        Filled values are set (or removed, for None) one by one in the
+        session's value hash, so concurrent updates of different fields do
+        not overwrite each other. Derived template fields (a recompiled
+        preview plan) are written to the session's template; new content
+        or placeholders save the whole session under another template.
+        
+        Args:
+            session_id: Unique session identifier
+            fields: Top-level session keys to write (not filled_values)
+            filled_values: Placeholder id (or key) -> new value, None to clear
+            
+        Returns:
+            True if saved successfully, False otherwise (also when the session
+            no longer exists; nothing is written then)
+        """
+        self._ensure_connection()
+        
+        fields = dict(fields, last_accessed_at=datetime.now().isoformat())
+        filled_values = filled_values or {}
+        
+        if self.use_redis and any(field in fields for field in TEMPLATE_IDENTITY_FIELDS):
+            # Another document: the session moves to another template
+            session_data = self.get_session(session_id)
+            if session_data is None:
+                return False
+            session_data.update(fields)
+            stored_values = session_data.setdefault(FILLED_VALUES_FIELD, {})
+            for field, value in filled_values.items():
+                if value is None:
+                    stored_values.pop(field, None)
+                else:
+                    stored_values[field] = value
+            return self.save_session(session_id, session_data)
+        
+        if self.use_redis:
+            try:
+                encoded, _ = encode_session(fields)
+                set_values = {
+                    field: json.dumps(value, default=str) for field, value in filled_values.items() if value is not None
+                }
+                cleared = [field for field, value in filled_values.items() if value is None]
+                template_fields = {field: encoded.pop(field) for field in TEMPLATE_DERIVED_FIELDS if field in encoded}
+                
+                if not self._run_write(
+                    session_id, 'update', encoded, set_values, cleared, template_fields,
+                    history=self._history_update(fields, filled_values)
+                ):
+                    logger.warning(f"Update of missing session {session_id[:8]}... ignored")
+                    return False
+                return True
+            except Exception as e:
+                logger.error(f"Redis update error: {e}")
+                return False
+        
+        # In-memory fallback
+        session_data = self.fallback_store.get(session_id)
+        if session_data is None:
+            return False
+        self._record_changes(session_id, fields, filled_values)
+        session_data.update(fields)
+        stored_values = session_data.setdefault(FILLED_VALUES_FIELD, {})
+        for field, value in filled_values.items():
+            if value is None:
+                stored_values.pop(field, None)
+            else:
+                stored_values[field] = value
+        self.versions[session_id] = self.versions.get(session_id, 0) + 1
+        return True
+    
+    def get_session_version(self, session_id: str) -> Optional[int]:
+        """
+        Content version of a session, without loading the session.
+        
+        The version increases on every save (and when a background indexing
+        result arrives); reads only save to merge that result, so an
+        unchanged version means an unchanged session.
+        
+        Args:
+            session_id: Unique session identifier
+            
+        Returns:
+            Version number, or None if the session has no version (missing,
+            expired, or saved before versions existed)
+        """
+        self._ensure_connection()
+        
+        if self.use_redis:
+            try:
+                version = self.redis_client.get(f"{VERSION_PREFIX}{session_id}")
+                return int(version) if version is not None else None
+            except Exception as e:
+                logger.error(f"Redis version get error: {e}")
+                return None
+        
+        if session_id not in self.fallback_store:
+            return None
+        return self.versions.get(session_id)
+    
+    def _bump_version(self, session_id: str):
+        """Advance a session's content version (changes stored outside the session blob)"""
+        if self.use_redis:
+            try:
+                version_key = f"{VERSION_PREFIX}{session_id}"
+                self.redis_client.incr(version_key)
+                self.redis_client.expire(version_key, SESSION_TIMEOUT_HOURS * 3600)
+                return
+            except Exception as e:
+                logger.error(f"Redis version bump error: {e}")
+        
+        self.versions[session_id] = self.versions.get(session_id, 0) + 1
+    
     def delete_session(self, session_id: str) -> bool:
         """
         Delete a session from Redis.
@@ -174,18 +779,11 @@ class SessionManager:
         """
         self._ensure_connection()
         
-        # Add history entry
-        self.add_history(session_id, 'session_deleted', {})
-        
         if self.use_redis:
             try:
-                key = f"{SESSION_PREFIX}{session_id}"
-                history_key = f"{HISTORY_PREFIX}{session_id}"
-                stats_key = f"{STATS_PREFIX}{session_id}"
-                
-                self.redis_client.delete(key)
-                self.redis_client.delete(history_key)
-                self.redis_client.delete(stats_key)
+                # The history goes with the session, so no 'session_deleted' entry is kept
+                self._run_write(session_id, 'delete')
+                self.access_recorded.pop(session_id, None)
                 
                 logger.info(f"Deleted session {session_id[:8]}... from Redis")
                 return True
@@ -194,10 +792,76 @@ class SessionManager:
                 return False
         else:
             # In-memory fallback
+            self.add_history(session_id, 'session_deleted', {})
             if session_id in self.fallback_store:
                 del self.fallback_store[session_id]
+            self.indexing_results.pop(session_id, None)
+            self.versions.pop(session_id, None)
+            self.history_states.pop(session_id, None)
             return True
     
+    def save_indexing_result(self, session_id: str, result: Dict[str, Any]) -> bool:
+        """
+        Store the result of background placeholder indexing for a session.
+        
+        Kept apart from the session blob so concurrent request handlers that
+        save a stale copy of the session cannot overwrite it; any worker can
+        merge it on the next read.
+        
+        Args:
+            session_id: Session identifier
+            result: Indexing result (content, placeholders, detection info)
+            
+        Returns:
+            True if saved successfully
+        """
+        self._ensure_connection()
+        
+        if self.use_redis:
+            try:
+                key = f"{INDEXING_PREFIX}{session_id}"
+                self.redis_client.setex(key, SESSION_TIMEOUT_HOURS * 3600, json.dumps(result, default=str))
+                # The session reads differently once the result is merged
+                self._bump_version(session_id)
+                return True
+            except Exception as e:
+                logger.error(f"Redis indexing result save error: {e}")
+        
+        self.indexing_results[session_id] = result
+        self._bump_version(session_id)
+        return True
+    
+    def take_indexing_result(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Remove and return the background indexing result for a session, if finished.
+        
+        Reading and removing is one atomic step, so of several requests
+        reading a session that just finished indexing exactly one gets the
+        result and merges it.
+        
+        Args:
+            session_id: Session identifier
+            
+        Returns:
+            Indexing result, or None if indexing is still running (or another
+            request already took the result)
+        """
+        self._ensure_connection()
+        
+        if self.use_redis:
+            try:
+                key = f"{INDEXING_PREFIX}{session_id}"
+                pipe = self.redis_client.pipeline(transaction=True)
+                pipe.get(key)
+                pipe.delete(key)
+                data, _ = pipe.execute()
+                if data:
+                    return json.loads(data)
+            except Exception as e:
+                logger.error(f"Redis indexing result take error: {e}")
+        
+        return self.indexing_results.pop(session_id, None)
+    
     def add_history(self, session_id: str, event_type: str, data: Dict[str, Any]):
         """
         Add an entry to session history.
@@ -214,15 +878,91 @@ class SessionManager:
             'event_type': event_type,
             'data': data
         }
+        self._push_history(session_id, [history_entry])
+    
+    def _record_changes(self, session_id: str, data: Dict[str, Any],
+                        value_updates: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+        """
+        Add history entries for what a save changes (in-memory store; Redis
+        writes record theirs in the write script, session_history.HISTORY_LUA).
+        
+        Args:
+            session_id: Session identifier
+            data: Session data being saved (or the fields being updated)
+            value_updates: Filled values set (None: cleared) by a field-level update
+            
+        Returns:
+            The tracked state after the save
+        """
+        state, entries, history_state = self._history_changes(
+            self.history_states.get(session_id), data, value_updates
+        )
+        if entries:
+            self._push_history(session_id, entries, history_state)
+        return state
+    
+    @staticmethod
+    def _history_changes(previous: Optional[Dict[str, Any]], data: Dict[str, Any],
+                         value_updates: Optional[Dict[str, Optional[str]]] = None
+                         ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        History entries for what a save changes.
+        
+        The tracked state of the last save is kept next to the history; the
+        first save records a snapshot, later ones the change events (and a
+        snapshot every HISTORY_SNAPSHOT_EVERY events).
+        
+        Args:
+            previous: Stored history state ({'seq', 'state'}) of the last save, if any
+            data: Session data being saved (or the fields being updated)
+            value_updates: Filled values set (None: cleared) by a field-level update
+            
+        Returns:
+            (tracked state after the save, entries to add, history state to
+            store); no entries and no history state if nothing tracked changed
+        """
+        state = tracked_state(data, previous['state'] if previous else None, value_updates)
         
+        timestamp = datetime.now().isoformat()
+        if previous is None:
+            seq = 0
+            entries = [{'timestamp': timestamp, 'event_type': SNAPSHOT_EVENT, 'seq': seq, 'data': state}]
+        else:
+            seq = previous['seq']
+            entries = []
+            for event_type, event_data in diff_events(previous['state'], state):
+                seq += 1
+                entries.append({'timestamp': timestamp, 'event_type': event_type, 'seq': seq, 'data': event_data})
+            if not entries:
+                return state, [], None
+            # Snapshot of the state after this save when it crosses a multiple of HISTORY_SNAPSHOT_EVERY
+            if previous['seq'] // HISTORY_SNAPSHOT_EVERY != seq // HISTORY_SNAPSHOT_EVERY:
+                entries.append({'timestamp': timestamp, 'event_type': SNAPSHOT_EVENT, 'seq': seq, 'data': state})
+        
+        return state, entries, {'seq': seq, 'state': state}
+    
+    def _push_history(self, session_id: str, entries: List[Dict[str, Any]],
+                      history_state: Optional[Dict[str, Any]] = None):
+        """
+        Prepend entries (oldest first) to a session's history, keeping the last HISTORY_LIMIT.
+        
+        Args:
+            session_id: Session identifier
+            entries: History entries in the order they happened
+            history_state: Tracked state to store for the next save's diff, if any
+        """
         if self.use_redis:
             try:
                 history_key = f"{HISTORY_PREFIX}{session_id}"
-                # Use Redis list to store history (keep last 100 entries)
-                self.redis_client.lpush(history_key, json.dumps(history_entry, default=str))
-                self.redis_client.ltrim(history_key, 0, 99)  # Keep only last 100 entries
-                # Set expiration on history key
-                self.redis_client.expire(history_key, SESSION_TIMEOUT_HOURS * 3600)
+                ttl_seconds = SESSION_TIMEOUT_HOURS * 3600
+                pipe = self.redis_client.pipeline(transaction=False)
+                # LPUSH puts the last value at the head (newest first)
+                pipe.lpush(history_key, *(json.dumps(entry, default=str) for entry in entries))
+                pipe.ltrim(history_key, 0, HISTORY_LIMIT - 1)
+                pipe.expire(history_key, ttl_seconds)
+                if history_state is not None:
+                    pipe.setex(f"{HISTORY_STATE_PREFIX}{session_id}", ttl_seconds, json.dumps(history_state, default=str))
+                pipe.execute()
             except Exception as e:
                 logger.error(f"Redis history error: {e}")
         else:
@@ -233,10 +973,12 @@ class SessionManager:
                 self.fallback_store['history'][session_id] = []
             
             history_list = self.fallback_store['history'][session_id]
-            history_list.insert(0, history_entry)
-            # Keep only last 100 entries
-            if len(history_list) > 100:
-                history_list[:] = history_list[:100]
+            history_list[:0] = reversed(entries)
+            # Keep only the last HISTORY_LIMIT entries
+            if len(history_list) > HISTORY_LIMIT:
+                history_list[:] = history_list[:HISTORY_LIMIT]
+            if history_state is not None:
+                self.history_states[session_id] = history_state
     
     def get_session_history(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """
@@ -264,6 +1006,21 @@ class SessionManager:
             history = self.fallback_store.get('history', {}).get(session_id, [])
             return history[:limit]
     
+    def get_history_state(self, session_id: str, seq: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Rebuild a session's tracked state (filled values, current field,
+        status, ...) as it was after a history event.
+        
+        Args:
+            session_id: Session identifier
+            seq: Sequence number ('seq' of a history entry); latest if None
+            
+        Returns:
+            Tracked state, or None if the event is older than the retained
+            history (or the session has none)
+        """
+        return replay(self.get_session_history(session_id, limit=HISTORY_LIMIT), seq)
+    
     def get_all_sessions(self, limit: int = 100, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Get all active sessions with metadata, optionally filtered by user.
@@ -286,24 +1043,29 @@ class SessionManager:
                 
                 for key in keys:
                     session_id = key.replace(SESSION_PREFIX, "")
-                    data = self.redis_client.get(key)
-                    if data:
-                        session_data = json.loads(data)
+                    session_data = self._read_summary(session_id)
+                    if session_data:
                         session_user_id = session_data.get('user_id')
                         
                         # Filter by user_id if provided
                         if user_id and session_user_id != user_id:
                             continue
                         
+                        # Reads record access apart from the session (ISO timestamps sort as text)
+                        last_accessed = max(
+                            session_data.get('last_accessed_at') or '',
+                            self.redis_client.get(f"{ACCESS_PREFIX}{session_id}") or ''
+                        ) or None
+                        
                         sessions.append({
                             'session_id': session_id,
                             'filename': session_data.get('filename', 'Unknown'),
                             'created_at': session_data.get('created_at'),
-                            'last_accessed_at': session_data.get('last_accessed_at'),
-                            'progress': len(session_data.get('filled_values', {})) / max(len(session_data.get('placeholders', [])), 1) * 100,
+                            'last_accessed_at': last_accessed,
+                            'progress': session_data['filled_count'] / max(session_data['placeholders_count'], 1) * 100,
                             'status': session_data.get('status', 'active'),
-                            'placeholders_count': len(session_data.get('placeholders', [])),
-                            'filled_count': len(session_data.get('filled_values', {})),
+                            'placeholders_count': session_data['placeholders_count'],
+                            'filled_count': session_data['filled_count'],
                             'user_id': session_user_id
                         })
             except Exception as e:
@@ -334,26 +1096,36 @@ class SessionManager:
         sessions.sort(key=lambda x: x.get('last_accessed_at', ''), reverse=True)
         return sessions
     
-    def _update_stats(self, session_id: str, data: Dict[str, Any]):
-        """Update session statistics"""
-        self._ensure_connection()
+    def _read_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read the fields session listings show (no TTL refresh).
         
-        if self.use_redis:
-            try:
-                stats_key = f"{STATS_PREFIX}{session_id}"
-                stats = {
-                    'placeholders_count': len(data.get('placeholders', [])),
-                    'filled_count': len(data.get('filled_values', {})),
-                    'progress_percentage': len(data.get('filled_values', {})) / max(len(data.get('placeholders', [])), 1) * 100,
-                    'last_updated': datetime.now().isoformat()
-                }
-                self.redis_client.setex(
-                    stats_key,
-                    SESSION_TIMEOUT_HOURS * 3600,
-                    json.dumps(stats)
-                )
-            except Exception as e:
-                logger.error(f"Redis stats update error: {e}")
+        Returns:
+            Listing fields plus 'placeholders_count' and 'filled_count', or
+            None if the session does not exist
+        """
+        fields = ['filename', 'created_at', 'last_accessed_at', 'status', 'user_id', 'placeholders', TEMPLATE_ID_FIELD]
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.hmget(f"{SESSION_PREFIX}{session_id}", fields)
+        pipe.hlen(f"{VALUES_PREFIX}{session_id}")
+        try:
+            values, filled_count = pipe.execute()
+        except redis.ResponseError as e:
+            if 'WRONGTYPE' not in str(e) or not self._migrate_session(session_id):
+                return None
+            return self._read_summary(session_id)
+        
+        if all(value is None for value in values):
+            return None
+        session_data = {field: json.loads(value) for field, value in zip(fields, values) if value is not None}
+        template_id = session_data.pop(TEMPLATE_ID_FIELD, None)
+        if template_id:
+            placeholders_count = self.redis_client.hget(f"{TEMPLATE_PREFIX}{template_id}", 'placeholders_count')
+            session_data['placeholders_count'] = json.loads(placeholders_count or '0')
+        else:
+            session_data['placeholders_count'] = len(session_data.pop('placeholders', []))
+        session_data['filled_count'] = filled_count
+        return session_data
     
     def get_session_stats(self) -> Dict[str, Any]:
         """
@@ -406,6 +1178,9 @@ class SessionManager:
             
             for session_id in expired:
                 del self.fallback_store[session_id]
+                self.indexing_results.pop(session_id, None)
+                self.versions.pop(session_id, None)
+                self.history_states.pop(session_id, None)
                 if 'history' in self.fallback_store and session_id in self.fallback_store['history']:
                     del self.fallback_store['history'][session_id]
             